@@ -1,10 +1,19 @@
 # bot/api_service.py
 import os
-from typing import Dict, Any
+import time
+import threading
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from .core.knowledge_base import KnowledgeBaseManager
 from .core.rag_engine import RAGEngine
-from .core.query_router import QueryRouter
-from .config import DOCS_DIR, IMG_DIR
+from .core.query_router import QueryRouter, get_maps_pool
+from .core.ollama_handler import warm_up_model, get_generation_stats
+from .core.llm_metrics import request_trace, RequestTrace, traced_iter, get_llm_metrics
+from .core.response_formatter import get_formatter_stats
+from .config import (
+    DOCS_DIR, IMG_DIR, WARMUP_ON_STARTUP, WARMUP_COMPONENTS,
+    BATCH_MAX_QUERIES, BATCH_MAX_CONCURRENCY, MAPS_MCP_POOL_SIZE, CLIP_IMAGE_RESCORE, READY_WHEN_DEGRADED
+)
 
 # Global objects (initialized only once when service starts)
 _kb_manager: KnowledgeBaseManager = None
@@ -14,6 +23,12 @@ _metadata_store = None
 _text_index = None
 _image_index = None
 
+# Readiness state, "ready" only once the warm-up phase has completed
+_readiness = {"status": "starting", "components": {}}
+_readiness_lock = threading.Lock()
+# Bumped for every warm-up run; a run that is no longer the latest stops writing _readiness
+_warm_up_generation = 0
+
 
 def initialize_backend_components():
     """Initialize backend components once."""
@@ -39,6 +54,111 @@ def initialize_backend_components():
         print("✅ QueryRouter ready.")
 
 
+def _warm_up_component(component: str):
+    if component == "text_model":
+        _rag_engine.embedding_handler.warm_up(component)
+    elif component == "clip":
+        # Loading CLIP would only cost memory unless image hits are re-scored with it
+        if CLIP_IMAGE_RESCORE:
+            _rag_engine.embedding_handler.warm_up(component)
+        else:
+            print("⏭️ CLIP_IMAGE_RESCORE is off, skipping CLIP warm-up")
+    elif component == "reranker":
+        if _rag_engine.reranker is not None:
+            _rag_engine.reranker.warm_up()
+    elif component == "intent_router":
+        if _query_router.intent_router is not None:
+            _query_router.intent_router.warm_up()
+    elif component == "maps_mcp":
+        if MAPS_MCP_POOL_SIZE > 0 and get_maps_pool().health_check() == 0:
+            raise RuntimeError("No healthy Google Maps MCP session")
+    elif component == "ollama":
+        warm_up_model()
+    else:
+        raise ValueError(f"Unknown warm-up component: {component}")
+
+
+def _next_warm_up_generation() -> int:
+    # Caller holds _readiness_lock
+    global _warm_up_generation
+    _warm_up_generation += 1
+    return _warm_up_generation
+
+
+def run_warm_up(components=None, generation=None):
+    """
+    Load and exercise each model once, recording per-component load time.
+    :param generation: Warm-up run this is, from start_warm_up; None starts a new one.
+                       Once a newer run has started this one stops and leaves _readiness to it.
+    """
+    components = WARMUP_COMPONENTS if components is None else components
+    with _readiness_lock:
+        if generation is None:
+            generation = _next_warm_up_generation()
+        if generation != _warm_up_generation:
+            return
+        _readiness["status"] = "warming_up"
+        _readiness["components"] = {name: {"status": "pending"} for name in components}
+
+    failed = False
+    for component in components:
+        with _readiness_lock:
+            if generation != _warm_up_generation:
+                print("⏭️ A newer warm-up has started, stopping this one")
+                return
+        print(f"🔥 Warming up {component}...")
+        start = time.perf_counter()
+        try:
+            _warm_up_component(component)
+            result = {"status": "ready"}
+        except Exception as e:
+            # A failed component is reported, the service still serves requests
+            print(f"⚠️ Warm-up of {component} failed: {e}")
+            result = {"status": "failed", "error": str(e)}
+            failed = True
+        result["load_time_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        with _readiness_lock:
+            if generation != _warm_up_generation:
+                return
+            _readiness["components"][component] = result
+        print(f"✅ {component} warm-up finished in {result['load_time_ms']} ms")
+
+    with _readiness_lock:
+        if generation == _warm_up_generation:
+            _readiness["status"] = "degraded" if failed else "ready"
+
+
+def start_warm_up():
+    """
+    Run the warm-up phase in the background so the server can report readiness meanwhile.
+    A warm-up still running (e.g. for the engine a reload replaced) is superseded.
+    """
+    with _readiness_lock:
+        generation = _next_warm_up_generation()
+        if not WARMUP_ON_STARTUP:
+            _readiness["status"] = "ready"
+            return None
+        # Reported as warming up right away, not only once the thread gets scheduled
+        _readiness["status"] = "warming_up"
+    thread = threading.Thread(target=run_warm_up, args=(None, generation), name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_readiness() -> Dict[str, Any]:
+    """Current readiness state and per-component load times."""
+    with _readiness_lock:
+        return {
+            "status": _readiness["status"],
+            "components": {name: dict(info) for name, info in _readiness["components"].items()}
+        }
+
+
+def is_ready(readiness: Dict[str, Any]) -> bool:
+    """Whether a readiness probe should pass; a degraded warm-up only passes with READY_WHEN_DEGRADED."""
+    return readiness["status"] == "ready" or (readiness["status"] == "degraded" and READY_WHEN_DEGRADED)
+
+
 def handle_chat_query(query: str) -> Dict[str, Any]:
     """Main backend API logic."""
 
@@ -46,16 +166,127 @@ def handle_chat_query(query: str) -> Dict[str, Any]:
     if not _query_router:
         return {"success": False, "error": "QueryRouter not initialized."}
 
-    result = _query_router.route_query(query)
+    with request_trace(query):
+        result = _query_router.route_query(query)
     print(f"🧠 Returning result: {result}")
     return result
 
 
+def _route_traced(query: str) -> Dict[str, Any]:
+    # Runs in a batch worker thread, each query gets its own trace
+    with request_trace(query, "ask_batch"):
+        return _query_router.route_query(query)
+
+
+def handle_batch_query(queries: List[str], max_concurrency: Optional[int] = None,
+                       knowledge_base_only: bool = False) -> Dict[str, Any]:
+    """
+    Answer many queries in one call with bounded concurrency.
+    With knowledge_base_only the agent is skipped: all queries share one embedding
+    pass and one index search, then answers are generated concurrently.
+    """
+    if not _query_router:
+        return {"success": False, "error": "QueryRouter not initialized."}
+    if len(queries) > BATCH_MAX_QUERIES:
+        return {"success": False, "error": f"Too many queries: {len(queries)} > {BATCH_MAX_QUERIES}."}
+
+    concurrency = max(1, min(max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    print(f"📦 Received batch of {len(queries)} queries (concurrency {concurrency})")
+    start = time.perf_counter()
+    if knowledge_base_only:
+        rag_tool = _query_router.rag_tool
+        outputs = rag_tool.answer_batch(queries, max_concurrency=concurrency, trace_kind="ask_batch")
+        results = [
+            {"success": output.get("success", False), "tool": rag_tool.name, "result": output}
+            for output in outputs
+        ]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ask-batch") as pool:
+            results = list(pool.map(_route_traced, queries))
+
+    elapsed = time.perf_counter() - start
+    print(f"📦 Batch finished in {elapsed:.2f}s")
+    return {
+        "success": True,
+        "results": [dict(result, query=query) for query, result in zip(queries, results)],
+        "elapsed_seconds": round(elapsed, 3)
+    }
+
+
+def handle_chat_query_stream(query: str):
+    """Streaming variant of handle_chat_query, yields router events."""
+    print(f"💬 Received streaming query: {query}")
+    if not _query_router:
+        yield {"type": "error", "error": "QueryRouter not initialized."}
+        return
+
+    start = time.perf_counter()
+    first_token = True
+    # The response may resume this generator on different threads, so the trace is
+    # activated per step rather than once around the loop
+    trace = RequestTrace(query, "ask_stream")
+    try:
+        for event in traced_iter(_query_router.route_query_stream(query), trace):
+            if event["type"] == "token" and first_token:
+                first_token = False
+                print(f"⏱️ First token after {time.perf_counter() - start:.2f}s")
+            yield event
+    finally:
+        entry = trace.finish()
+    print(f"🧠 Streaming finished after {time.perf_counter() - start:.2f}s, "
+          f"{entry['llm_ms']:.0f} ms in {len(entry['calls'])} LLM calls")
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit rates of the serving caches."""
+    stats = {"ollama_single_flight": get_generation_stats()}
+    if _query_router is not None and _query_router.rag_tool.answer_cache is not None:
+        stats["semantic_answer_cache"] = _query_router.rag_tool.answer_cache.stats()
+    return stats
+
+
+def get_retrieval_stats() -> Dict[str, Any]:
+    """Latency and batching statistics of the retrieval stages."""
+    stats = {}
+    if _rag_engine is not None:
+        if _rag_engine.embedding_handler.query_batcher is not None:
+            stats["query_embedding_batcher"] = _rag_engine.embedding_handler.query_batcher.stats()
+        if _rag_engine.reranker is not None:
+            stats["reranker"] = _rag_engine.reranker.stats()
+    if _query_router is not None:
+        stats["speculative_retrieval"] = _query_router.rag_tool.prefetch_stats()
+    return stats
+
+
+def get_routing_stats() -> Dict[str, Any]:
+    """How queries were routed: from the routing cache, directly by the intent router or through the agent."""
+    stats = {}
+    if _query_router is not None and _query_router.intent_router is not None:
+        stats["intent_router"] = _query_router.intent_router.stats()
+    if _query_router is not None and _query_router.routing_cache is not None:
+        stats["routing_cache"] = _query_router.routing_cache.stats()
+    return stats
+
+
+def get_tool_stats() -> Dict[str, Any]:
+    """Session health and per-tool call latency of the pooled MCP servers, and how often tool outputs were answered from templates."""
+    stats = {"response_formatter": get_formatter_stats()}
+    if MAPS_MCP_POOL_SIZE > 0:
+        stats["google-maps"] = get_maps_pool().stats()
+    return stats
+
+
+def get_llm_call_metrics() -> Dict[str, Any]:
+    """Latency and token histograms of the LLM calls per provider, model and caller."""
+    return get_llm_metrics()
+
+
 def reload_knowledge_base() -> Dict[str, Any]:
     """Optional: reload knowledge base manually"""
     global _kb_manager, _rag_engine, _query_router, _metadata_store, _text_index, _image_index
 
     print("♻️ Reloading knowledge base...")
+    old_engine = _rag_engine
     _kb_manager = KnowledgeBaseManager()
     _metadata_store, _text_index, _image_index = _kb_manager.build_or_load_knowledge_base(DOCS_DIR, IMG_DIR)
     _rag_engine = RAGEngine()
@@ -65,4 +296,9 @@ def reload_knowledge_base() -> Dict[str, Any]:
         text_index=_text_index,
         image_index=_image_index
     )
+    if old_engine is not None:
+        # Requests still using the old engine fall back to unbatched embeddings
+        old_engine.embedding_handler.close()
+    # The new RAGEngine starts cold, warm it up again
+    start_warm_up()
     return {"success": True, "message": "Knowledge base reloaded successfully."}
@@ -10,6 +10,38 @@ from .main import main as run_bot
 from .config import DOCS_DIR, IMG_DIR
 
 
+def run_export_onnx(quantize=True, parity_file=None, img_dir=IMG_DIR, samples=32):
+    """Export the encoders to ONNX, then compare against PyTorch on sample inputs"""
+    import json
+    import os
+    from .core.embedding_handler import EmbeddingHandler
+    from .core.onnx_encoder import export_text_encoder, export_clip_encoders, check_parity
+    from .core.document_parser import get_all_files_in_directory
+    from .config import METADATA_FILE
+
+    handler = EmbeddingHandler()
+    handler.backend = "torch"  # Export always starts from the PyTorch models
+    export_text_encoder(handler.text_model, quantize=quantize)
+    export_clip_encoders(handler.clip_model, handler.clip_processor, quantize=quantize)
+
+    if parity_file:
+        with open(parity_file, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()][:samples]
+    elif os.path.exists(METADATA_FILE):
+        with open(METADATA_FILE, "r", encoding="utf-8") as f:
+            texts = [item["content"] for item in json.load(f) if item.get("type") == "text"][:samples]
+    else:
+        texts = ["What are the current ticket policies?", "When does the park open?", "Is there a parade tonight?"]
+    image_paths = get_all_files_in_directory(img_dir, ['.png', '.jpg', '.jpeg', '.bmp', '.gif'])[:samples] if os.path.isdir(img_dir) else []
+
+    report = check_parity(handler, texts, image_paths, quantized=quantize)
+    if report["passed"]:
+        print("ONNX parity check passed. Set EMBEDDING_BACKEND=onnx to serve with ONNX Runtime.")
+    else:
+        print("❌ ONNX parity check failed, keep EMBEDDING_BACKEND=torch (or retry with --no-quantize).")
+    return report
+
+
 def main():
     parser = argparse.ArgumentParser(description="RAG Knowledge Base Management Tool")
     subparsers = parser.add_subparsers(dest="action", help="Available operations")
@@ -52,6 +84,35 @@ def main():
         help="Image directory path (default: %(default)s)"
     )
 
+    # Export ONNX subcommand
+    onnx_parser = subparsers.add_parser("export-onnx", help="Export text/CLIP encoders to ONNX and check parity with PyTorch")
+    onnx_parser.add_argument(
+        "--no-quantize",
+        action="store_true",
+        default=False,
+        help="Skip dynamic int8 quantization"
+    )
+    onnx_parser.add_argument(
+        "--parity-file",
+        default=None,
+        help="Text file with one sample sentence per line for the parity check (default: chunks from the metadata store)"
+    )
+    onnx_parser.add_argument(
+        "--img-dir",
+        default=IMG_DIR,
+        help="Image directory used for the CLIP vision parity check (default: %(default)s)"
+    )
+
+    # PDF benchmark subcommand
+    bench_pdf_parser = subparsers.add_parser("bench-pdf", help="Compare PDF extraction throughput of the available backends")
+    bench_pdf_parser.add_argument("files", nargs="+", help="PDF files to parse")
+    bench_pdf_parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for page-range extraction (default: PDF_PARALLEL_WORKERS)"
+    )
+
     args = parser.parse_args()
 
     if args.action == "build":
@@ -67,6 +128,13 @@ def main():
         print("Starting RAG conversation bot...")
         run_bot()
     
+    elif args.action == "export-onnx":
+        run_export_onnx(quantize=not args.no_quantize, parity_file=args.parity_file, img_dir=args.img_dir)
+
+    elif args.action == "bench-pdf":
+        from .core.document_parser import benchmark_pdf_backends
+        benchmark_pdf_backends(args.files, workers=args.workers)
+
     elif args.action is None:
         parser.print_help()
 
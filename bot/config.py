@@ -8,20 +8,149 @@ DATA_DIR = os.getenv("DATA_DIR", "data")
 TEXT_FAISS_FILE = os.path.join(DATA_DIR, "text_index.index")
 IMAGE_FAISS_FILE = os.path.join(DATA_DIR, "image_index.index")
 METADATA_FILE = os.path.join(DATA_DIR, "metadata_store.json")
+PROJECTION_REPORT_FILE = os.path.join(DATA_DIR, "projection_report.json")
+SCAN_MANIFEST_FILE = os.path.join(DATA_DIR, "scan_manifest.json")
 
 IMAGE_EMBEDDING_DIM = 512
 
+# Optional PCA projection of stored and query vectors (0 disables), trained at build time
+TEXT_PCA_DIM = int(os.getenv("TEXT_PCA_DIM", "0"))
+IMAGE_PCA_DIM = int(os.getenv("IMAGE_PCA_DIM", "0"))
+PROJECTION_RECALL_K = int(os.getenv("PROJECTION_RECALL_K", "10"))
+
 # Model configuration
 TEXT_EMBEDDING_MODEL = os.getenv("TEXT_EMBEDDING_MODEL", 'all-MiniLM-L6-v2')
 CLIP_MODEL_NAME = os.getenv("CLIP_MODEL_NAME", "openai/clip-vit-base-patch32")
 
+# PDF text extraction backend: "pypdfium2", "pdfminer" or "pypdf2"
+PDF_BACKEND = os.getenv("PDF_BACKEND", "pypdfium2").lower()
+PDF_PARALLEL_WORKERS = int(os.getenv("PDF_PARALLEL_WORKERS", "1"))  # >1 extracts page ranges in worker processes
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+# On-disk cache of parsed documents, keyed by content hash and parser version
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE_ENABLED", "true").lower() == "true"
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.join(DATA_DIR, "parse_cache"))
+PARSE_CACHE_MAX_MB = float(os.getenv("PARSE_CACHE_MAX_MB", "512"))
+# Documents whose parsed chunks exceed this are not cached (the parse is streamed, never held in memory)
+PARSE_CACHE_MAX_ENTRY_MB = float(os.getenv("PARSE_CACHE_MAX_ENTRY_MB", "64"))
+
+# Embedding inference backend: "torch" (eager PyTorch) or "onnx" (ONNX Runtime on CPU)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(DATA_DIR, "onnx"))
+# Default for export-onnx; serving loads whichever variant the export manifest records
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "true").lower() == "true"
+ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0"))  # 0 lets ONNX Runtime decide
+ONNX_PARITY_MIN_COSINE = float(os.getenv("ONNX_PARITY_MIN_COSINE", "0.99"))
+
+# Micro-batching of concurrent query embeddings
+EMBEDDING_MICRO_BATCHING = os.getenv("EMBEDDING_MICRO_BATCHING", "true").lower() == "true"
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "3"))  # Only waited when other queries are queued
+
 # Ollama model configuration
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
 OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.3"))
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # How long Ollama keeps the model loaded after a request
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))  # 0 keeps the model's default context size
+OLLAMA_MAX_INFLIGHT = int(os.getenv("OLLAMA_MAX_INFLIGHT", "2"))  # Ollama serializes generations per model anyway
+OLLAMA_POOL_CONNECTIONS = int(os.getenv("OLLAMA_POOL_CONNECTIONS", "8"))
+# Identical concurrent prompts share one generation; answers are reused for a few seconds
+OLLAMA_COALESCE_REQUESTS = os.getenv("OLLAMA_COALESCE_REQUESTS", "true").lower() == "true"
+OLLAMA_RESULT_CACHE_TTL = float(os.getenv("OLLAMA_RESULT_CACHE_TTL", "10"))
+
+# Per-call LLM accounting: per-request traces are appended to daily JSONL files
+LLM_TRACE_ENABLED = os.getenv("LLM_TRACE_ENABLED", "true").lower() == "true"
+LLM_TRACE_DIR = os.getenv("LLM_TRACE_DIR", os.path.join(DATA_DIR, "traces"))
 
 # Retrieval configuration
 DEFAULT_RETRIEVAL_K = int(os.getenv("DEFAULT_RETRIEVAL_K", "7"))
+# Images are found through their OCR/caption text; CLIP only re-scores image hits when enabled
+CLIP_IMAGE_RESCORE = os.getenv("CLIP_IMAGE_RESCORE", "false").lower() == "true"
+CLIP_RESCORE_CANDIDATES = int(os.getenv("CLIP_RESCORE_CANDIDATES", "10"))
+
+# Startup warm-up: comma-separated components out of text_model, clip, reranker, intent_router, maps_mcp, ollama
+# CLIP is only needed at query time for re-scoring, so it is only loaded by default then
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+WARMUP_COMPONENTS = [c.strip() for c in os.getenv(
+    "WARMUP_COMPONENTS", "text_model,clip,ollama" if CLIP_IMAGE_RESCORE else "text_model,ollama"
+).split(",") if c.strip()]
+# /ready fails (503) when a warm-up component failed, unless this is set
+READY_WHEN_DEGRADED = os.getenv("READY_WHEN_DEGRADED", "false").lower() == "true"
+# Threads for retrieval branches that run alongside the request thread
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+
+# Batch queries (/ask_batch)
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "200"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+# Cross-encoder re-ranking: over-fetch candidates, keep those scoring above the cutoff
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_SCORE_CUTOFF = float(os.getenv("RERANK_SCORE_CUTOFF", "0.0"))  # ms-marco models output logits
+RERANK_MIN_KEEP = int(os.getenv("RERANK_MIN_KEEP", "1"))
+
+# RAG prompt context packing, token counts are estimated
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))  # 0 disables packing
+RAG_CHUNK_MAX_TOKENS = int(os.getenv("RAG_CHUNK_MAX_TOKENS", "400"))
+RAG_DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))
+
+# Semantic answer cache: reuse an answer for near-identical queries with identical retrieval results
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+# Embedding-based intent routing: confident knowledge base and SQL queries skip the Qwen agent
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+INTENT_ROUTER_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.55"))
+INTENT_ROUTER_MARGIN = float(os.getenv("INTENT_ROUTER_MARGIN", "0.08"))
+# The thresholds hold for English; all-MiniLM-L6-v2 does not embed Chinese meaningfully
+INTENT_ROUTER_CJK_ENABLED = os.getenv("INTENT_ROUTER_CJK_ENABLED", "false").lower() == "true"
+
+# Routing decision cache: the agent's tool call is reused for repeated queries
+ROUTING_CACHE_ENABLED = os.getenv("ROUTING_CACHE_ENABLED", "true").lower() == "true"
+ROUTING_CACHE_TTL = float(os.getenv("ROUTING_CACHE_TTL", "3600"))
+ROUTING_CACHE_MAX_ENTRIES = int(os.getenv("ROUTING_CACHE_MAX_ENTRIES", "2000"))
+# Tools whose arguments depend on the current time ("today", "tomorrow") are never cached
+ROUTING_CACHE_BYPASS_TOOLS = [t.strip() for t in os.getenv("ROUTING_CACHE_BYPASS_TOOLS", "get_weather").split(",") if t.strip()]
+
+# Compound questions: the agent may plan several tool calls, run concurrently and answered together
+ROUTER_TOOL_WORKERS = int(os.getenv("ROUTER_TOOL_WORKERS", "4"))
+ROUTER_MAX_TOOL_CALLS = int(os.getenv("ROUTER_MAX_TOOL_CALLS", "4"))
+
+# Knowledge base retrieval starts while the agent is still choosing a tool; unused results are dropped
+SPECULATIVE_RETRIEVAL_ENABLED = os.getenv("SPECULATIVE_RETRIEVAL_ENABLED", "true").lower() == "true"
+# Threads for speculative retrievals; one is skipped rather than queued when all of them are busy
+SPECULATIVE_RETRIEVAL_WORKERS = int(os.getenv("SPECULATIVE_RETRIEVAL_WORKERS", "2"))
+
+# Google Maps MCP server: persistent sessions shared across requests
+MAPS_MCP_TRANSPORT = os.getenv("MAPS_MCP_TRANSPORT", "stdio")  # stdio, sse or streamable-http
+MAPS_MCP_COMMAND = os.getenv("MAPS_MCP_COMMAND", "npx")
+MAPS_MCP_ARGS = os.getenv("MAPS_MCP_ARGS", "-y @modelcontextprotocol/server-google-maps").split()
+MAPS_MCP_URL = os.getenv("MAPS_MCP_URL", "")  # For the sse and streamable-http transports
+MAPS_MCP_POOL_SIZE = int(os.getenv("MAPS_MCP_POOL_SIZE", "2"))  # 0 lets qwen-agent manage the server as before
+MAPS_MCP_PING_INTERVAL = float(os.getenv("MAPS_MCP_PING_INTERVAL", "30"))
+MAPS_MCP_CALL_TIMEOUT = float(os.getenv("MAPS_MCP_CALL_TIMEOUT", "30"))
+
+# Weather, SQL and maps outputs of a known shape are answered from zh/en templates instead of the LLM
+TEMPLATE_FORMATTER_ENABLED = os.getenv("TEMPLATE_FORMATTER_ENABLED", "true").lower() == "true"
 
 # System name configuration
 SYSTEM_NAME = os.getenv("SYSTEM_NAME", "Intelligent Q&A Assistant")
-SYSTEM_ROLE = os.getenv("SYSTEM_ROLE", "You are a professional assistant of a theme park.")
\ No newline at end of file
+SYSTEM_ROLE = os.getenv("SYSTEM_ROLE", "You are a professional assistant of a theme park.")
+
+# Offline load testing: stand-in Ollama and DashScope servers (python -m bot.loadtest)
+LOADTEST_OLLAMA_PORT = int(os.getenv("LOADTEST_OLLAMA_PORT", "11435"))
+LOADTEST_DASHSCOPE_PORT = int(os.getenv("LOADTEST_DASHSCOPE_PORT", "8090"))
+LOADTEST_OLLAMA_PROMPT_TOKENS_PER_S = float(os.getenv("LOADTEST_OLLAMA_PROMPT_TOKENS_PER_S", "400"))
+LOADTEST_OLLAMA_TOKENS_PER_S = float(os.getenv("LOADTEST_OLLAMA_TOKENS_PER_S", "20"))
+LOADTEST_OLLAMA_COMPLETION_TOKENS = int(os.getenv("LOADTEST_OLLAMA_COMPLETION_TOKENS", "80"))
+LOADTEST_OLLAMA_PARALLEL = int(os.getenv("LOADTEST_OLLAMA_PARALLEL", "1"))  # Like OLLAMA_NUM_PARALLEL
+LOADTEST_DASHSCOPE_TTFT_MS = float(os.getenv("LOADTEST_DASHSCOPE_TTFT_MS", "400"))
+LOADTEST_DASHSCOPE_TOKENS_PER_S = float(os.getenv("LOADTEST_DASHSCOPE_TOKENS_PER_S", "60"))
+LOADTEST_DASHSCOPE_TOOL = os.getenv("LOADTEST_DASHSCOPE_TOOL", "search_knowledge_base")  # A tool name, "auto" or "none"
+LOADTEST_WEATHER_LOCATION = os.getenv("LOADTEST_WEATHER_LOCATION", "Shanghai")
+# The Google Maps MCP stand-in (bot/loadtest/maps_mcp_stand_in.py) reads LOADTEST_MAPS_MCP_PORT and
+# LOADTEST_MAPS_LATENCY_MS itself, it runs without importing the bot package
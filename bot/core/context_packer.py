@@ -0,0 +1,108 @@
+"""
+Token-budgeted assembly of retrieved chunks for RAG prompts.
+
+Token counts are estimated: each CJK character counts as one token and other
+text as one token per four characters, which is close to what the Llama
+tokenizers produce for our Chinese/English documents without loading one.
+"""
+import re
+
+from ..config import RAG_CONTEXT_TOKEN_BUDGET, RAG_CHUNK_MAX_TOKENS, RAG_DEDUP_THRESHOLD
+
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+_WORD = re.compile(r"\w+")
+
+# Truncated pieces shorter than this are not worth their prompt space
+MIN_TRUNCATED_TOKENS = 32
+
+
+def estimate_tokens(text):
+    """Approximate token count of text"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to roughly max_tokens, preferring to stop at a sentence or line end"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle] + " ...") <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low]
+    boundary = max(cut.rfind(mark) for mark in ("\n", "。", ". ", "！", "？", "! ", "? "))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + " ..."
+
+
+def _shingles(text):
+    """Word bigrams, or character bigrams for CJK text"""
+    words = _WORD.findall(text.lower())
+    if len(_CJK.findall(text)) > len(words):
+        chars = [c for c in text if not c.isspace()]
+        return {a + b for a, b in zip(chars, chars[1:])}
+    return {f"{a} {b}" for a, b in zip(words, words[1:])} or set(words)
+
+
+def _is_redundant(shingles, kept_shingles, threshold):
+    """True if the chunk is (nearly) contained in an already kept chunk"""
+    if not shingles:
+        return True
+    for kept in kept_shingles:
+        if len(shingles & kept) / len(shingles) >= threshold:
+            return True
+    return False
+
+
+def pack_context(items, budget=RAG_CONTEXT_TOKEN_BUDGET, max_chunk_tokens=RAG_CHUNK_MAX_TOKENS,
+                 dedup_threshold=RAG_DEDUP_THRESHOLD):
+    """
+    Select, order and truncate retrieved context items to fit a token budget
+    :param items: Context items with "content" and optional "score" (higher is more relevant)
+    :param budget: Maximum estimated tokens for all chunk contents together, 0 disables packing
+    :param max_chunk_tokens: Longer chunks are truncated to this many tokens
+    :param dedup_threshold: Share of a chunk's shingles found in a kept chunk that makes it redundant
+    :return: (packed items ordered by relevance, stats dict)
+    """
+    stats = {"candidates": len(items), "packed": 0, "duplicates": 0, "truncated": 0,
+             "over_budget": 0, "context_tokens": 0}
+    if budget <= 0:
+        stats["packed"] = len(items)
+        stats["context_tokens"] = sum(estimate_tokens(item.get("content", "")) for item in items)
+        return list(items), stats
+
+    # Stable sort keeps retrieval order for equal or missing scores
+    ordered = sorted(items, key=lambda item: item.get("score") if item.get("score") is not None else float("-inf"),
+                     reverse=True)
+    packed, kept_shingles, used = [], [], 0
+    for item in ordered:
+        content = item.get("content", "")
+        shingles = _shingles(content)
+        if _is_redundant(shingles, kept_shingles, dedup_threshold):
+            stats["duplicates"] += 1
+            continue
+
+        remaining = budget - used
+        limit = min(max_chunk_tokens, remaining) if max_chunk_tokens > 0 else remaining
+        if limit < MIN_TRUNCATED_TOKENS and estimate_tokens(content) > limit:
+            stats["over_budget"] += 1
+            continue
+        truncated = truncate_to_tokens(content, limit)
+        if truncated != content:
+            stats["truncated"] += 1
+            item = dict(item, content=truncated)
+
+        used += estimate_tokens(truncated)
+        kept_shingles.append(shingles)
+        packed.append(item)
+
+    stats["packed"] = len(packed)
+    stats["context_tokens"] = used
+    return packed, stats
@@ -0,0 +1,106 @@
+"""
+Lazy directory scanning with os.scandir and a persisted directory-mtime manifest.
+
+A directory's mtime changes when entries are added, removed or renamed in it.
+Directories whose mtime is unchanged since the last successful build are not
+listed again: their files are already in the knowledge base and their
+subdirectories are taken from the manifest (nested changes do not bubble up
+to parent mtimes, so subdirectories are always visited).
+"""
+import os
+import json
+
+from ..config import SCAN_MANIFEST_FILE
+
+
+def normalize_extensions(extensions):
+    """['docx', '.PDF'] -> ['.docx', '.pdf']"""
+    normalized_extensions = []
+    for ext in extensions or []:
+        if not ext.startswith('.'):
+            ext = '.' + ext
+        normalized_extensions.append(ext.lower())
+    return normalized_extensions
+
+
+class ScanManifest:
+    """
+    Directory mtimes and subdirectories seen by previous scans, per scan root and extension set
+    """
+    def __init__(self, path=SCAN_MANIFEST_FILE):
+        self.path = path
+        self.sections = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.sections = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Scan manifest unreadable, scanning everything: {e}")
+
+    @staticmethod
+    def scan_key(directory, extensions):
+        return f"{os.path.abspath(directory)}|{','.join(sorted(normalize_extensions(extensions)))}"
+
+    def reset(self):
+        """Forget everything, e.g. after a full rebuild replaced the knowledge base"""
+        self.sections = {}
+
+    def save(self):
+        # Drop sections of roots that no longer exist (e.g. temporary upload directories)
+        self.sections = {key: section for key, section in self.sections.items()
+                         if os.path.isdir(key.rsplit("|", 1)[0])}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.sections, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def scan_directory(directory, extensions=None, manifest=None, prune=True):
+    """
+    Lazily yield files in directory and its subdirectories
+    :param directory: Directory path
+    :param extensions: List of file extensions to find, e.g., ['.docx', '.pdf'], if None yields all files
+    :param manifest: Optional ScanManifest, updated with the directories seen by this scan
+    :param prune: Skip files of directories unchanged since the manifest was recorded
+    :return: Generator of file paths
+    """
+    normalized_extensions = normalize_extensions(extensions)
+    key = ScanManifest.scan_key(directory, extensions) if manifest is not None else None
+    previous = manifest.sections.get(key, {}) if manifest is not None and prune else {}
+    seen = {}
+
+    stack = [directory]
+    while stack:
+        dir_path = stack.pop()
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            continue  # Removed while scanning
+
+        recorded = previous.get(dir_path)
+        if recorded and recorded["mtime_ns"] == mtime_ns:
+            seen[dir_path] = recorded
+            stack.extend(recorded["subdirs"])
+            continue
+
+        subdirs = []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.startswith('.'):
+                        continue  # Skip hidden files
+                    elif entry.is_file():
+                        if not normalized_extensions or os.path.splitext(entry.name)[1].lower() in normalized_extensions:
+                            yield entry.path
+        except OSError as e:
+            print(f"Cannot scan directory {dir_path}: {e}")
+            continue
+        seen[dir_path] = {"mtime_ns": mtime_ns, "subdirs": subdirs}
+        stack.extend(subdirs)
+
+    # Only record the scan once every file has been handed out
+    if manifest is not None:
+        manifest.sections[key] = seen
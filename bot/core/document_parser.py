@@ -1,7 +1,19 @@
 import os
+import io
+import time
+import codecs
+from concurrent.futures import ProcessPoolExecutor
 from docx import Document as DocxDocument
 import PyPDF2
 
+from ..config import PDF_BACKEND, PDF_PARALLEL_WORKERS, PDF_PAGES_PER_TASK
+from .directory_scanner import scan_directory
+
+# Bump whenever parser output changes, so cached parse results are not reused
+PARSER_VERSION = "3"
+# Always installed, used for the pages a faster backend could not read
+PDF_FALLBACK_BACKEND = "pypdf2"
+
 
 def parse_docx(file_path):
     """
@@ -34,75 +46,287 @@ def parse_docx(file_path):
     return chunks
 
 
-def parse_pdf(file_path):
+def _pdf_page_count(file_path, backend):
+    """Number of pages in a PDF for the given backend"""
+    if backend == "pypdfium2":
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    if backend == "pdfminer":
+        from pdfminer.pdfpage import PDFPage
+        with open(file_path, 'rb') as file:
+            return sum(1 for _ in PDFPage.get_pages(file))
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def _iter_page_range(file_path, backend, start=0, end=None):
     """
-    Parse PDF file and extract text content
-    :param file_path: PDF file path
-    :return: List containing text chunks
+    Lazily extract (page number, text) for pages [start, end), page numbers start at 1
     """
-    chunks = []
-    try:
+    if backend == "pypdfium2":
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            end = len(pdf) if end is None else min(end, len(pdf))
+            for index in range(start, end):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                text = textpage.get_text_range()
+                textpage.close()
+                page.close()
+                yield index + 1, text.replace("\r\n", "\n")
+        finally:
+            pdf.close()
+    elif backend == "pdfminer":
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+        page_numbers = None if end is None else range(start, end)
+        for offset, layout in enumerate(extract_pages(file_path, page_numbers=page_numbers)):
+            # Separate text boxes by a blank line so they split into paragraphs
+            text = "\n".join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+            yield start + offset + 1, text
+    elif backend == "pypdf2":
         with open(file_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                if text and text.strip():
-                    paragraphs = text.split('\n\n')
-                    for para in paragraphs:
-                        para = para.strip()
-                        if para:
-                            chunks.append({"type": "text", "content": para})
+            end = len(pdf_reader.pages) if end is None else min(end, len(pdf_reader.pages))
+            for index in range(start, end):
+                yield index + 1, pdf_reader.pages[index].extract_text()
+    else:
+        raise ValueError(f"Unsupported PDF backend: {backend}")
+
+
+def _extract_page_range(file_path, backend, start, end):
+    """Worker entry point for parallel extraction of one page range"""
+    return list(_iter_page_range(file_path, backend, start, end))
+
+
+def iter_pdf_pages(file_path, backend=None, workers=None, pages_per_task=None):
+    """
+    Lazily yield (page number, text) for every page of a PDF
+    :param file_path: PDF file path
+    :param backend: "pypdfium2", "pdfminer" or "pypdf2" (default: PDF_BACKEND)
+    :param workers: Worker processes for page ranges, 1 extracts in-process page by page
+    :param pages_per_task: Pages per worker task
+    """
+    backend = (backend or PDF_BACKEND).lower()
+    workers = PDF_PARALLEL_WORKERS if workers is None else workers
+    pages_per_task = pages_per_task or PDF_PAGES_PER_TASK
+
+    if workers <= 1:
+        yield from _iter_page_range(file_path, backend)
+        return
+
+    page_count = _pdf_page_count(file_path, backend)
+    if page_count <= pages_per_task:
+        yield from _iter_page_range(file_path, backend)
+        return
+
+    starts = list(range(0, page_count, pages_per_task))
+    with ProcessPoolExecutor(max_workers=min(workers, len(starts))) as executor:
+        # map keeps page order while ranges are extracted in parallel
+        for pages in executor.map(
+            _extract_page_range,
+            [file_path] * len(starts),
+            [backend] * len(starts),
+            starts,
+            [start + pages_per_task for start in starts]
+        ):
+            yield from pages
+
+
+def _pdf_page_chunks(page_no, text):
+    """Split one page's text into paragraph chunks"""
+    if text and text.strip():
+        for para in text.split('\n\n'):
+            para = para.strip()
+            if para:
+                yield {"type": "text", "content": para, "page": page_no}
+
+
+def parse_pdf(file_path, backend=None, errors=None):
+    """
+    Parse PDF file and extract text content page by page. If the backend is not
+    installed or fails on a page, the remaining pages are read with PyPDF2.
+    :param file_path: PDF file path
+    :param backend: PDF backend, defaults to PDF_BACKEND
+    :param errors: Optional list a parsing error is appended to, the output is then incomplete
+    :return: Generator of text chunks with their page number
+    """
+    backend = (backend or PDF_BACKEND).lower()
+    pages_done = 0
+    try:
+        for page_no, text in iter_pdf_pages(file_path, backend):
+            yield from _pdf_page_chunks(page_no, text)
+            pages_done = page_no
+        return
+    except Exception as e:
+        if backend == PDF_FALLBACK_BACKEND:
+            print(f"PDF parsing error {file_path}: {e}")
+            if errors is not None:
+                errors.append(e)
+            return
+        print(f"[Warning] {backend} failed on {file_path} after {pages_done} pages, continuing with PyPDF2: {e}")
+
+    try:
+        for page_no, text in _iter_page_range(file_path, PDF_FALLBACK_BACKEND, start=pages_done):
+            yield from _pdf_page_chunks(page_no, text)
     except Exception as e:
         print(f"PDF parsing error {file_path}: {e}")
-    return chunks
+        if errors is not None:
+            errors.append(e)
 
 
-def parse_txt(file_path):
+def benchmark_pdf_backends(file_paths, backends=("pypdf2", "pypdfium2", "pdfminer"), workers=None):
+    """
+    Compare PDF extraction throughput of the available backends
+    :param file_paths: PDF files to parse
+    :param backends: Backends to compare, "pypdf2" is the previous default path
+    :param workers: Worker processes passed to iter_pdf_pages
+    :return: Dict backend -> pages, chunks, seconds, pages_per_second
+    """
+    results = {}
+    for backend in backends:
+        pages = chunks = 0
+        start = time.perf_counter()
+        try:
+            for file_path in file_paths:
+                for page_no, text in iter_pdf_pages(file_path, backend, workers):
+                    pages += 1
+                    chunks += sum(1 for para in (text or "").split('\n\n') if para.strip())
+        except Exception as e:
+            results[backend] = {"error": str(e)}
+            print(f"{backend}: failed ({e})")
+            continue
+        seconds = time.perf_counter() - start
+        results[backend] = {
+            "pages": pages,
+            "chunks": chunks,
+            "seconds": round(seconds, 3),
+            "pages_per_second": round(pages / seconds, 1) if seconds > 0 else 0.0,
+        }
+        print(f"{backend}: {pages} pages, {chunks} chunks in {seconds:.2f}s ({results[backend]['pages_per_second']} pages/s)")
+    return results
+
+
+TXT_DETECT_PREFIX_BYTES = 64 * 1024
+# Flush very long paragraphs (e.g. logs without blank lines) instead of growing one chunk
+TXT_MAX_PARAGRAPH_CHARS = 20000
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+def detect_text_encoding(prefix):
+    """
+    Detect the encoding of a text file from its first bytes
+    :param prefix: Leading bytes of the file
+    :return: Encoding name, or None when the prefix is plain ASCII (still undecided)
+    """
+    for bom, encoding in _BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    if prefix.isascii():
+        return None
+    try:
+        # final=False tolerates a multi-byte character cut at the end of the prefix
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "gb18030"
+
+
+def _iter_text_lines(file_path):
+    """
+    Read a text file once, decoding line by line with the detected encoding
+    """
+    with open(file_path, 'rb', buffering=TXT_DETECT_PREFIX_BYTES) as file:
+        # peek fills the read buffer, so the prefix is not read twice
+        encoding = detect_text_encoding(file.peek(TXT_DETECT_PREFIX_BYTES)[:TXT_DETECT_PREFIX_BYTES])
+
+        if encoding in ("utf-16", "utf-32"):
+            # Newline bytes are not safe to split on for these encodings
+            yield from io.TextIOWrapper(file, encoding=encoding, errors="replace")
+            return
+        if encoding == "utf-8-sig":
+            file.read(len(codecs.BOM_UTF8))
+            encoding = "utf-8"
+
+        # b"\n" never occurs inside a UTF-8 or GB18030 multi-byte character
+        for raw in file:
+            if encoding is None:
+                if raw.isascii():
+                    line = raw.decode("ascii")
+                else:
+                    # First non-ASCII line settles the encoding, everything before was ASCII
+                    try:
+                        raw.decode("utf-8")
+                        encoding = "utf-8"
+                    except UnicodeDecodeError:
+                        encoding = "gb18030"
+                    line = raw.decode(encoding, errors="replace")
+            else:
+                line = raw.decode(encoding, errors="replace")
+            if line.endswith("\r\n"):
+                line = line[:-2] + "\n"
+            yield line
+
+
+def parse_txt(file_path, errors=None):
     """
     Parse TXT file and extract text content
     :param file_path: TXT file path
-    :return: List containing text chunks
+    :param errors: Optional list a parsing error is appended to, the output is then incomplete
+    :return: Generator of text chunks, paragraphs are separated by blank lines
     """
-    chunks = []
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-            if content.strip():
-                paragraphs = content.split('\n\n')
-                for para in paragraphs:
-                    para = para.strip()
-                    if para:
-                        chunks.append({"type": "text", "content": para})
+        buffer = []
+        size = 0
+        for line in _iter_text_lines(file_path):
+            if line == "\n":
+                para = "".join(buffer).strip()
+                if para:
+                    yield {"type": "text", "content": para}
+                buffer, size = [], 0
+                continue
+            buffer.append(line)
+            size += len(line)
+            if size >= TXT_MAX_PARAGRAPH_CHARS:
+                para = "".join(buffer).strip()
+                if para:
+                    yield {"type": "text", "content": para}
+                buffer, size = [], 0
+        para = "".join(buffer).strip()
+        if para:
+            yield {"type": "text", "content": para}
     except Exception as e:
         print(f"TXT parsing error {file_path}: {e}")
-        # Try other encoding
-        try:
-            with open(file_path, 'r', encoding='gbk') as file:
-                content = file.read()
-                if content.strip():
-                    paragraphs = content.split('\n\n')
-                    for para in paragraphs:
-                        para = para.strip()
-                        if para:
-                            chunks.append({"type": "text", "content": para})
-        except Exception as e2:
-            print(f"TXT parsing error (GBK) {file_path}: {e2}")
-    return chunks
+        if errors is not None:
+            errors.append(e)
 
 
-def parse_document(file_path):
+def parse_document(file_path, errors=None):
     """
     Parse document based on file extension
     :param file_path: Document file path
-    :return: List containing text and table chunks
+    :param errors: Optional list that collects errors the PDF and TXT parsers recover from
+    :return: Iterable of text and table chunks (PDF chunks carry their page number)
     """
     ext = os.path.splitext(file_path)[1].lower()
     if ext == '.docx':
         return parse_docx(file_path)
     elif ext == '.pdf':
-        return parse_pdf(file_path)
+        return parse_pdf(file_path, errors=errors)
     elif ext == '.txt':
-        return parse_txt(file_path)
+        return parse_txt(file_path, errors=errors)
     else:
         print(f"Unsupported file format: {ext}")
         return []
@@ -115,24 +339,4 @@ def get_all_files_in_directory(directory, extensions=None):
     :param extensions: List of file extensions to find, e.g., ['.docx', '.pdf'], if None returns all files
     :return: List of file paths
     """
-    if extensions is None:
-        extensions = []
-
-    normalized_extensions = []
-    for ext in extensions:
-        if not ext.startswith('.'):
-            ext = '.' + ext
-        normalized_extensions.append(ext.lower())
-
-    files = []
-    for root, dirs, filenames in os.walk(directory):
-        for filename in filenames:
-            if filename.startswith('.'):
-                continue  # Skip hidden files
-            if extensions:
-                _, ext = os.path.splitext(filename)
-                if ext.lower() in normalized_extensions:
-                    files.append(os.path.join(root, filename))
-            else:
-                files.append(os.path.join(root, filename))
-    return files
\ No newline at end of file
+    return list(scan_directory(directory, extensions))
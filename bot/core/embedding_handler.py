@@ -25,7 +25,17 @@ from paddleocr import PaddleOCR
 
 from transformers import CLIPProcessor, CLIPModel
 from sentence_transformers import SentenceTransformer
-from ..config import CLIP_MODEL_NAME
+from ..config import (
+    CLIP_MODEL_NAME, EMBEDDING_BACKEND,
+    EMBEDDING_MICRO_BATCHING, EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_WAIT_MS
+)
+from .micro_batcher import MicroBatcher
+
+
+def _load_image(image_path):
+    """Open an image path (or take an already loaded PIL image) as 224x224 RGB"""
+    image = image_path if isinstance(image_path, Image.Image) else Image.open(image_path)
+    return image.convert("RGB").resize((224, 224))
 
 
 class EmbeddingHandler:
@@ -39,6 +49,22 @@ class EmbeddingHandler:
         self._clip_model = None
         self._clip_processor = None
         self.TEXT_EMBEDDING_DIM = None
+
+        # Inference backend for the encoders ("torch" or "onnx")
+        self.backend = EMBEDDING_BACKEND
+        self._onnx_text_encoder = None
+        self._onnx_clip_encoder = None
+        # Each encoder falls back to PyTorch on its own, a broken CLIP export must not disable the text one
+        self._onnx_text_failed = False
+        self._onnx_clip_failed = False
+
+        # Concurrent query embeddings share one forward pass
+        self.query_batcher = MicroBatcher(
+            self.get_text_embeddings_offline,
+            max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=EMBEDDING_BATCH_WAIT_MS,
+            name="query-embedding-batcher"
+        ) if EMBEDDING_MICRO_BATCHING else None
         
         # OCR
         self.ocr_model = PaddleOCR(use_textline_orientation=True, lang='ch')
@@ -94,8 +120,53 @@ class EmbeddingHandler:
             print("CLIP processor loaded successfully.")
         return self._clip_processor
 
+    @property
+    def onnx_text_encoder(self):
+        if self._onnx_text_encoder is None and self.backend == "onnx" and not self._onnx_text_failed:
+            try:
+                from .onnx_encoder import OnnxTextEncoder
+                print("Loading ONNX text Embedding model...")
+                self._onnx_text_encoder = OnnxTextEncoder()
+                self.TEXT_EMBEDDING_DIM = self._onnx_text_encoder.dimension
+                print("ONNX text Embedding model loaded successfully.")
+            except Exception as e:
+                # Missing export or runtime, keep serving with PyTorch
+                self._disable_onnx("text", e)
+        return self._onnx_text_encoder
+
+    @property
+    def onnx_clip_encoder(self):
+        if self._onnx_clip_encoder is None and self.backend == "onnx" and not self._onnx_clip_failed:
+            try:
+                from .onnx_encoder import OnnxClipEncoder
+                print("Loading ONNX CLIP model...")
+                self._onnx_clip_encoder = OnnxClipEncoder()
+                print("ONNX CLIP model loaded successfully.")
+            except Exception as e:
+                self._disable_onnx("clip", e)
+        return self._onnx_clip_encoder
+
+    def _disable_onnx(self, encoder, error):
+        """
+        Switch one encoder to PyTorch after its ONNX session failed to load or run
+        :param encoder: "text" or "clip"
+        :param error: The exception that was raised
+        """
+        print(f"[Warning] ONNX {encoder} encoder unavailable, falling back to PyTorch: {error}")
+        if encoder == "text":
+            self._onnx_text_encoder = None
+            self._onnx_text_failed = True
+        else:
+            self._onnx_clip_encoder = None
+            self._onnx_clip_failed = True
+
     def get_text_embedding_offline(self, text):
         """Get text embedding"""
+        if self.onnx_text_encoder is not None:
+            try:
+                return self.onnx_text_encoder.encode([text])[0]
+            except Exception as e:
+                self._disable_onnx("text", e)
         try:
             vector = self.text_model.encode(text)
             return (vector / np.linalg.norm(vector)).astype("float32")
@@ -108,9 +179,38 @@ class EmbeddingHandler:
             else:
                 raise e
 
+    def get_text_embeddings_offline(self, texts):
+        """Get text embeddings for a list of texts in one forward pass"""
+        if self.onnx_text_encoder is not None:
+            try:
+                return self.onnx_text_encoder.encode(list(texts))
+            except Exception as e:
+                self._disable_onnx("text", e)
+        try:
+            vectors = self.text_model.encode(list(texts), batch_size=max(1, len(texts)))
+        except RuntimeError as e:
+            if "meta tensor" in str(e):
+                self._text_model = None  # Clear cache
+                vectors = self.text_model.encode(list(texts), batch_size=max(1, len(texts)))
+            else:
+                raise e
+        vectors = np.asarray(vectors, dtype="float32")
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype("float32")
+
+    def get_query_embedding(self, text):
+        """Get query embedding, micro-batched with concurrent queries when enabled"""
+        if self.query_batcher is None:
+            return self.get_text_embedding_offline(text)
+        return self.query_batcher(text)
+
     def get_clip_text_embedding_cpu(self, text):
         """CLIP text vectorization"""
         print(f"CLIP text vectorization: {text}")
+        if self.onnx_clip_encoder is not None:
+            try:
+                return self.onnx_clip_encoder.encode_text([text])[0]
+            except Exception as e:
+                self._disable_onnx("clip", e)
         try:
             inputs = self.clip_processor(text=[text], return_tensors="pt", padding=True)
             # Ensure input tensors are moved to correct device
@@ -139,8 +239,14 @@ class EmbeddingHandler:
 
     def get_image_embedding_mps(self, image_path):
         """Get image embedding"""
+        if self.onnx_clip_encoder is not None:
+            image = _load_image(image_path)  # A bad image file is not an ONNX failure
+            try:
+                return self.onnx_clip_encoder.encode_images([image])[0]
+            except Exception as e:
+                self._disable_onnx("clip", e)
         try:
-            image = Image.open(image_path).convert("RGB").resize((224, 224))
+            image = _load_image(image_path)
             inputs = self.clip_processor(images=image, return_tensors="pt", padding=True)
             # Ensure input tensors are moved to correct device
             for key, value in inputs.items():
@@ -154,7 +260,7 @@ class EmbeddingHandler:
             if "meta tensor" in str(e):
                 # If meta tensor error occurs, reinitialize model
                 self._clip_model = None  # Clear cache
-                image = Image.open(image_path).convert("RGB").resize((224, 224))
+                image = _load_image(image_path)
                 inputs = self.clip_processor(images=image, return_tensors="pt", padding=True)
                 # Ensure input tensors are moved to correct device
                 for key, value in inputs.items():
@@ -167,6 +273,26 @@ class EmbeddingHandler:
             else:
                 raise e
 
+    def close(self):
+        """Stop the query batcher's worker thread, which otherwise keeps this handler and its models alive"""
+        if self.query_batcher is not None:
+            self.query_batcher.close()
+
+    def warm_up(self, component):
+        """
+        Load a model and run it once on a dummy input
+        :param component: "text_model" or "clip"
+        """
+        if component == "text_model":
+            self.get_text_embedding_offline("warm-up")
+            if self.query_batcher is not None:
+                self.get_query_embedding("warm-up")
+        elif component == "clip":
+            self.get_clip_text_embedding_cpu("warm-up")
+            self.get_image_embedding_mps(Image.new("RGB", (224, 224)))
+        else:
+            raise ValueError(f"Unknown warm-up component: {component}")
+
     def image_to_text(self, image_path):
         """Extract text from image using OCR"""
         try:
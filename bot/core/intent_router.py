@@ -0,0 +1,192 @@
+"""
+Embedding-based intent routing ahead of the Qwen agent.
+
+A query is compared with labeled exemplar questions per tool using the text
+embedding model that is already loaded for retrieval. When the best tool wins
+clearly and takes the query itself as its only argument, the router can call it
+directly and skip the agent's function-calling round trip.
+
+The default text model (all-MiniLM-L6-v2) is English-only, so Chinese queries
+go to the agent unless routing them is enabled explicitly.
+"""
+import time
+import threading
+
+import numpy as np
+
+from .response_formatter import detect_language
+
+# Labeled exemplars per tool; "google-maps" stands for all tools of the maps MCP server
+DEFAULT_EXEMPLARS = {
+    "search_knowledge_base": [
+        "What time does the park open?",
+        "How much is a ticket for children?",
+        "Can I bring food into the park?",
+        "Is there a height requirement for the roller coaster?",
+        "Where can I rent a stroller?",
+        "What shows are on during the evening?",
+        "Are pets allowed in the park?",
+        "What is the refund policy for tickets?",
+        "Which rides are suitable for small kids?",
+        "Is there a discount for students or seniors?",
+        "乐园几点开门？",
+        "儿童票多少钱？",
+    ],
+    "text_to_sql": [
+        "How many visitors came last Saturday?",
+        "What month had the highest visitor flow last year?",
+        "When is the low season?",
+        "Which day had the fewest visitors in March?",
+        "Show the average daily visitors in summer",
+        "When are the peak and slack seasons?",
+        "How crowded was the park on national day?",
+        "Compare visitor numbers between weekdays and weekends",
+        "去年哪个月游客最多？",
+        "上周六有多少游客？",
+    ],
+    "get_weather": [
+        "What is the weather like tomorrow?",
+        "Will it rain this weekend?",
+        "What is the temperature in Shanghai today?",
+        "Do I need an umbrella on Friday?",
+        "How hot will it be next week?",
+        "Weather forecast for the park in two days",
+        "明天天气怎么样？",
+        "周末会下雨吗？",
+    ],
+    "google-maps": [
+        "How do I get to the park from the airport?",
+        "What is the best route from the train station?",
+        "How far is the park from downtown?",
+        "Find hotels near the park",
+        "Which subway line goes to the park?",
+        "How long does it take to drive to the park?",
+        "从机场怎么去乐园？",
+        "乐园附近有什么酒店？",
+    ],
+}
+
+# Tools whose only argument is the user's query; the others need arguments extracted by the agent
+DIRECT_TOOLS = ("search_knowledge_base", "text_to_sql")
+
+
+class IntentRouter:
+    """
+    Nearest-exemplar intent classifier; a tool's score is the cosine similarity of
+    its closest exemplar
+    """
+    def __init__(self, embedding_handler, threshold=0.55, margin=0.08, exemplars=None, direct_tools=DIRECT_TOOLS,
+                 route_cjk=False):
+        """
+        :param embedding_handler: EmbeddingHandler whose text model embeds queries and exemplars
+        :param threshold: Minimum similarity of the best tool for a confident decision
+        :param margin: Minimum lead of the best tool over the runner-up
+        :param exemplars: Dict of tool name -> example questions, DEFAULT_EXEMPLARS if None
+        :param direct_tools: Tools that may be called directly on a confident decision
+        :param route_cjk: Also classify Chinese queries; only meaningful with a multilingual text model
+        """
+        self.embedding_handler = embedding_handler
+        self.threshold = threshold
+        self.margin = margin
+        self.exemplars = exemplars or DEFAULT_EXEMPLARS
+        self.direct_tools = set(direct_tools)
+        self.route_cjk = route_cjk
+        self._matrix = None
+        self._labels = None
+        self._tools = sorted(self.exemplars)
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._decisions = {}
+        self._fallbacks = {"low_confidence": 0, "needs_arguments": 0, "unsupported_language": 0}
+        self._calls = 0
+        self._total_ms = 0.0
+
+    def _exemplar_matrix(self):
+        if self._matrix is None:
+            with self._load_lock:
+                if self._matrix is None:
+                    texts, labels = [], []
+                    for tool in self._tools:
+                        texts.extend(self.exemplars[tool])
+                        labels.extend([self._tools.index(tool)] * len(self.exemplars[tool]))
+                    # One forward pass for all exemplars; vectors come back normalized
+                    self._labels = np.asarray(labels)
+                    self._matrix = np.asarray(self.embedding_handler.get_text_embeddings_offline(texts), dtype="float32")
+        return self._matrix
+
+    def warm_up(self):
+        self._exemplar_matrix()
+
+    def supports(self, query):
+        """Whether the query's language is one the router's thresholds were set for"""
+        return self.route_cjk or detect_language(query) != "zh"
+
+    def classify(self, query, query_vec=None):
+        """
+        :param query_vec: Precomputed normalized query embedding, computed here if None
+        :return: (best tool, its score, lead over the runner-up)
+        """
+        matrix = self._exemplar_matrix()
+        if query_vec is None:
+            query_vec = self.embedding_handler.get_query_embedding(query)
+        similarities = matrix @ np.asarray(query_vec, dtype="float32").reshape(-1)
+        scores = np.full(len(self._tools), -1.0)
+        np.maximum.at(scores, self._labels, similarities)
+        order = np.argsort(scores)[::-1]
+        best = float(scores[order[0]])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else -1.0
+        return self._tools[order[0]], best, best - runner_up
+
+    def route(self, query, query_vec=None):
+        """
+        :return: Tool to call directly with the query, or None to let the agent decide
+        """
+        return self.decide(query, query_vec)[0]
+
+    def decide(self, query, query_vec=None):
+        """
+        :return: (tool to call directly or None, confidently recognized tool or None).
+                 The second is set for tools that need the agent's arguments as well.
+        """
+        if not self.supports(query):
+            with self._stats_lock:
+                self._calls += 1
+                self._fallbacks["unsupported_language"] += 1
+            print("🧭 Intent routing skipped for Chinese query → agent")
+            return None, None
+
+        start = time.perf_counter()
+        tool, score, lead = self.classify(query, query_vec)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if score < self.threshold or lead < self.margin:
+            decision, outcome = None, "low_confidence"
+        elif tool not in self.direct_tools:
+            decision, outcome = None, "needs_arguments"
+        else:
+            decision, outcome = tool, tool
+        with self._stats_lock:
+            self._calls += 1
+            self._total_ms += elapsed_ms
+            if decision is None:
+                self._fallbacks[outcome] += 1
+            else:
+                self._decisions[tool] = self._decisions.get(tool, 0) + 1
+
+        if decision is None:
+            print(f"🧭 Intent {tool} ({score:.2f}, lead {lead:.2f}) → agent ({outcome})")
+        else:
+            print(f"🧭 Intent {tool} ({score:.2f}, lead {lead:.2f}) in {elapsed_ms:.1f} ms → direct")
+        return decision, (None if outcome == "low_confidence" else tool)
+
+    def stats(self):
+        with self._stats_lock:
+            direct = sum(self._decisions.values())
+            classified = self._calls - self._fallbacks["unsupported_language"]
+            return {
+                "queries": self._calls,
+                "direct": dict(self._decisions),
+                "agent_fallbacks": dict(self._fallbacks),
+                "direct_rate": round(direct / self._calls, 4) if self._calls else 0.0,
+                "avg_classify_ms": round(self._total_ms / classified, 2) if classified else 0.0,
+            }
@@ -3,17 +3,170 @@ import json
 import numpy as np
 import faiss
 from ..config import (
-    TEXT_FAISS_FILE, IMAGE_FAISS_FILE, METADATA_FILE,
-    IMAGE_EMBEDDING_DIM, DOCS_DIR, IMG_DIR
+    TEXT_FAISS_FILE, IMAGE_FAISS_FILE, METADATA_FILE, PROJECTION_REPORT_FILE,
+    IMAGE_EMBEDDING_DIM, DOCS_DIR, IMG_DIR,
+    TEXT_PCA_DIM, IMAGE_PCA_DIM, PROJECTION_RECALL_K, PARSE_CACHE_ENABLED
 )
-from .document_parser import parse_document, get_all_files_in_directory
-from .embedding_handler import EmbeddingHandler
+from .directory_scanner import ScanManifest, scan_directory
+from .parse_cache import ParsedDocumentCache, parse_document_cached
+
+
+DOC_EXTENSIONS = ['.docx', '.pdf', '.txt']
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg', '.bmp', '.gif']
+IMAGE_CAPTION_SUFFIX = ".caption"
+
+
+def load_image_caption(img_path):
+    """
+    Read the optional caption of an image from a sidecar file
+    e.g. posters/parade.png -> posters/parade.png.caption
+    """
+    caption_path = img_path + IMAGE_CAPTION_SUFFIX
+    if not os.path.exists(caption_path):
+        return ""
+    try:
+        with open(caption_path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except Exception as e:
+        print(f"Caption reading error {caption_path}: {e}")
+        return ""
+
+
+def image_search_text(metadata):
+    """Text that represents an image in the text embedding space (caption + OCR)"""
+    return "\n".join(part for part in (metadata.get("caption", ""), metadata.get("ocr", "")) if part).strip()
+
+
+def index_legacy_image_text(metadata_store, text_index, embed_texts, batch_size=64):
+    """
+    Knowledge bases built before image text was indexed only have CLIP vectors for
+    their images. Add the stored caption/OCR text of those images to the text index,
+    so the text search finds them without a full rebuild.
+    :param embed_texts: Function mapping a list of texts to normalized vectors
+    :return: (images checked, images added to the text index)
+    """
+    pending = [m for m in metadata_store if m.get("type") == "image" and "text_indexed" not in m]
+    texts, ids = [], []
+    for metadata in pending:
+        caption = metadata.get("caption") or load_image_caption(metadata.get("path", ""))
+        if caption:
+            metadata["caption"] = caption
+        text = image_search_text(metadata)
+        metadata["text_indexed"] = bool(text)
+        if text:
+            texts.append(text)
+            ids.append(metadata["id"])
+    for start in range(0, len(texts), batch_size):
+        vectors = np.asarray(embed_texts(texts[start:start + batch_size]), dtype="float32")
+        text_index.add_with_ids(vectors, np.asarray(ids[start:start + batch_size], dtype="int64"))
+    return len(pending), len(ids)
+
+
+def build_vector_index(vectors, ids, dim, pca_dim=0):
+    """
+    Build an inner-product FAISS index, optionally behind a trained PCA projection
+    :param vectors: (N, dim) float32 normalized vectors
+    :param ids: N document ids
+    :param dim: Full vector dimension
+    :param pca_dim: Projected dimension, 0 keeps full-dimension vectors
+    :return: FAISS index with the vectors added
+    """
+    vectors = np.asarray(vectors, dtype="float32").reshape(-1, dim)
+    if pca_dim and 0 < pca_dim < dim and len(vectors) >= pca_dim:
+        # PCA -> re-normalize -> inner product; the transforms are saved inside the index
+        # file and applied to query vectors automatically at search time
+        index = faiss.IndexPreTransform(faiss.NormalizationTransform(pca_dim), faiss.IndexIDMap(faiss.IndexFlatIP(pca_dim)))
+        index.prepend_transform(faiss.PCAMatrix(dim, pca_dim))
+        index.train(vectors)
+    else:
+        if pca_dim and len(vectors) < pca_dim:
+            print(f"Only {len(vectors)} vectors, not enough to train a {pca_dim}-d projection, keeping {dim}-d vectors")
+        index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+    if len(vectors):
+        index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index
+
+
+def projection_recall_report(vectors, ids, index, k=PROJECTION_RECALL_K, max_queries=500, seed=0):
+    """
+    Recall@k of a (projected) index against exact full-dimension search,
+    using stored vectors as sample queries. Each query's own entry is left out of
+    both result lists, otherwise it is a guaranteed top-1 hit and inflates recall.
+    :return: Dict with recall@k, dimensions and index sizes
+    """
+    vectors = np.asarray(vectors, dtype="float32")
+    ids = np.asarray(ids, dtype="int64")
+    dim = vectors.shape[1]
+    k = min(k, len(vectors) - 1)
+    exact = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+    exact.add_with_ids(vectors, ids)
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(vectors), size=min(max_queries, len(vectors)), replace=False)
+    queries = vectors[sample]
+    recall = 1.0
+    if k > 0:
+        _, exact_ids = exact.search(queries, k + 1)
+        _, approx_ids = index.search(queries, k + 1)
+        overlaps = []
+        for own_id, e, a in zip(ids[sample], exact_ids, approx_ids):
+            e = [doc_id for doc_id in e if doc_id != own_id][:k]
+            a = [doc_id for doc_id in a if doc_id != own_id][:k]
+            overlaps.append(len(set(e) & set(a)) / k)
+        recall = float(np.mean(overlaps))
+
+    projected_dim = index.chain.at(0).d_out if isinstance(index, faiss.IndexPreTransform) else dim
+    return {
+        "vectors": int(len(vectors)),
+        "queries": int(len(queries)),
+        "k": int(k),
+        "recall": round(recall, 4),
+        "full_dim": int(dim),
+        "projected_dim": int(projected_dim),
+        "full_size_mb": round(len(vectors) * dim * 4 / 1e6, 3),
+        "projected_size_mb": round(len(vectors) * projected_dim * 4 / 1e6, 3),
+    }
 
 
 class KnowledgeBaseManager:
     def __init__(self):
+        # Imported here so the index helpers above can be used without the model stack
+        from .embedding_handler import EmbeddingHandler
         self.embedding_handler = EmbeddingHandler()
         self.TEXT_EMBEDDING_DIM = self.embedding_handler.TEXT_EMBEDDING_DIM
+        # Re-builds and re-embedding experiments reuse parse results of unchanged files
+        self.parse_cache = ParsedDocumentCache() if PARSE_CACHE_ENABLED else None
+        # Directory mtimes of the last successful build, lets incremental scans skip unchanged directories
+        self.scan_manifest = ScanManifest()
+
+    def _text_embedding_dim(self):
+        """Text embedding dimension (models are loaded lazily, so probe once if needed)"""
+        if self.TEXT_EMBEDDING_DIM is None:
+            self.TEXT_EMBEDDING_DIM = self.embedding_handler.TEXT_EMBEDDING_DIM \
+                or self.embedding_handler.get_text_embedding_offline("dimension probe").shape[0]
+        return self.TEXT_EMBEDDING_DIM
+
+    def _embed_image(self, img_path, relative_img_path, doc_id):
+        """
+        Build metadata and vectors for one image
+        :return: (metadata, CLIP image vector, text vector of caption + OCR or None)
+        """
+        ocr_text = self.embedding_handler.image_to_text(img_path)
+        metadata = {"id": doc_id, "source": f"Image: {relative_img_path}",
+                    "type": "image", "path": img_path, "ocr": ocr_text, "page": 1}
+        caption = load_image_caption(img_path)
+        if caption:
+            metadata["caption"] = caption
+        image_vector = self.embedding_handler.get_image_embedding_mps(img_path)
+
+        # Also index the image's text in the text space (same id) so a single
+        # text-vector search can surface the image without CLIP at query time
+        text_vector = None
+        search_text = image_search_text(metadata)
+        if search_text:
+            text_vector = self.embedding_handler.get_text_embedding_offline(search_text)
+        metadata["text_indexed"] = text_vector is not None
+        return metadata, image_vector, text_vector
 
     def load_existing_knowledge_base(self):
         """
@@ -25,6 +178,19 @@ class KnowledgeBaseManager:
         with open(METADATA_FILE, "r", encoding="utf-8") as f:
             metadata_store = json.load(f)
         print("FAISS index and metadata_store loaded successfully.")
+
+        checked, added = index_legacy_image_text(
+            metadata_store, text_index_map, self.embedding_handler.get_text_embeddings_offline
+        )
+        if checked:
+            print(f"Indexed the caption/OCR text of {added} of {checked} images from an older knowledge base")
+            try:
+                faiss.write_index(text_index_map, TEXT_FAISS_FILE)
+                with open(METADATA_FILE, "w", encoding="utf-8") as f:
+                    json.dump(metadata_store, f, ensure_ascii=False, indent=2)
+            except OSError as e:
+                # Still served from memory, and retried on the next load
+                print(f"[Warning] Could not save the upgraded knowledge base: {e}")
         return metadata_store, text_index_map, image_index_map
 
     def build_initial_knowledge_base(self, docs_dir=DOCS_DIR, img_dir=IMG_DIR):
@@ -34,22 +200,28 @@ class KnowledgeBaseManager:
         print("\n--- Building Initial Knowledge Base ---")
         metadata_store = []
         text_vectors = []
+        text_ids = []
         image_vectors = []
+        image_ids = []
         doc_id_counter = 0
 
-        # Recursively get all document files
-        doc_files = get_all_files_in_directory(docs_dir, ['.docx', '.pdf', '.txt'])
-        print(f"Found {len(doc_files)} document files")
+        # The knowledge base is replaced, so previously recorded directories are meaningless
+        self.scan_manifest.reset()
+
+        # Recursively scan document files, processing them as they are found
+        doc_files = scan_directory(docs_dir, DOC_EXTENSIONS, self.scan_manifest, prune=False)
+        doc_count = 0
 
         # Document vectorization
         for file_path in doc_files:
+            doc_count += 1
             filename = os.path.basename(file_path)
             print(f"Processing document: {file_path}")
-            chunks = parse_document(file_path)
+            chunks = parse_document_cached(file_path, self.parse_cache)
             for chunk in chunks:
                 # Save relative path as source information for easy file location tracking
                 relative_path = os.path.relpath(file_path, start=docs_dir)
-                metadata = {"id": doc_id_counter, "source": relative_path, "page": 1}
+                metadata = {"id": doc_id_counter, "source": relative_path, "page": chunk.get("page", 1)}
                 if chunk["type"] in ["text", "table"]:
                     text = chunk["content"]
                     if not text.strip():
@@ -58,47 +230,68 @@ class KnowledgeBaseManager:
                     metadata["content"] = text
                     vector = self.embedding_handler.get_text_embedding_offline(text)
                     text_vectors.append(vector)
+                    text_ids.append(doc_id_counter)
                     metadata_store.append(metadata)
                     doc_id_counter += 1
 
-        # Recursively get all image files
-        img_files = get_all_files_in_directory(img_dir, ['.png', '.jpg', '.jpeg', '.bmp', '.gif'])
-        print(f"Found {len(img_files)} image files")
+        print(f"Processed {doc_count} document files")
+
+        # Recursively scan image files
+        img_files = scan_directory(img_dir, IMAGE_EXTENSIONS, self.scan_manifest, prune=False)
+        img_count = 0
 
         # Image vectorization
         for img_path in img_files:
-            img_filename = os.path.basename(img_path)
+            img_count += 1
             relative_img_path = os.path.relpath(img_path, start=img_dir)
-            ocr_text = self.embedding_handler.image_to_text(img_path)
-            metadata = {"id": doc_id_counter, "source": f"Image: {relative_img_path}",
-                        "type": "image", "path": img_path, "ocr": ocr_text, "page": 1}
-            vector = self.embedding_handler.get_image_embedding_mps(img_path)
-            image_vectors.append(vector)
+            metadata, image_vector, text_vector = self._embed_image(img_path, relative_img_path, doc_id_counter)
+            image_vectors.append(image_vector)
+            image_ids.append(doc_id_counter)
+            if text_vector is not None:
+                text_vectors.append(text_vector)
+                text_ids.append(doc_id_counter)
             metadata_store.append(metadata)
             doc_id_counter += 1
 
-        # Build FAISS index
-        text_index = faiss.IndexFlatIP(self.TEXT_EMBEDDING_DIM)
-        text_index_map = faiss.IndexIDMap(text_index)
+        print(f"Processed {img_count} image files")
+
+        # Build FAISS index (optionally projected to fewer dimensions)
+        text_index_map = build_vector_index(text_vectors, text_ids, self._text_embedding_dim(), TEXT_PCA_DIM)
         if text_vectors:
-            text_ids = [m["id"] for m in metadata_store if m["type"]=="text"]
-            text_index_map.add_with_ids(np.array(text_vectors), np.array(text_ids))
             faiss.write_index(text_index_map, TEXT_FAISS_FILE)
 
-        image_index = faiss.IndexFlatIP(IMAGE_EMBEDDING_DIM)
-        image_index_map = faiss.IndexIDMap(image_index)
+        image_index_map = build_vector_index(image_vectors, image_ids, IMAGE_EMBEDDING_DIM, IMAGE_PCA_DIM)
         if image_vectors:
-            image_ids = [m["id"] for m in metadata_store if m["type"]=="image"]
-            image_index_map.add_with_ids(np.array(image_vectors), np.array(image_ids))
             faiss.write_index(image_index_map, IMAGE_FAISS_FILE)
 
+        self._report_projection({
+            "text": (text_vectors, text_ids, text_index_map),
+            "image": (image_vectors, image_ids, image_index_map),
+        })
+
         # Save metadata_store
         with open(METADATA_FILE, "w", encoding="utf-8") as f:
             json.dump(metadata_store, f, ensure_ascii=False, indent=2)
+        self.scan_manifest.save()
 
-        print(f"Initial knowledge base building completed: {len(text_vectors)} text, {len(image_vectors)} images")
+        print(f"Initial knowledge base building completed: {len(text_vectors)} text (including image text), {len(image_vectors)} images")
         return metadata_store, text_index_map, image_index_map
 
+    def _report_projection(self, indexes):
+        """Print and save recall of projected indexes against the full-dimension baseline"""
+        report = {}
+        for name, (vectors, ids, index) in indexes.items():
+            if vectors and isinstance(index, faiss.IndexPreTransform):
+                report[name] = projection_recall_report(vectors, ids, index)
+                r = report[name]
+                print(f"Projection report ({name}): {r['full_dim']}-d -> {r['projected_dim']}-d, "
+                      f"recall@{r['k']} {r['recall']:.2%}, "
+                      f"{r['full_size_mb']} MB -> {r['projected_size_mb']} MB")
+        if report:
+            with open(PROJECTION_REPORT_FILE, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
     def add_documents_to_knowledge_base(self, docs_dir=DOCS_DIR, img_dir=IMG_DIR):
         """
         Incrementally add documents to existing knowledge base
@@ -124,12 +317,13 @@ class KnowledgeBaseManager:
         existing_doc_paths = {item["source"] for item in metadata_store if item["type"] == "text"}
         existing_img_paths = {item["path"] for item in metadata_store if item["type"] == "image"}
 
-        # Recursively get all document files
-        doc_files = get_all_files_in_directory(docs_dir, ['.docx', '.pdf', '.txt'])
-        print(f"Found {len(doc_files)} document files")
+        # Lazily scan document files, directories unchanged since the last build are skipped
+        doc_files = scan_directory(docs_dir, DOC_EXTENSIONS, self.scan_manifest)
+        doc_count = 0
 
         # Document vectorization (incremental addition)
         for file_path in doc_files:
+            doc_count += 1
             relative_path = os.path.relpath(file_path, start=docs_dir)
             
             # Check if document already exists
@@ -139,9 +333,9 @@ class KnowledgeBaseManager:
                 
             filename = os.path.basename(file_path)
             print(f"Processing new document: {file_path}")
-            chunks = parse_document(file_path)
+            chunks = parse_document_cached(file_path, self.parse_cache)
             for chunk in chunks:
-                metadata = {"id": next_doc_id, "source": relative_path, "page": 1}
+                metadata = {"id": next_doc_id, "source": relative_path, "page": chunk.get("page", 1)}
                 if chunk["type"] in ["text", "table"]:
                     text = chunk["content"]
                     if not text.strip():
@@ -156,12 +350,15 @@ class KnowledgeBaseManager:
                     metadata_store.append(metadata)
                     next_doc_id += 1
 
-        # Recursively get all image files
-        img_files = get_all_files_in_directory(img_dir, ['.png', '.jpg', '.jpeg', '.bmp', '.gif'])
-        print(f"Found {len(img_files)} image files")
+        print(f"Found {doc_count} candidate document files in new or changed directories")
+
+        # Lazily scan image files
+        img_files = scan_directory(img_dir, IMAGE_EXTENSIONS, self.scan_manifest)
+        img_count = 0
 
         # Image vectorization (incremental addition)
         for img_path in img_files:
+            img_count += 1
             relative_img_path = os.path.relpath(img_path, start=img_dir)
             
             # Check if image already exists (based on full path)
@@ -169,29 +366,31 @@ class KnowledgeBaseManager:
                 print(f"Image already exists, skipping: {img_path}")
                 continue
             
-            ocr_text = self.embedding_handler.image_to_text(img_path)
-            metadata = {"id": next_doc_id, "source": f"Image: {relative_img_path}",
-                        "type": "image", "path": img_path, "ocr": ocr_text, "page": 1}
-            vector = self.embedding_handler.get_image_embedding_mps(img_path)
+            metadata, image_vector, text_vector = self._embed_image(img_path, relative_img_path, next_doc_id)
             
-            # Add to image index
-            image_index_map.add_with_ids(np.array([vector]), np.array([next_doc_id]))
+            # Add to image index, and its caption/OCR text to the text index
+            image_index_map.add_with_ids(np.array([image_vector]), np.array([next_doc_id]))
+            if text_vector is not None:
+                text_index_map.add_with_ids(np.array([text_vector]), np.array([next_doc_id]))
             
             metadata_store.append(metadata)
             next_doc_id += 1
 
+        print(f"Found {img_count} candidate image files in new or changed directories")
+
         # Save updated index and metadata
         faiss.write_index(text_index_map, TEXT_FAISS_FILE)
         faiss.write_index(image_index_map, IMAGE_FAISS_FILE)
         
         with open(METADATA_FILE, "w", encoding="utf-8") as f:
             json.dump(metadata_store, f, ensure_ascii=False, indent=2)
+        self.scan_manifest.save()
 
         # Count newly added items
         new_text_count = text_index_map.ntotal - initial_text_count
         new_image_count = image_index_map.ntotal - initial_image_count
         
-        print(f"Knowledge base incremental update completed: Added {new_text_count} text, {new_image_count} images")
+        print(f"Knowledge base incremental update completed: Added {new_text_count} text (including image text), {new_image_count} images")
         return metadata_store, text_index_map, image_index_map
 
     def build_or_load_knowledge_base(self, docs_dir=DOCS_DIR, img_dir=IMG_DIR):
@@ -0,0 +1,282 @@
+"""
+Per-call LLM latency and token accounting.
+
+Every LLM call runs inside llm_call(), which records wall time, time to first
+token, prompt/completion tokens and the calling tool. Calls are aggregated into
+histograms per (provider, model, caller) and, when a request trace is active,
+appended to it; finished traces are written as JSON lines under LLM_TRACE_DIR.
+"""
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from ..config import LLM_TRACE_ENABLED, LLM_TRACE_DIR
+
+# Upper bounds of the latency buckets in milliseconds (the last bucket is unbounded)
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+TOKEN_BUCKETS = [16, 64, 256, 512, 1024, 2048, 4096, 8192]
+
+_current_trace = contextvars.ContextVar("llm_trace", default=None)
+
+
+class Histogram:
+    """Bucket counts plus a window of recent samples for percentiles"""
+    def __init__(self, buckets, window=1000):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def snapshot(self):
+        ordered = sorted(self.recent)
+
+        def percentile(fraction):
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1) if ordered else None
+
+        labels = [f"le_{bound}" for bound in self.buckets] + ["le_inf"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 1) if self.count else None,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class _CallStats:
+    def __init__(self):
+        self.wall_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.ttft_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+        self.errors = 0
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class LLMCallRecord:
+    """One LLM call; the caller reports the first token and token counts while it runs"""
+    def __init__(self, provider, model, caller):
+        self.provider = provider
+        self.model = model
+        self.caller = caller or "unknown"
+        self.source = "generated"
+        self.start = time.perf_counter()
+        self.ttft_ms = None
+        self.wall_ms = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.error = None
+
+    def first_token(self):
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.start) * 1000
+
+    def set_tokens(self, prompt_tokens=None, completion_tokens=None):
+        if prompt_tokens is not None:
+            self.prompt_tokens = int(prompt_tokens)
+        if completion_tokens is not None:
+            self.completion_tokens = int(completion_tokens)
+
+    def as_dict(self):
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "caller": self.caller,
+            "source": self.source,
+            "wall_ms": round(self.wall_ms, 1) if self.wall_ms is not None else None,
+            "ttft_ms": round(self.ttft_ms, 1) if self.ttft_ms is not None else None,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "error": self.error,
+        }
+
+
+def _observe(record):
+    key = (record.provider, record.model, record.caller)
+    with _stats_lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = _CallStats()
+        if record.error:
+            stats.errors += 1
+        stats.wall_ms.observe(record.wall_ms)
+        if record.ttft_ms is not None:
+            stats.ttft_ms.observe(record.ttft_ms)
+        if record.prompt_tokens is not None:
+            stats.prompt_tokens.observe(record.prompt_tokens)
+        if record.completion_tokens is not None:
+            stats.completion_tokens.observe(record.completion_tokens)
+
+
+@contextmanager
+def llm_call(provider, model, caller=None):
+    """
+    Measure one LLM call
+    :param provider: "ollama" or "dashscope"
+    :param caller: Tool or component making the call
+    :return: LLMCallRecord to report the first token and token counts on
+    """
+    record = LLMCallRecord(provider, model, caller)
+    try:
+        yield record
+    except GeneratorExit:
+        # A streaming consumer stopped early, not a failed call
+        raise
+    except BaseException as e:
+        record.error = repr(e)
+        raise
+    finally:
+        record.wall_ms = (time.perf_counter() - record.start) * 1000
+        _observe(record)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(record)
+
+
+def get_llm_metrics():
+    """Histograms per provider, model and caller"""
+    with _stats_lock:
+        return {
+            f"{provider}/{model}/{caller}": {
+                "errors": stats.errors,
+                "wall_ms": stats.wall_ms.snapshot(),
+                "ttft_ms": stats.ttft_ms.snapshot(),
+                "prompt_tokens": stats.prompt_tokens.snapshot(),
+                "completion_tokens": stats.completion_tokens.snapshot(),
+            }
+            for (provider, model, caller), stats in _stats.items()
+        }
+
+
+class RequestTrace:
+    """LLM calls made while serving one request"""
+    def __init__(self, query, kind="ask"):
+        self.request_id = uuid.uuid4().hex
+        self.query = query
+        self.kind = kind
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self.start = time.perf_counter()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.calls.append(record.as_dict())
+
+    def finish(self):
+        """Write the trace as one JSON line in today's trace file"""
+        total_ms = (time.perf_counter() - self.start) * 1000
+        with self._lock:
+            calls = list(self.calls)
+        entry = {
+            "request_id": self.request_id,
+            "kind": self.kind,
+            "query": self.query,
+            "started_at": self.started_at,
+            "total_ms": round(total_ms, 1),
+            "llm_ms": round(sum(call["wall_ms"] or 0 for call in calls), 1),
+            "calls": calls,
+        }
+        if LLM_TRACE_ENABLED:
+            try:
+                os.makedirs(LLM_TRACE_DIR, exist_ok=True)
+                path = os.path.join(LLM_TRACE_DIR, f"llm_trace_{datetime.now():%Y%m%d}.jsonl")
+                line = json.dumps(entry, ensure_ascii=False) + "\n"
+                with _stats_lock, open(path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"⚠️ Could not write LLM trace: {e}")
+        return entry
+
+
+@contextmanager
+def activate_trace(trace):
+    """Make trace the current request trace in this thread/context"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def request_trace(query, kind="ask"):
+    """Trace the LLM calls of one request and write it when the request is done"""
+    trace = RequestTrace(query, kind)
+    with activate_trace(trace):
+        try:
+            yield trace
+        finally:
+            entry = trace.finish()
+            print(f"⏱️ LLM time {entry['llm_ms']:.0f} ms of {entry['total_ms']:.0f} ms over {len(entry['calls'])} calls")
+
+
+def traced_iter(iterator, trace):
+    """
+    Iterate with trace active for every step, for generators that may be resumed
+    on different threads (e.g. streaming responses)
+    """
+    while True:
+        with activate_trace(trace):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def _usage_of(message):
+    """Token usage reported by DashScope on a qwen-agent message, if any"""
+    extra = message.get("extra") if isinstance(message, dict) else getattr(message, "extra", None)
+    info = (extra or {}).get("model_service_info")
+    usage = info.get("usage") if isinstance(info, dict) else getattr(info, "usage", None)
+    if not usage:
+        return None, None
+    return usage.get("input_tokens"), usage.get("output_tokens")
+
+
+def instrument_chat_model(llm, provider, caller):
+    """
+    Route a qwen-agent chat model's chat() through llm_call, so the agent's own
+    LLM calls (tool selection) are measured like the tools' calls
+    """
+    chat = llm.chat
+
+    def instrumented_chat(*args, **kwargs):
+        if not kwargs.get("stream", True):
+            with llm_call(provider, llm.model, caller) as record:
+                output = chat(*args, **kwargs)
+                if output:
+                    record.set_tokens(*_usage_of(output[-1]))
+                return output
+
+        def stream():
+            with llm_call(provider, llm.model, caller) as record:
+                last = None
+                for last in chat(*args, **kwargs):
+                    record.first_token()
+                    yield last
+                if last:
+                    record.set_tokens(*_usage_of(last[-1]))
+        return stream()
+
+    llm.chat = instrumented_chat
+    return llm
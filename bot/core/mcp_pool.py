@@ -0,0 +1,315 @@
+"""
+Persistent, health-checked MCP client sessions shared across requests.
+
+Each session is owned by a long-running task on a background event loop, so a
+server subprocess (or HTTP connection) is started once and reused instead of per
+agent. Idle sessions are pinged periodically; a session that fails a ping or a
+call is restarted.
+"""
+import json
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+from .llm_metrics import Histogram, LATENCY_BUCKETS_MS
+
+# Pools by server name, shared by every QueryRouter instance (e.g. across knowledge base reloads)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class _Session:
+    """One pooled session and the task that owns its transport"""
+    def __init__(self, index):
+        self.index = index
+        self.session = None
+        self.task = None
+        self.stop = None
+        self.last_ok = 0.0
+        self.restarts = 0
+
+
+class MCPSessionPool:
+    """
+    A small pool of MCP client sessions to one server.
+    The server is reached over stdio (command + args), SSE or streamable HTTP (url).
+    """
+    def __init__(self, name, command=None, args=None, env=None, url=None, transport=None,
+                 size=1, ping_interval=30.0, call_timeout=60.0, start_timeout=120.0):
+        """
+        :param name: Server name; its tools are exposed as "<name>-<tool>"
+        :param transport: "stdio", "sse" or "streamable-http"; stdio without a url, else streamable-http
+        :param size: Number of sessions, i.e. concurrent calls to the server
+        :param ping_interval: Idle sessions are pinged this often (seconds)
+        """
+        self.name = name
+        self.command = command
+        self.args = list(args or [])
+        self.env = env
+        self.url = url
+        self.transport = transport or ("streamable-http" if url else "stdio")
+        self.size = max(1, size)
+        self.ping_interval = ping_interval
+        self.call_timeout = call_timeout
+        self.start_timeout = start_timeout
+        self.tools = []
+        self._sessions = [_Session(i) for i in range(self.size)]
+        self._idle = None
+        self._loop = None
+        self._thread = None
+        self._heartbeat = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._latency = {}
+        self._errors = {}
+
+    # --- Lifecycle (called from any thread) ---
+
+    def start(self):
+        """
+        Start the event loop and all sessions, blocking until they are up
+        :return: The server's tool definitions
+        """
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=f"mcp-{self.name}", daemon=True)
+                self._thread.start()
+                start = time.perf_counter()
+                try:
+                    self._run(self._start_all(), self.start_timeout)
+                except Exception:
+                    # Leave the pool unstarted so the next call tries again
+                    self._loop.call_soon_threadsafe(self._loop.stop)
+                    self._loop = None
+                    raise
+                print(f"🗺️ MCP server {self.name}: {self.size} session(s), {len(self.tools)} tools "
+                      f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return self.tools
+
+    def health_check(self):
+        """
+        Ping every idle session now, restarting failed ones
+        :return: Number of healthy sessions
+        """
+        self.start()
+        return self._run(self._check_idle(force=True), self.start_timeout)
+
+    def call_tool(self, tool_name, arguments):
+        """
+        Call a tool on a pooled session, waiting for a free one
+        :return: Text content of the result
+        """
+        self.start()
+        start = time.perf_counter()
+        try:
+            return self._run(self._call(tool_name, arguments), self.call_timeout * 2 + self.start_timeout)
+        except Exception:
+            with self._stats_lock:
+                self._errors[tool_name] = self._errors.get(tool_name, 0) + 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                self._latency.setdefault(tool_name, Histogram(LATENCY_BUCKETS_MS)).observe(elapsed_ms)
+
+    def close(self):
+        if self._loop is None:
+            return
+        self._run(self._close_all(), 30)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+    def stats(self):
+        with self._stats_lock:
+            tools = {
+                name: {"errors": self._errors.get(name, 0), "latency_ms": histogram.snapshot()}
+                for name, histogram in self._latency.items()
+            }
+        return {
+            "server": self.name,
+            "transport": self.transport,
+            "sessions": self.size,
+            "connected": sum(1 for s in self._sessions if s.session is not None),
+            "restarts": sum(s.restarts for s in self._sessions),
+            "tools": tools,
+        }
+
+    def _run(self, coroutine, timeout):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout)
+
+    # --- Event loop side ---
+
+    @asynccontextmanager
+    async def _transport(self):
+        if self.transport == "stdio":
+            from mcp import StdioServerParameters
+            from mcp.client.stdio import stdio_client
+            params = StdioServerParameters(command=self.command, args=self.args, env=self.env)
+            async with stdio_client(params) as (read, write):
+                yield read, write
+        elif self.transport == "sse":
+            from mcp.client.sse import sse_client
+            async with sse_client(self.url) as (read, write):
+                yield read, write
+        else:
+            from mcp.client.streamable_http import streamablehttp_client
+            async with streamablehttp_client(self.url) as (read, write, _):
+                yield read, write
+
+    async def _open(self, slot):
+        """Start the task owning slot's transport and wait for its session to be initialized"""
+        from mcp import ClientSession
+        ready = self._loop.create_future()
+        slot.stop = asyncio.Event()
+
+        async def own():
+            # The transport is entered and exited by this one task, as anyio requires
+            try:
+                async with self._transport() as (read, write):
+                    async with ClientSession(read, write) as session:
+                        await session.initialize()
+                        tools = (await session.list_tools()).tools
+                        slot.session = session
+                        slot.last_ok = time.monotonic()
+                        ready.set_result(tools)
+                        await slot.stop.wait()
+            except BaseException as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                elif not slot.stop.is_set():
+                    print(f"⚠️ MCP session {self.name}#{slot.index} closed: {e!r}")
+            finally:
+                slot.session = None
+
+        slot.task = self._loop.create_task(own())
+        return await asyncio.wait_for(ready, self.start_timeout)
+
+    async def _shutdown(self, slot):
+        if slot.task is not None:
+            slot.stop.set()
+            try:
+                await asyncio.wait_for(slot.task, 10)
+            except BaseException:
+                slot.task.cancel()
+            slot.task = None
+
+    async def _restart(self, slot):
+        print(f"♻️ Restarting MCP session {self.name}#{slot.index}")
+        await self._shutdown(slot)
+        slot.restarts += 1
+        await self._open(slot)
+
+    async def _start_all(self):
+        results = await asyncio.gather(*(self._open(slot) for slot in self._sessions), return_exceptions=True)
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if len(failures) == len(results):
+            raise failures[0]
+        self.tools = next(r for r in results if not isinstance(r, BaseException))
+        self._idle = asyncio.Queue()
+        for slot in self._sessions:
+            self._idle.put_nowait(slot)
+        self._heartbeat = self._loop.create_task(self._heartbeat_loop())
+
+    async def _responds(self, slot):
+        if slot.session is None:
+            return False
+        try:
+            await asyncio.wait_for(slot.session.send_ping(), 10)
+        except Exception:
+            return False
+        slot.last_ok = time.monotonic()
+        return True
+
+    async def _ensure_alive(self, slot, force=False):
+        """Ping a session idle for longer than the ping interval, restart it if it is down"""
+        if slot.session is not None and not force and time.monotonic() - slot.last_ok < self.ping_interval:
+            return
+        if not await self._responds(slot):
+            await self._restart(slot)
+
+    async def _call(self, tool_name, arguments):
+        slot = await self._idle.get()
+        try:
+            await self._ensure_alive(slot)
+            try:
+                result = await asyncio.wait_for(slot.session.call_tool(tool_name, arguments), self.call_timeout)
+            except Exception as e:
+                # A session that still answers pings had a genuine tool error; otherwise restart it and retry once
+                if await self._responds(slot):
+                    raise
+                print(f"⚠️ MCP call {self.name}-{tool_name} failed on session #{slot.index}: {e!r}")
+                await self._restart(slot)
+                result = await asyncio.wait_for(slot.session.call_tool(tool_name, arguments), self.call_timeout)
+            slot.last_ok = time.monotonic()
+            return _result_text(result)
+        finally:
+            self._idle.put_nowait(slot)
+
+    async def _check_idle(self, force=False):
+        healthy = 0
+        for _ in range(self._idle.qsize()):
+            slot = self._idle.get_nowait()
+            try:
+                await self._ensure_alive(slot, force)
+                healthy += 1
+            except Exception as e:
+                print(f"⚠️ MCP session {self.name}#{slot.index} is down: {e!r}")
+            finally:
+                self._idle.put_nowait(slot)
+        return healthy
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await self._check_idle()
+
+    async def _close_all(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        for slot in self._sessions:
+            await self._shutdown(slot)
+
+
+def _result_text(result):
+    texts = [content.text for content in result.content if getattr(content, "type", None) == "text"]
+    text = "\n\n".join(texts) if texts else ""
+    if getattr(result, "isError", False):
+        return json.dumps({"success": False, "error": text or "MCP tool error"}, ensure_ascii=False)
+    return text
+
+
+def get_pool(name, **kwargs):
+    """Shared MCPSessionPool for the server name, created with kwargs on first use"""
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = MCPSessionPool(name, **kwargs)
+        return _pools[name]
+
+
+def pooled_tools(pool):
+    """qwen-agent tools for every tool of the pool's server"""
+    from qwen_agent.tools.base import BaseTool
+
+    class MCPPooledTool(BaseTool):
+        """One MCP server tool, called through the shared session pool"""
+        def __init__(self, tool):
+            self.name = f"{pool.name}-{tool.name}"
+            self.description = tool.description or ""
+            # Only the keys an OpenAI function schema allows, as qwen-agent's own MCP manager does
+            schema = tool.inputSchema or {}
+            self.parameters = {
+                "type": schema.get("type", "object"),
+                "properties": schema.get("properties", {}),
+                "required": schema.get("required", [])
+            }
+            self.tool_name = tool.name
+            super().__init__()
+
+        def call(self, params, **kwargs):
+            arguments = json.loads(params) if isinstance(params, str) else dict(params or {})
+            return pool.call_tool(self.tool_name, arguments)
+
+    return [MCPPooledTool(tool) for tool in pool.start()]
@@ -0,0 +1,133 @@
+"""
+Dynamic micro-batching for single-item requests coming from many threads.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Queued by close() to stop the worker
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Collect items submitted concurrently and process them with one batched call.
+
+    A background worker takes the first waiting item. If more are already
+    queued it keeps collecting for up to `max_wait_ms` or until `max_batch_size`
+    items are gathered; a lone item is processed at once. It runs `batch_fn`
+    once and hands every caller its own result.
+    """
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=3.0, name="micro-batcher"):
+        """
+        :param batch_fn: Function mapping a list of items to a sequence of results (same order)
+        :param max_batch_size: Upper bound on items per batched call
+        :param max_wait_ms: How long to wait for more items after the first one arrives
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_seen = 0
+        self._closed = False
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if not self._closed and (self._worker is None or not self._worker.is_alive()):
+                    self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._worker.start()
+
+    def submit(self, item) -> Future:
+        """Queue an item and return a Future for its result"""
+        future = Future()
+        self._ensure_worker()
+        with self._lock:
+            # Under the lock, so nothing is queued behind close()'s stop marker
+            if not self._closed:
+                self._queue.put((item, future))
+                return future
+        # Callers still holding a closed batcher (e.g. during a reload) get unbatched calls
+        self._process([(item, future)])
+        return future
+
+    def close(self):
+        """Stop the worker thread, so it no longer keeps batch_fn (and its owner) alive"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+            self._queue.put(_STOP)
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout=5)
+
+    def __call__(self, item, timeout=None):
+        """Submit an item and block until its result is ready"""
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self):
+        """
+        :return: (batch of (item, future), whether close() was called)
+        """
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        if self._queue.empty():
+            # Nobody else is waiting, a lone query must not pay the batching delay
+            return batch, False
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Items that are already queued are taken without waiting
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stopped = self._collect()
+            if batch:
+                self._process(batch)
+            if stopped:
+                return
+
+    def _process(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            results = list(self.batch_fn([item for item, _ in batch]))
+            if len(results) != len(futures):
+                # zip() would silently leave the extra callers waiting forever
+                raise ValueError(f"{self.name}: batch_fn returned {len(results)} results for {len(futures)} items")
+            for future, result in zip(futures, results):
+                future.set_result(result)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._max_seen = max(self._max_seen, len(batch))
+
+    def stats(self):
+        """Batching statistics since startup"""
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "max_batch_size_seen": self._max_seen,
+            }
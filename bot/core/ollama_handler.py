@@ -1,23 +1,282 @@
+import asyncio
+import hashlib
+import json
+import threading
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+
+import httpx
 import ollama
-from ..config import OLLAMA_MODEL, OLLAMA_TEMPERATURE
+from ..config import (
+    OLLAMA_MODEL, OLLAMA_TEMPERATURE, OLLAMA_HOST, OLLAMA_KEEP_ALIVE, OLLAMA_TIMEOUT,
+    OLLAMA_NUM_CTX, OLLAMA_MAX_INFLIGHT, OLLAMA_POOL_CONNECTIONS,
+    OLLAMA_COALESCE_REQUESTS, OLLAMA_RESULT_CACHE_TTL
+)
+from .single_flight import SingleFlight
+from .llm_metrics import llm_call
+
+# Per-thread deferred generation state, see deferred_generation()
+_deferred = threading.local()
+
+# Persistent clients: one sync client, one async client per event loop (httpx async clients are loop-bound)
+_client = None
+_async_clients = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+
+# Generations in flight across sync and async callers
+_generation_slots = threading.BoundedSemaphore(max(1, OLLAMA_MAX_INFLIGHT))
+
+ERROR_PREFIX = "Error calling local Ollama model"
+
+# Identical requests in flight share one generation, finished answers are reused for a short TTL
+_single_flight = SingleFlight(
+    ttl_seconds=OLLAMA_RESULT_CACHE_TTL,
+    cacheable=lambda answer: bool(answer) and not answer.startswith(ERROR_PREFIX)
+)
+
+
+def _client_kwargs():
+    return {
+        "host": OLLAMA_HOST,
+        "timeout": httpx.Timeout(OLLAMA_TIMEOUT, connect=10.0),
+        "limits": httpx.Limits(
+            max_connections=OLLAMA_POOL_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_POOL_CONNECTIONS
+        ),
+    }
+
+
+def get_client():
+    """Shared ollama.Client with a pooled keep-alive HTTP connection"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ollama.Client(**_client_kwargs())
+    return _client
+
+
+def get_async_client():
+    """Shared ollama.AsyncClient for the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = ollama.AsyncClient(**_client_kwargs())
+            _async_clients[loop] = client
+    return client
+
+
+@contextmanager
+def _generation_slot():
+    with _generation_slots:
+        yield
+
+
+@asynccontextmanager
+async def _async_generation_slot():
+    # The slot is shared with sync callers, so it is awaited in an executor thread
+    acquire = asyncio.get_running_loop().run_in_executor(None, _generation_slots.acquire)
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # Give the slot back once the pending acquire completes
+        acquire.add_done_callback(lambda _: _generation_slots.release())
+        raise
+    try:
+        yield
+    finally:
+        _generation_slots.release()
+
+
+class DeferredGeneration:
+    """
+    Prompts a tool wanted answered while generation was deferred, plus callbacks
+    to run once the streamed answer is complete
+    """
+    def __init__(self):
+        self.prompts = []
+        self.callbacks = []
+
+    def finish(self, answer, generation_seconds):
+        for callback in self.callbacks:
+            try:
+                callback(answer, generation_seconds)
+            except Exception as e:
+                print(f"⚠️ Deferred answer callback failed: {e}")
+
+
+@contextmanager
+def deferred_generation(state=None):
+    """
+    Within this block generate_local_answer records its prompt and returns ""
+    instead of generating, so the caller can stream the answer afterwards
+    with stream_local_answer
+    :param state: DeferredGeneration to continue, e.g. when a generator resumes on another thread
+    """
+    previous = getattr(_deferred, "state", None)
+    _deferred.state = state if state is not None else DeferredGeneration()
+    try:
+        yield _deferred.state
+    finally:
+        _deferred.state = previous
+
+
+def after_deferred_answer(callback):
+    """
+    Register callback(answer, generation_seconds) for the deferred answer
+    :return: False if generation is not deferred in this thread
+    """
+    state = getattr(_deferred, "state", None)
+    if state is None:
+        return False
+    state.callbacks.append(callback)
+    return True
+
 
+def _chat_request(prompt):
+    """Keyword arguments of a chat request for the prompt"""
+    from ..config import SYSTEM_ROLE
+    options = {"temperature": OLLAMA_TEMPERATURE}
+    if OLLAMA_NUM_CTX > 0:
+        options["num_ctx"] = OLLAMA_NUM_CTX
+    return {
+        "model": OLLAMA_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_ROLE},
+            {"role": "user", "content": prompt}
+        ],
+        "options": options,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+    }
+
+
+def _request_key(request):
+    """Identity of a chat request: model, options and messages (keep_alive does not change the answer)"""
+    identity = {name: request[name] for name in ("model", "options", "messages")}
+    return hashlib.sha256(json.dumps(identity, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def get_generation_stats():
+    """Coalescing and short-TTL result cache statistics"""
+    return _single_flight.stats()
+
+
+def _log_prompt_eval(response, record=None):
+    """Report the prompt size Ollama actually evaluated and how long that took"""
+    prompt_tokens = getattr(response, "prompt_eval_count", None)
+    if record is not None:
+        record.set_tokens(prompt_tokens, getattr(response, "eval_count", None))
+    if prompt_tokens:
+        duration_ms = (getattr(response, "prompt_eval_duration", None) or 0) / 1e6
+        print(f"📏 Ollama prompt: {prompt_tokens} tokens, evaluated in {duration_ms:.0f} ms")
+
+
+def _mark_error(record, answer):
+    if answer.startswith(ERROR_PREFIX):
+        record.error = answer
+    return answer
 
-def generate_local_answer(prompt):
+
+def generate_local_answer(prompt, caller=None):
     """
     Call Ollama local model to generate answer
     :param prompt: Prompt
+    :param caller: Tool asking for the answer, for LLM call accounting
     :return: Answer generated by model
     """
-    from ..config import SYSTEM_ROLE
+    state = getattr(_deferred, "state", None)
+    if state is not None:
+        state.prompts.append(prompt)
+        return ""
+    request = _chat_request(prompt)
+    with llm_call("ollama", OLLAMA_MODEL, caller) as record:
+        if not OLLAMA_COALESCE_REQUESTS:
+            return _mark_error(record, _generate(request, record))
+        # Stays "shared" unless this call turns out to run the generation itself
+        record.source = "shared"
+        answer = _single_flight.do(_request_key(request), lambda: _generate(request, record))
+        return _mark_error(record, answer)
+
+
+def _generate(request, record):
+    record.source = "generated"
     try:
-        response = ollama.chat(
-            model=OLLAMA_MODEL,
-            messages=[
-                {"role": "system", "content": SYSTEM_ROLE},
-                {"role": "user", "content": prompt}
-            ],
-            options={"temperature": OLLAMA_TEMPERATURE}
-        )
+        with _generation_slot():
+            response = get_client().chat(**request)
+        _log_prompt_eval(response, record)
         return response.message.content
     except Exception as e:
-        return f"Error calling local Ollama model: {e}"
\ No newline at end of file
+        return f"{ERROR_PREFIX}: {e}"
+
+
+async def agenerate_local_answer(prompt, caller=None):
+    """
+    Asyncio variant of generate_local_answer
+    :param prompt: Prompt
+    :param caller: Tool asking for the answer, for LLM call accounting
+    :return: Answer generated by model
+    """
+    request = _chat_request(prompt)
+    with llm_call("ollama", OLLAMA_MODEL, caller) as record:
+        if not OLLAMA_COALESCE_REQUESTS:
+            return _mark_error(record, await _agenerate(request, record))
+        record.source = "shared"
+        answer = await _single_flight.ado(_request_key(request), lambda: _agenerate(request, record))
+        return _mark_error(record, answer)
+
+
+async def _agenerate(request, record):
+    record.source = "generated"
+    try:
+        async with _async_generation_slot():
+            response = await get_async_client().chat(**request)
+        _log_prompt_eval(response, record)
+        return response.message.content
+    except Exception as e:
+        return f"{ERROR_PREFIX}: {e}"
+
+
+def stream_local_answer(prompt, caller=None):
+    """
+    Call Ollama local model and yield the answer piece by piece as it is generated
+    :param prompt: Prompt
+    :param caller: Tool asking for the answer, for LLM call accounting
+    :return: Generator of answer text fragments
+    """
+    request = _chat_request(prompt)
+    key = _request_key(request)
+    with llm_call("ollama", OLLAMA_MODEL, caller) as record:
+        # Streams are not coalesced, but an answer generated moments ago is replayed at once
+        if OLLAMA_COALESCE_REQUESTS:
+            hit, answer = _single_flight.get_cached(key)
+            if hit:
+                record.source = "shared"
+                record.first_token()
+                yield answer
+                return
+        answer = ""
+        try:
+            with _generation_slot():
+                for chunk in get_client().chat(**request, stream=True):
+                    content = chunk.message.content
+                    if content:
+                        record.first_token()
+                        answer += content
+                        yield content
+                    if getattr(chunk, "done", False):
+                        _log_prompt_eval(chunk, record)
+        except Exception as e:
+            record.error = repr(e)
+            yield f"{ERROR_PREFIX}: {e}"
+            return
+        if OLLAMA_COALESCE_REQUESTS:
+            _single_flight.put(key, answer)
+
+
+def warm_up_model():
+    """
+    Load the Ollama model into memory ahead of the first request
+    An empty prompt makes Ollama load the model without generating anything
+    """
+    get_client().generate(model=OLLAMA_MODEL, prompt="", keep_alive=OLLAMA_KEEP_ALIVE)
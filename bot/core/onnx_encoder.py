@@ -0,0 +1,329 @@
+"""
+ONNX Runtime backend for the text (SentenceTransformer) and CLIP encoders.
+
+Models are exported once from the loaded PyTorch models, optionally quantized
+to dynamic int8, and then served on CPU without PyTorch in the hot path. The export
+records which variant it wrote in a manifest, serving reads the manifest instead of
+ONNX_QUANTIZE so a --no-quantize export is found.
+"""
+import os
+import json
+import numpy as np
+
+from ..config import ONNX_MODEL_DIR, ONNX_QUANTIZE, ONNX_NUM_THREADS, ONNX_PARITY_MIN_COSINE
+
+TEXT_MODEL_FILE = "text_encoder.onnx"
+CLIP_TEXT_MODEL_FILE = "clip_text_encoder.onnx"
+CLIP_VISION_MODEL_FILE = "clip_vision_encoder.onnx"
+TEXT_TOKENIZER_DIR = "text_tokenizer"
+CLIP_PROCESSOR_DIR = "clip_processor"
+MANIFEST_FILE = "manifest.json"
+
+ONNX_OPSET = 14
+
+
+def _model_path(model_dir, filename, quantized):
+    """Return the path of the (optionally quantized) ONNX file"""
+    if quantized:
+        filename = filename.replace(".onnx", ".int8.onnx")
+    return os.path.join(model_dir, filename)
+
+
+def _read_manifest(model_dir):
+    path = os.path.join(model_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(model_dir, encoder, quantized):
+    """Record which variant of an encoder the last export produced"""
+    manifest = _read_manifest(model_dir)
+    manifest[encoder] = {"quantized": bool(quantized)}
+    with open(os.path.join(model_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def _resolve_quantized(model_dir, encoder, quantized=None):
+    """
+    Decide which variant to load
+    :param encoder: "text" or "clip"
+    :param quantized: Explicit choice, None reads it from the export manifest
+    :return: Whether to load the int8 model
+    """
+    if quantized is not None:
+        return quantized
+    entry = _read_manifest(model_dir).get(encoder)
+    if entry is None:
+        # Exports made before the manifest existed
+        return ONNX_QUANTIZE
+    return entry["quantized"]
+
+
+def _create_session(model_path):
+    """Create a CPU inference session"""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ONNX_NUM_THREADS > 0:
+        options.intra_op_num_threads = ONNX_NUM_THREADS
+    return ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype("float32")
+
+
+# ---------------- Export ----------------
+
+def _quantize(model_path):
+    """Dynamic int8 quantization of an exported model, returns quantized path"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantized_path = model_path.replace(".onnx", ".int8.onnx")
+    quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+def export_text_encoder(sentence_model, model_dir=ONNX_MODEL_DIR, quantize=ONNX_QUANTIZE):
+    """
+    Export a SentenceTransformer (transformer + mean pooling) to ONNX
+    :param sentence_model: Loaded SentenceTransformer model
+    :param model_dir: Output directory
+    :param quantize: Whether to also write a dynamic int8 model
+    :return: Path of the model that will be used at inference time
+    """
+    import torch
+
+    class _MeanPooledEncoder(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            hidden = self.transformer(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = sentence_model.tokenizer
+    tokenizer.save_pretrained(os.path.join(model_dir, TEXT_TOKENIZER_DIR))
+
+    encoder = _MeanPooledEncoder(sentence_model[0].auto_model.to("cpu")).eval()
+    sample = tokenizer(["export sample"], padding=True, return_tensors="pt")
+    model_path = os.path.join(model_dir, TEXT_MODEL_FILE)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in ("input_ids", "attention_mask", "token_type_ids")}
+    dynamic_axes["embedding"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(
+            encoder,
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            model_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["embedding"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+        )
+    print(f"Text encoder exported to {model_path}")
+    if quantize:
+        model_path = _quantize(model_path)
+        print(f"Text encoder quantized to {model_path}")
+    _write_manifest(model_dir, "text", quantize)
+    return model_path
+
+
+def export_clip_encoders(clip_model, clip_processor, model_dir=ONNX_MODEL_DIR, quantize=ONNX_QUANTIZE):
+    """
+    Export the CLIP text and vision towers (including projection heads) to ONNX
+    :param clip_model: Loaded CLIPModel
+    :param clip_processor: Loaded CLIPProcessor
+    :param model_dir: Output directory
+    :param quantize: Whether to also write dynamic int8 models
+    :return: Tuple of (text model path, vision model path) used at inference time
+    """
+    import torch
+    from PIL import Image
+
+    class _TextTower(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+    class _VisionTower(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values):
+            return self.model.get_image_features(pixel_values=pixel_values)
+
+    os.makedirs(model_dir, exist_ok=True)
+    clip_processor.save_pretrained(os.path.join(model_dir, CLIP_PROCESSOR_DIR))
+    model = clip_model.to("cpu").float().eval()
+
+    text_inputs = clip_processor(text=["export sample"], return_tensors="pt", padding=True)
+    text_path = os.path.join(model_dir, CLIP_TEXT_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            _TextTower(model),
+            (text_inputs["input_ids"], text_inputs["attention_mask"]),
+            text_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["embedding"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "embedding": {0: "batch"},
+            },
+            opset_version=ONNX_OPSET,
+        )
+    print(f"CLIP text encoder exported to {text_path}")
+
+    image_inputs = clip_processor(images=Image.new("RGB", (224, 224)), return_tensors="pt")
+    vision_path = os.path.join(model_dir, CLIP_VISION_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            _VisionTower(model),
+            (image_inputs["pixel_values"],),
+            vision_path,
+            input_names=["pixel_values"],
+            output_names=["embedding"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "embedding": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+        )
+    print(f"CLIP vision encoder exported to {vision_path}")
+
+    if quantize:
+        text_path = _quantize(text_path)
+        vision_path = _quantize(vision_path)
+        print(f"CLIP encoders quantized to {text_path}, {vision_path}")
+    _write_manifest(model_dir, "clip", quantize)
+    return text_path, vision_path
+
+
+# ---------------- Inference ----------------
+
+class OnnxTextEncoder:
+    """SentenceTransformer-compatible text encoder running on ONNX Runtime"""
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized=None, max_length=256):
+        from transformers import AutoTokenizer
+        model_path = _model_path(model_dir, TEXT_MODEL_FILE, _resolve_quantized(model_dir, "text", quantized))
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX text encoder not found: {model_path}")
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.join(model_dir, TEXT_TOKENIZER_DIR))
+        self.session = _create_session(model_path)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def encode(self, texts):
+        """
+        Encode texts into L2-normalized float32 vectors
+        :param texts: List of strings
+        :return: (N, d) numpy array
+        """
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        feed = {name: inputs[name].astype("int64") for name in self.input_names}
+        return _normalize(self.session.run(None, feed)[0])
+
+
+class OnnxClipEncoder:
+    """CLIP text and vision towers running on ONNX Runtime"""
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized=None):
+        from transformers import CLIPProcessor
+        quantized = _resolve_quantized(model_dir, "clip", quantized)
+        text_path = _model_path(model_dir, CLIP_TEXT_MODEL_FILE, quantized)
+        vision_path = _model_path(model_dir, CLIP_VISION_MODEL_FILE, quantized)
+        for path in (text_path, vision_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"ONNX CLIP encoder not found: {path}")
+        self.processor = CLIPProcessor.from_pretrained(os.path.join(model_dir, CLIP_PROCESSOR_DIR))
+        self.text_session = _create_session(text_path)
+        self.vision_session = _create_session(vision_path)
+
+    def encode_text(self, texts):
+        inputs = self.processor(text=texts, return_tensors="np", padding=True)
+        feed = {
+            "input_ids": inputs["input_ids"].astype("int64"),
+            "attention_mask": inputs["attention_mask"].astype("int64"),
+        }
+        return _normalize(self.text_session.run(None, feed)[0])
+
+    def encode_images(self, images):
+        inputs = self.processor(images=images, return_tensors="np")
+        feed = {"pixel_values": inputs["pixel_values"].astype("float32")}
+        return _normalize(self.vision_session.run(None, feed)[0])
+
+
+# ---------------- Parity check ----------------
+
+def _compare(reference, candidate, min_cosine):
+    """Row-wise cosine plus nearest-neighbour agreement between two embedding sets"""
+    reference = _normalize(np.asarray(reference, dtype="float32"))
+    candidate = _normalize(np.asarray(candidate, dtype="float32"))
+    cosines = np.sum(reference * candidate, axis=1)
+    report = {
+        "samples": len(cosines),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+    }
+    if len(cosines) > 1:
+        # Retrieval must not change: the neighbour ranking inside the sample set has to agree
+        ref_sim = reference @ reference.T
+        cand_sim = candidate @ candidate.T
+        np.fill_diagonal(ref_sim, -np.inf)
+        np.fill_diagonal(cand_sim, -np.inf)
+        report["top1_agreement"] = float(np.mean(ref_sim.argmax(axis=1) == cand_sim.argmax(axis=1)))
+    report["passed"] = report["min_cosine"] >= min_cosine and report.get("top1_agreement", 1.0) == 1.0
+    return report
+
+
+def check_parity(embedding_handler, texts, image_paths=None, model_dir=ONNX_MODEL_DIR,
+                 quantized=None, min_cosine=ONNX_PARITY_MIN_COSINE):
+    """
+    Compare ONNX embeddings against the PyTorch embeddings of the same inputs
+    :param embedding_handler: EmbeddingHandler providing the PyTorch models
+    :param texts: Sample texts (ideally real chunks and queries)
+    :param image_paths: Optional sample images for the CLIP vision tower
+    :param quantized: Which variant to check, None reads it from the export manifest
+    :param min_cosine: Minimum per-sample cosine similarity to pass
+    :return: Dict report per encoder, with an overall "passed" flag
+    """
+    from PIL import Image
+    import torch
+
+    report = {}
+    text_encoder = OnnxTextEncoder(model_dir, quantized)
+    torch_text = embedding_handler.text_model.encode(texts)
+    report["text"] = _compare(torch_text, text_encoder.encode(texts), min_cosine)
+
+    clip_encoder = OnnxClipEncoder(model_dir, quantized)
+    device = embedding_handler.clip_model.device
+    with torch.no_grad():
+        inputs = embedding_handler.clip_processor(text=texts, return_tensors="pt", padding=True).to(device)
+        torch_clip_text = embedding_handler.clip_model.get_text_features(**inputs).float().cpu().numpy()
+    report["clip_text"] = _compare(torch_clip_text, clip_encoder.encode_text(texts), min_cosine)
+
+    if image_paths:
+        images = [Image.open(path).convert("RGB").resize((224, 224)) for path in image_paths]
+        with torch.no_grad():
+            inputs = embedding_handler.clip_processor(images=images, return_tensors="pt").to(device)
+            torch_clip_image = embedding_handler.clip_model.get_image_features(**inputs).float().cpu().numpy()
+        report["clip_vision"] = _compare(torch_clip_image, clip_encoder.encode_images(images), min_cosine)
+
+    report["passed"] = all(r["passed"] for r in report.values())
+    for name, result in report.items():
+        if isinstance(result, dict):
+            status = "✅" if result["passed"] else "❌"
+            print(f"{status} {name}: min cosine {result['min_cosine']:.4f}, mean cosine {result['mean_cosine']:.4f}, "
+                  f"top-1 agreement {result.get('top1_agreement', 1.0):.2%} ({result['samples']} samples)")
+    return report
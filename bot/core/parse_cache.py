@@ -0,0 +1,201 @@
+"""
+On-disk cache of parse_document results, keyed by file content hash and parser version.
+"""
+import os
+import json
+import hashlib
+import threading
+
+from ..config import PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB, PARSE_CACHE_MAX_ENTRY_MB, PDF_BACKEND
+from .document_parser import parse_document, PARSER_VERSION
+
+
+class ParsedDocumentCache:
+    """
+    Stores parsed chunks as JSON Lines files named after the cache key, one chunk per line,
+    so neither writing nor reading an entry holds a whole document in memory.
+    Least recently used entries are evicted once the total size exceeds the limit.
+    """
+    def __init__(self, cache_dir=PARSE_CACHE_DIR, max_mb=PARSE_CACHE_MAX_MB, max_entry_mb=PARSE_CACHE_MAX_ENTRY_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_entry_bytes = int(max_entry_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """(path, size, last access time) of every cache file, including the JSON files of older versions"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith((".jsonl", ".json")):
+                stat = entry.stat()
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def key_for(self, file_path):
+        """
+        Cache key: content hash + parser version (+ PDF backend for PDFs)
+        The file is hashed in blocks so large files are never loaded whole
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        ext = os.path.splitext(file_path)[1].lower()
+        parser = f"{PARSER_VERSION}-{PDF_BACKEND}" if ext == ".pdf" else PARSER_VERSION
+        return f"{digest.hexdigest()}-{ext.lstrip('.')}-v{parser}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jsonl")
+
+    def get(self, key):
+        """Generator over the cached chunks for the key, or None"""
+        path = self._path(key)
+        f = None
+        # Under the lock so evict() cannot delete the entry between opening and touching it
+        with self._lock:
+            try:
+                f = open(path, "r", encoding="utf-8")
+                os.utime(path)  # Mark as recently used for eviction
+            except FileNotFoundError:
+                # Missing, or removed by another process sharing the cache directory
+                if f is not None:
+                    f.close()
+                self.misses += 1
+                return None
+            self.hits += 1
+        return self._read(f)
+
+    @staticmethod
+    def _read(f):
+        with f:
+            for line in f:
+                yield json.loads(line)
+
+    def writer(self, key):
+        """Writer that streams chunks into a temporary file and only publishes complete entries"""
+        return _EntryWriter(self, key)
+
+    def put(self, key, chunks):
+        """Store chunks, then evict old entries if over the size limit"""
+        writer = self.writer(key)
+        for chunk in chunks:
+            writer.write(chunk)
+        writer.commit()
+
+    def _published(self, size, previous):
+        with self._lock:
+            self._total_bytes += size - previous
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its size limit"""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            self._total_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size_mb": round(self._total_bytes / (1024 * 1024), 2),
+            }
+
+
+class _EntryWriter:
+    """One cache entry being written; dropped once it grows past the per-entry limit"""
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.path = cache._path(key)
+        self.tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        self.size = 0
+
+    def write(self, chunk):
+        if self.file is None:
+            return
+        line = json.dumps(chunk, ensure_ascii=False) + "\n"
+        self.size += len(line.encode("utf-8"))
+        if self.size > self.cache.max_entry_bytes:
+            print(f"⚠️ Parsed document over {self.cache.max_entry_bytes // (1024 * 1024)} MB, not caching it")
+            self.discard()
+            return
+        self.file.write(line)
+
+    def commit(self):
+        """Publish the entry under its key; a discarded entry stays unpublished"""
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        previous = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        os.replace(self.tmp_path, self.path)
+        self.cache._published(self.size, previous)
+
+    def discard(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+        with self.cache._lock:
+            self.cache.skipped += 1
+
+
+def parse_document_cached(file_path, cache):
+    """
+    parse_document with a cache lookup first.
+    A fresh parse is streamed into the cache as it is yielded, and only published if it
+    completed without parser errors.
+    :param file_path: Document file path
+    :param cache: ParsedDocumentCache, or None to always parse
+    :return: Iterable of chunks
+    """
+    if cache is None:
+        yield from parse_document(file_path)
+        return
+
+    key = cache.key_for(file_path)
+    cached = cache.get(key)
+    if cached is not None:
+        yield from cached
+        return
+
+    errors = []
+    writer = cache.writer(key)
+    count = 0
+    completed = False
+    try:
+        for chunk in parse_document(file_path, errors=errors):
+            writer.write(chunk)
+            count += 1
+            yield chunk
+        completed = True
+    finally:
+        # Partial output (parser errors, abandoned iteration) and empty results are never pinned in the cache
+        if completed and count and not errors:
+            writer.commit()
+        else:
+            writer.discard()
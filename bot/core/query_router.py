@@ -3,18 +3,74 @@ Query Router for the intelligent assistant using Qwen Agent
 """
 import json
 import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from qwen_agent.agents import Assistant
 
-from ..core.ollama_handler import generate_local_answer
+from ..core.ollama_handler import (
+    generate_local_answer, stream_local_answer, deferred_generation, DeferredGeneration
+)
+from ..core.llm_metrics import instrument_chat_model
+from ..core.intent_router import IntentRouter
+from ..core.routing_cache import RoutingCache
+from ..core.mcp_pool import get_pool, pooled_tools
+from ..core.response_formatter import format_maps
 
 from ..tools.weather_tool import WeatherTool
 from ..tools.sql_tool import SQLTool
 from ..tools.knowledge_base_tool import RAGTool
-from ..config import SYSTEM_ROLE
+from ..config import (
+    SYSTEM_ROLE, INTENT_ROUTER_ENABLED, INTENT_ROUTER_THRESHOLD, INTENT_ROUTER_MARGIN, INTENT_ROUTER_CJK_ENABLED,
+    ROUTING_CACHE_ENABLED, ROUTING_CACHE_TTL, ROUTING_CACHE_MAX_ENTRIES, ROUTING_CACHE_BYPASS_TOOLS,
+    ROUTER_TOOL_WORKERS, ROUTER_MAX_TOOL_CALLS, SPECULATIVE_RETRIEVAL_ENABLED, SPECULATIVE_RETRIEVAL_WORKERS,
+    MAPS_MCP_TRANSPORT, MAPS_MCP_COMMAND, MAPS_MCP_ARGS, MAPS_MCP_URL, MAPS_MCP_POOL_SIZE,
+    MAPS_MCP_PING_INTERVAL, MAPS_MCP_CALL_TIMEOUT
+)
 
 load_dotenv()
 
+
+def get_maps_pool():
+    """Session pool of the Google Maps MCP server, shared by every QueryRouter"""
+    return get_pool(
+        "google-maps",
+        transport=MAPS_MCP_TRANSPORT,
+        command=MAPS_MCP_COMMAND,
+        args=MAPS_MCP_ARGS,
+        env={"GOOGLE_MAPS_API_KEY": os.getenv("GOOGLE_MAPS_API_KEY", "")},
+        url=MAPS_MCP_URL or None,
+        size=MAPS_MCP_POOL_SIZE,
+        ping_interval=MAPS_MCP_PING_INTERVAL,
+        call_timeout=MAPS_MCP_CALL_TIMEOUT
+    )
+
+
+def _maps_tools():
+    """
+    Google Maps tools for the agent: called through the shared session pool, or
+    started by qwen-agent itself when pooling is disabled
+    """
+    if MAPS_MCP_POOL_SIZE <= 0:
+        return [{
+            "mcpServers": {
+                "google-maps": {
+                    "args": MAPS_MCP_ARGS,
+                    "command": MAPS_MCP_COMMAND,
+                    "env": {
+                        "GOOGLE_MAPS_API_KEY": os.getenv("GOOGLE_MAPS_API_KEY", "")
+                    }
+                }
+            }
+        }]
+    try:
+        return pooled_tools(get_maps_pool())
+    except Exception as e:
+        print(f"⚠️ Google Maps MCP server unavailable, continuing without maps tools: {e!r}")
+        return []
+
+
 class QueryRouter:
     """
     Intelligent query router using Qwen Assistant for tool selection.
@@ -24,20 +80,9 @@ class QueryRouter:
         sql_tool_instance = SQLTool()
         weather_tool_instance = WeatherTool()
         rag_tool_instance = RAGTool(rag_engine, metadata_store, text_index, image_index)
-        map_tool = {
-            "mcpServers": {
-                "google-maps": {
-                "args": [
-                    "-y",
-                    "@modelcontextprotocol/server-google-maps"
-                ],
-                "command": "npx",
-                "env": {
-                    "GOOGLE_MAPS_API_KEY": os.getenv("GOOGLE_MAPS_API_KEY", "")
-                }
-                }
-            }
-            }
+        self.rag_tool = rag_tool_instance
+        map_tools = _maps_tools()
+        maps_description = "- google-maps: Plan routes and get location-based information using Google Maps API." if map_tools else ""
 
         # Configure the LLM for the agent
         self.llm_cfg = {
@@ -59,7 +104,7 @@ class QueryRouter:
             - {weather_tool_instance.name}: {weather_tool_instance.description}
             - {sql_tool_instance.name}: {sql_tool_instance.description}
             - {rag_tool_instance.name}: {rag_tool_instance.description}
-            - google-maps: Plan routes and get location-based information using Google Maps API.
+            {maps_description}
 
             CRITICAL RULES:
             - You MUST call a tool function for every user query.
@@ -68,51 +113,339 @@ class QueryRouter:
             - Extract parameter values from the user's question.
             - If unsure which tool to use, default to search_knowledge_base.
             """,
-            function_list=[weather_tool_instance, sql_tool_instance, rag_tool_instance, map_tool],
+            function_list=[weather_tool_instance, sql_tool_instance, rag_tool_instance, *map_tools],
         )
+        # The agent's own tool-selection calls are measured alongside the tools' calls
+        instrument_chat_model(self.assistant.llm, "dashscope", "router")
+
+        # Confident knowledge base / SQL queries are dispatched without the agent
+        self.intent_router = None
+        if INTENT_ROUTER_ENABLED:
+            self.intent_router = IntentRouter(
+                rag_engine.embedding_handler,
+                threshold=INTENT_ROUTER_THRESHOLD,
+                margin=INTENT_ROUTER_MARGIN,
+                route_cjk=INTENT_ROUTER_CJK_ENABLED
+            )
+
+        # The agent's tool calls are reused for repeated queries, except for time-sensitive tools
+        self.routing_cache = None
+        if ROUTING_CACHE_ENABLED:
+            self.routing_cache = RoutingCache(
+                ttl_seconds=ROUTING_CACHE_TTL,
+                max_entries=ROUTING_CACHE_MAX_ENTRIES,
+                bypass_tools=ROUTING_CACHE_BYPASS_TOOLS
+            )
+
+        # Tools of a compound question run concurrently
+        self.tool_executor = ThreadPoolExecutor(max_workers=max(1, ROUTER_TOOL_WORKERS), thread_name_prefix="router-tool")
+        # Speculative retrieval gets its own small pool so it never delays the tool calls themselves
+        self.prefetch_executor = None
+        if SPECULATIVE_RETRIEVAL_ENABLED:
+            self.prefetch_executor = ThreadPoolExecutor(
+                max_workers=max(1, SPECULATIVE_RETRIEVAL_WORKERS), thread_name_prefix="kb-prefetch"
+            )
+
+    def _direct_tool(self, query: str):
+        """
+        :return: (tool the intent router is confident about and that takes the query as is, else None,
+                  tool it recognized confidently, possibly one needing the agent's arguments, else None,
+                  query embedding computed for the decision, reused by the knowledge base tool, else None)
+        """
+        if self.intent_router is None:
+            return None, None, None
+        query_vec = None
+        try:
+            if self.intent_router.supports(query):
+                query_vec = self.rag_tool.embed_query(query)
+            tool_name, intent = self.intent_router.decide(query, query_vec)
+        except Exception as e:
+            print(f"⚠️ Intent routing failed, using the agent: {e}")
+            return None, None, query_vec
+        return (tool_name if tool_name in self.assistant.function_map else None), intent, query_vec
+
+    def _resolve_without_agent(self, query: str):
+        """
+        Tool call that can be made without asking the agent: an earlier routing
+        decision for the same query, or a confident intent router match
+        :return: ((tool name, JSON arguments) or None, intent router's confident tool or None,
+                  query embedding or None)
+        """
+        if self.routing_cache is not None:
+            cached = self.routing_cache.get(query)
+            if cached is not None and cached[0] in self.assistant.function_map:
+                print(f"🗂️ Routing cache hit: {cached[0]}")
+                return cached, cached[0], None
+        tool_name, intent, query_vec = self._direct_tool(query)
+        if tool_name is not None:
+            return (tool_name, json.dumps({"query": query}, ensure_ascii=False)), intent, query_vec
+        return None, intent, query_vec
+
+    def _call_tool(self, tool_name: str, arguments: str, prefetched=None, query=None, query_vec=None):
+        if tool_name == self.rag_tool.name:
+            return self.rag_tool.call(arguments, prefetched=prefetched, query=query, query_vec=query_vec)
+        # The user's question lets tools answer from a template in its language
+        return self.assistant.function_map[tool_name].call(arguments, query=query)
+
+    def _remember_route(self, query: str, tool_name: str, arguments: str, content):
+        """Cache the agent's tool call for query if the tool succeeded"""
+        if self.routing_cache is not None and _tool_succeeded(content):
+            self.routing_cache.put(query, tool_name, arguments)
+
+    def _tool_result(self, tool_name: str, content, query=None) -> dict:
+        #if map_tool is used, parse the response
+        if "maps" in tool_name.lower():
+            parsed_answer = _parse_maps_response(content, query, tool_name)
+            return {
+                "success": True,
+                "tool": tool_name,
+                "result": parsed_answer
+            }
+
+        return {
+            "success": True,
+            "tool": tool_name,
+            "result": content
+        }
+
+    def _plan_tool_calls(self, query: str) -> list:
+        """
+        Ask the agent's LLM which tools to call. A compound question can get
+        several calls, e.g. the weather and last Saturday's visitor numbers.
+        :return: List of (tool name, JSON arguments), empty if no tool was chosen
+        """
+        messages = [
+            {'role': 'system', 'content': self.assistant.system_message},
+            {'role': 'user', 'content': query}
+        ]
+        functions = [tool.function for tool in self.assistant.function_map.values()]
+        output = []
+        for output in self.assistant.llm.chat(
+            messages=messages,
+            functions=functions,
+            stream=True,
+            extra_generate_cfg={'parallel_function_calls': True}
+        ):
+            pass
+
+        calls = []
+        for message in output:
+            function_call = message.get('function_call') or {}
+            call = (function_call.get('name'), function_call.get('arguments') or '{}')
+            if call[0] in self.assistant.function_map and call not in calls:
+                calls.append(call)
+        return calls[:ROUTER_MAX_TOOL_CALLS]
+
+    def _resolve_tool_calls(self, query: str):
+        """
+        Tool calls for query: from the routing cache or intent router if possible, else planned by the agent.
+        While the agent plans, knowledge base retrieval for the query runs speculatively.
+        :return: (list of (tool name, JSON arguments), RetrievalPrefetch or None, query embedding or None)
+        """
+        resolved, intent, query_vec = self._resolve_without_agent(query)
+        if resolved is not None:
+            return [resolved], None, query_vec
+        prefetched = None
+        # Not worth it when the query is confidently for another tool (weather, maps, ...)
+        if self.prefetch_executor is not None and intent in (None, self.rag_tool.name):
+            prefetched = self.rag_tool.prefetch(
+                self.prefetch_executor, query, max_in_flight=SPECULATIVE_RETRIEVAL_WORKERS, query_vec=query_vec
+            )
+        try:
+            calls = self._plan_tool_calls(query)
+        except BaseException:
+            self.rag_tool.release_prefetch(prefetched)
+            raise
+        if len(calls) > 1:
+            print(f"🔀 Compound question, running {', '.join(name for name, _ in calls)} in parallel")
+        return calls, prefetched, query_vec
+
+    def _run_deferred(self, tool_name: str, arguments: str, prefetched=None, query=None, query_vec=None):
+        """
+        Call a tool with deferred generation, in whichever thread this runs
+        :return: (tool name, tool content, DeferredGeneration with the tool's answer prompt)
+        """
+        state = DeferredGeneration()
+        with deferred_generation(state):
+            try:
+                content = self._call_tool(tool_name, arguments, prefetched, query, query_vec)
+            except Exception as e:
+                content = json.dumps({"success": False, "error": f"Error in {tool_name}: {e}"}, ensure_ascii=False)
+        return tool_name, content, state
+
+    def _run_parallel(self, calls: list, prefetched=None, query=None, query_vec=None) -> list:
+        """Run several tool calls concurrently, bounded by the router's tool workers"""
+        futures = [
+            # Copy the context so the request's LLM trace follows the call into the worker
+            self.tool_executor.submit(
+                contextvars.copy_context().run, self._run_deferred, name, arguments, prefetched, query, query_vec
+            )
+            for name, arguments in calls
+        ]
+        return [future.result() for future in futures]
+
+    def _compound_prompt(self, query: str, runs: list):
+        """
+        One answer prompt covering every tool's part of a compound question
+        :return: (prompt, merged results)
+        """
+        parts, results = [], []
+        for tool_name, content, state in runs:
+            if "maps" in tool_name.lower():
+                parts.append((tool_name, _maps_prompt(content)))
+                continue
+            output = _tool_output(content)
+            if not output.get("success"):
+                parts.append((tool_name, f"This part could not be answered: {output.get('error', 'Unknown tool error')}"))
+                continue
+            results.extend(output.get("results", []))
+            # The prompt the tool would have answered, or the answer it already had (e.g. cached)
+            parts.append((tool_name, state.prompts[-1] if state.prompts else output.get("answer", "")))
+
+        sections = "\n\n".join(
+            f"### Part {index} ({tool_name})\n{material}" for index, (tool_name, material) in enumerate(parts, 1)
+        )
+        prompt = f"""
+                The user asked a question with several parts: "{query}"
+                Each part was handled by a different tool. The material for each part is below,
+                some of it written as instructions for answering that part.
+
+                {sections}
+
+                Write one answer that covers every part of the question.
+                Answer in the same language as the user query.
+                Answer:
+                """
+        return prompt, results
 
     def route_query(self, query: str) -> dict:
         """
         Send the query to the assistant, which will execute the appropriate tool.
+        Compound questions run their tools in parallel and get one combined answer.
         """
+        prefetched = None
         try:
-            messages = [{'role': 'user', 'content': query}]
-            # The agent will run and call the appropriate tool's `call` method
-            for response in self.assistant.run(messages):
-                # The final response from the agent will contain the tool's output
-                if response and len(response) > 0:
-                    last_message = response[-1]
-                    # The tool's output is in the 'content' of the 'function' role message
-                    if last_message.get('role') == 'function':
-                        tool_name = last_message.get("name", "")
-                        content = last_message.get("content", "")
-
-                        #if map_tool is used, parse the response
-                        if "maps" in tool_name.lower():
-                            parsed_answer = _parse_maps_response(content)
-                            return {
-                                "success": True,
-                                "tool": tool_name,
-                                "result": parsed_answer
-                            }
-
-                        return {
-                            "success": True,
-                            "tool": tool_name,
-                            "result": content
-                        }
-
-            # Fallback if no tool was called
-            return {"success": False, "tool": "unknown", "error": "Assistant did not call a tool."}
+            calls, prefetched, query_vec = self._resolve_tool_calls(query)
+            if not calls:
+                # Fallback if no tool was called
+                return {"success": False, "tool": "unknown", "error": "Assistant did not call a tool."}
+
+            if len(calls) == 1:
+                tool_name, arguments = calls[0]
+                content = self._call_tool(tool_name, arguments, prefetched, query, query_vec)
+                self._remember_route(query, tool_name, arguments, content)
+                return self._tool_result(tool_name, content, query)
+
+            runs = self._run_parallel(calls, prefetched, query, query_vec)
+            tool_name = "+".join(name for name, _ in calls)
+            if not any(_tool_succeeded(content) for _, content, _ in runs):
+                return {"success": False, "tool": tool_name, "error": _compound_error(runs)}
+            prompt, results = self._compound_prompt(query, runs)
+            answer = generate_local_answer(prompt, caller=tool_name)
+            return {
+                "success": True,
+                "tool": tool_name,
+                "result": json.dumps({"success": True, "answer": answer, "results": results}, ensure_ascii=False)
+            }
 
         except Exception as e:
             import traceback
             print(f"❌ Router error traceback:\n{traceback.format_exc()}")
             return {"success": False, "tool": "unknown", "error": f"Error routing query: {repr(e)}"}
+        finally:
+            # Speculative retrieval is dropped if the knowledge base tool was not called
+            self.rag_tool.release_prefetch(prefetched)
         
-def _parse_maps_response(content: any):
-    # Extract relevant information from the maps API response
-    prompt = f"""
+    def route_query_stream(self, query: str):
+        """
+        Streaming variant of route_query.
+        Yields events: {"type": "tool"} (one per tool), {"type": "sources"}, {"type": "token"} (repeated)
+        and finally {"type": "done"} with the full answer, or {"type": "error"}.
+        Tools run with deferred generation, so the final Ollama answer is streamed here.
+        """
+        prefetched = None
+        try:
+            calls, prefetched, query_vec = self._resolve_tool_calls(query)
+            if not calls:
+                yield {"type": "error", "tool": "unknown", "error": "Assistant did not call a tool."}
+                return
+            for tool_name, _ in calls:
+                yield {"type": "tool", "tool": tool_name}
+
+            if len(calls) == 1:
+                tool_name, content, deferred = self._run_deferred(*calls[0], prefetched, query, query_vec)
+                self._remember_route(query, tool_name, calls[0][1], content)
+                if "maps" in tool_name.lower():
+                    answer = format_maps(content, query, tool_name)
+                    tool_output = {"success": True, "answer": answer or ""}
+                    prompts = [] if answer is not None else [_maps_prompt(content)]
+                else:
+                    tool_output = _tool_output(content)
+                    prompts = deferred.prompts
+            else:
+                tool_name = "+".join(name for name, _ in calls)
+                runs = self._run_parallel(calls, prefetched, query, query_vec)
+                if not any(_tool_succeeded(content) for _, content, _ in runs):
+                    yield {"type": "error", "tool": tool_name, "error": _compound_error(runs)}
+                    return
+                prompt, results = self._compound_prompt(query, runs)
+                # Per-tool deferred callbacks are skipped, the answer is not any single tool's
+                deferred = DeferredGeneration()
+                tool_output = {"success": True, "answer": "", "results": results}
+                prompts = [prompt]
+
+            if not tool_output.get("success"):
+                yield {"type": "error", "tool": tool_name, "error": tool_output.get("error", "Unknown tool error")}
+                return
+            results = tool_output.get("results", [])
+            yield {"type": "sources", "tool": tool_name, "results": results}
+
+            answer = ""
+            if prompts:
+                generation_start = time.perf_counter()
+                for token in stream_local_answer(prompts[-1], caller=tool_name):
+                    answer += token
+                    yield {"type": "token", "text": token}
+                deferred.finish(answer, time.perf_counter() - generation_start)
+            # Whatever the tool returned besides the deferred answer (cached answers, image notes)
+            remainder = tool_output.get("answer") or ""
+            if remainder:
+                answer += remainder
+                yield {"type": "token", "text": remainder}
+
+            yield {"type": "done", "tool": tool_name, "answer": answer, "results": results}
+
+        except Exception as e:
+            import traceback
+            print(f"❌ Router error traceback:\n{traceback.format_exc()}")
+            yield {"type": "error", "tool": "unknown", "error": f"Error routing query: {repr(e)}"}
+        finally:
+            self.rag_tool.release_prefetch(prefetched)
+
+
+def _tool_output(content) -> dict:
+    """A tool's content as an output dict; plain text becomes the answer"""
+    try:
+        return json.loads(content) if isinstance(content, str) else dict(content)
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return {"success": True, "answer": str(content)}
+
+
+def _tool_succeeded(content) -> bool:
+    """False for tool outputs that report a failure"""
+    try:
+        output = json.loads(content) if isinstance(content, str) else content
+    except (json.JSONDecodeError, TypeError):
+        return True
+    return not (isinstance(output, dict) and output.get("success") is False)
+
+
+def _compound_error(runs) -> str:
+    return "; ".join(f"{tool_name}: {_tool_output(content).get('error', 'Unknown tool error')}" for tool_name, content, _ in runs)
+
+
+def _maps_prompt(content: any):
+    return f"""
             You are an expert assistant for parsing Google Maps API responses. 
             Convert the following content into a concise, user-friendly natural language description.
             Answer in the same language as the user query.
@@ -120,5 +453,13 @@ def _parse_maps_response(content: any):
             {content}
             Answer:
             """
-    answer = generate_local_answer(prompt)
+
+
+def _parse_maps_response(content: any, query=None, tool_name=None):
+    # Extract relevant information from the maps API response, from a template when its shape is known
+    answer = format_maps(content, query, tool_name)
+    if answer is not None:
+        return answer
+    prompt = _maps_prompt(content)
+    answer = generate_local_answer(prompt, caller="google-maps")
     return answer
\ No newline at end of file
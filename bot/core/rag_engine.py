@@ -1,4 +1,5 @@
-from .embedding_handler import EmbeddingHandler
+from .reranker import CrossEncoderReranker
+from ..config import RERANK_ENABLED
 
 
 class RAGEngine:
@@ -8,4 +9,8 @@ class RAGEngine:
     This engine's primary role is to provide the embedding handler to other components.
     """
     def __init__(self):
+        # Imported here so modules holding a RAGEngine can be imported without the model stack
+        from .embedding_handler import EmbeddingHandler
         self.embedding_handler = EmbeddingHandler()
+        # Optional second retrieval stage, loaded on first use
+        self.reranker = CrossEncoderReranker() if RERANK_ENABLED else None
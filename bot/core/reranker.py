@@ -0,0 +1,87 @@
+"""
+Cross-encoder re-ranking of retrieved candidates.
+"""
+import time
+import threading
+
+from ..config import RERANK_MODEL, RERANK_SCORE_CUTOFF, RERANK_MIN_KEEP
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a cross-encoder in one batched CPU pass
+    and keeps the best candidates above a score cutoff
+    """
+    def __init__(self, model_name=RERANK_MODEL, cutoff=RERANK_SCORE_CUTOFF, min_keep=RERANK_MIN_KEEP):
+        """
+        :param model_name: sentence-transformers CrossEncoder model
+        :param cutoff: Candidates scoring below this are dropped
+        :param min_keep: Keep at least this many candidates even if all score below the cutoff
+        """
+        self.model_name = model_name
+        self.cutoff = cutoff
+        self.min_keep = min_keep
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._calls = 0
+        self._total_ms = 0.0
+        self._candidates = 0
+        self._kept = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    print(f"Loading re-ranking model {self.model_name}...")
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def warm_up(self):
+        self.model.predict([("warm up", "warm up")])
+
+    def rerank(self, query, items, top_k=None):
+        """
+        :param query: User query
+        :param items: Retrieved context items
+        :param top_k: Maximum number of items to keep
+        :return: (kept items ordered by cross-encoder score, latency in ms)
+        """
+        if not items:
+            return [], 0.0
+        start = time.perf_counter()
+        scores = self.model.predict(
+            [(query, item.get("content", "")) for item in items],
+            batch_size=len(items),
+            show_progress_bar=False
+        )
+        ranked = []
+        for item, score in sorted(zip(items, scores), key=lambda pair: float(pair[1]), reverse=True):
+            # "score" drives prompt ordering downstream, keep the vector score alongside
+            ranked.append(dict(item, retrieval_score=item.get("score"), score=float(score)))
+
+        kept = [item for item in ranked if item["score"] >= self.cutoff]
+        if len(kept) < self.min_keep:
+            kept = ranked[:self.min_keep]
+        if top_k is not None:
+            kept = kept[:top_k]
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self._calls += 1
+            self._total_ms += elapsed_ms
+            self._candidates += len(items)
+            self._kept += len(kept)
+        print(f"🔀 Re-ranked {len(items)} candidates in {elapsed_ms:.0f} ms, kept {len(kept)}")
+        return kept, elapsed_ms
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "calls": self._calls,
+                "avg_rerank_ms": round(self._total_ms / self._calls, 1) if self._calls else 0.0,
+                "avg_candidates": round(self._candidates / self._calls, 1) if self._calls else 0.0,
+                "avg_kept": round(self._kept / self._calls, 1) if self._calls else 0.0,
+            }
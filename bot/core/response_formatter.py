@@ -0,0 +1,329 @@
+"""
+Template answers for well-structured tool outputs (weather, SQL rows, Google Maps).
+
+Payloads of a known shape are turned into a sentence directly, in the language of the
+user's question (Chinese or English), instead of asking Ollama to rephrase the JSON.
+Every formatter returns None for anything it does not recognize, and the caller then
+falls back to the LLM. Free text that would be copied into the answer (weather
+descriptions, route instructions) must already be in the answer's language.
+"""
+import re
+import json
+import threading
+from datetime import date, datetime
+
+from ..config import TEMPLATE_FORMATTER_ENABLED
+
+_CJK = re.compile(r"[㐀-䶿一-鿿豈-﫿]")
+_HTML_TAG = re.compile(r"<[^>]+>")
+
+MAX_SQL_ROWS = 10
+MAX_SQL_COLUMNS = 6
+MAX_ROUTE_STEPS = 8
+MAX_PLACES = 5
+
+# OpenWeatherMap descriptions (English) for Chinese answers
+WEATHER_ZH = {
+    "clear sky": "晴", "few clouds": "少云", "scattered clouds": "多云", "broken clouds": "多云",
+    "overcast clouds": "阴", "light rain": "小雨", "moderate rain": "中雨", "heavy intensity rain": "大雨",
+    "very heavy rain": "暴雨", "shower rain": "阵雨", "light intensity shower rain": "小阵雨", "rain": "雨",
+    "thunderstorm": "雷阵雨", "thunderstorm with light rain": "雷阵雨", "thunderstorm with rain": "雷阵雨",
+    "drizzle": "毛毛雨", "light intensity drizzle": "毛毛雨", "snow": "雪", "light snow": "小雪",
+    "heavy snow": "大雪", "sleet": "雨夹雪", "mist": "薄雾", "fog": "雾", "haze": "霾",
+}
+
+# Column names of the visit_flow table and the aliases text-to-SQL gives its aggregates.
+# Results with any other column (e.g. an unaliased COUNT(*)) are left to the LLM.
+COLUMN_LABELS = {
+    "en": {"visit_date": "Date", "entry_time": "Entry time", "exit_time": "Exit time",
+           "visitor_count": "Visitors", "visitors": "Visitors", "total_visitors": "Total visitors",
+           "avg_visitors": "Average visitors", "max_visitors": "Maximum visitors", "min_visitors": "Minimum visitors"},
+    "zh": {"visit_date": "日期", "entry_time": "入园时间", "exit_time": "离园时间",
+           "visitor_count": "游客数", "visitors": "游客数", "total_visitors": "游客总数",
+           "avg_visitors": "平均游客数", "max_visitors": "最多游客数", "min_visitors": "最少游客数"},
+}
+
+TEMPLATES = {
+    "en": {
+        "forecast": "Forecast for {location} on {date}: {weather}, {temp_day}°C during the day and {temp_night}°C at night, "
+                    "humidity {humidity}%, wind {wind_speed} m/s.",
+        "historical": "There is no forecast for {location} on {date} yet. Over the past 3 years this date averaged "
+                      "{avg_temp} with {avg_humidity} humidity, typically {weather}.",
+        "weather_error": "Weather for {location} on {date} is unavailable: {error}",
+        "sql_rows": "{count} rows:",
+        "sql_rows_truncated": "{count} rows, the first {shown}:",
+        "route": "Route via {summary}: {distance}, about {duration}.",
+        "route_steps": "Directions:",
+        "distance_pair": "From {origin} to {destination}: {distance}, about {duration}.",
+        "distance_missing": "No route found from {origin} to {destination}.",
+        "geocode": "{address} is at latitude {lat}, longitude {lng}.",
+        "places": "Places found for your search:",
+        "rating": "rated {rating}",
+        "no_places": "No matching places were found.",
+        "separator": ", ",
+        "label": "{label}: {value}",
+        "hours": "{hours} h {minutes} min", "minutes": "{minutes} min", "km": "{km} km", "m": "{m} m",
+        "none": "n/a",
+    },
+    "zh": {
+        "forecast": "{location}{date}天气预报：{weather}，白天{temp_day}°C，夜间{temp_night}°C，湿度{humidity}%，风速{wind_speed}米/秒。",
+        "historical": "{location}{date}暂无天气预报。过去3年同一天的平均气温为{avg_temp}，平均湿度{avg_humidity}，天气多为{weather}。",
+        "weather_error": "无法获取{location}{date}的天气：{error}",
+        "sql_rows": "共{count}条记录：",
+        "sql_rows_truncated": "共{count}条记录，前{shown}条如下：",
+        "route": "推荐路线经{summary}，全程{distance}，约需{duration}。",
+        "route_steps": "路线指引：",
+        "distance_pair": "从{origin}到{destination}：{distance}，约需{duration}。",
+        "distance_missing": "未找到从{origin}到{destination}的路线。",
+        "geocode": "{address}的坐标为纬度{lat}，经度{lng}。",
+        "places": "为您找到以下地点：",
+        "rating": "评分{rating}",
+        "no_places": "未找到符合条件的地点。",
+        "separator": "，",
+        "label": "{label}：{value}",
+        "hours": "{hours}小时{minutes}分钟", "minutes": "{minutes}分钟", "km": "{km}公里", "m": "{m}米",
+        "none": "无",
+    },
+}
+
+# Per tool: answers from templates vs. payloads left to the LLM
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def detect_language(text) -> str:
+    """'zh' if the text contains Chinese characters, else 'en'"""
+    return "zh" if text and _CJK.search(str(text)) else "en"
+
+
+def _record(tool: str, answer):
+    with _stats_lock:
+        stats = _stats.setdefault(tool, {"template": 0, "llm": 0})
+        stats["template" if answer is not None else "llm"] += 1
+    return answer
+
+
+def get_formatter_stats() -> dict:
+    """How often each tool's output was answered from a template"""
+    with _stats_lock:
+        return {
+            tool: {**stats, "hit_rate": round(stats["template"] / (stats["template"] + stats["llm"]), 4)}
+            for tool, stats in _stats.items()
+        }
+
+
+def _in_language(text, lang) -> bool:
+    """Free text can be copied into a Chinese answer only if it is Chinese"""
+    return lang == "en" or detect_language(text) == "zh"
+
+
+def _value(value, lang) -> str:
+    if value is None or (isinstance(value, float) and value != value):
+        return TEMPLATES[lang]["none"]
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d") if value.time() == datetime.min.time() else value.strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        value = value.item()  # numpy scalars from pandas
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return f"{value:,}"
+    if isinstance(value, float):
+        return f"{value:,.2f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def _label(column, lang):
+    """Label of a known column, else None"""
+    return COLUMN_LABELS[lang].get(str(column).strip().lower())
+
+
+def _row(row: dict, lang) -> str:
+    t = TEMPLATES[lang]
+    return t["separator"].join(
+        t["label"].format(label=_label(column, lang), value=_value(value, lang)) for column, value in row.items()
+    )
+
+
+def _distance(meters, lang) -> str:
+    t = TEMPLATES[lang]
+    if meters >= 1000:
+        return t["km"].format(km=f"{meters / 1000:.1f}".rstrip("0").rstrip("."))
+    return t["m"].format(m=int(meters))
+
+
+def _duration(seconds, lang) -> str:
+    t = TEMPLATES[lang]
+    minutes = max(1, round(seconds / 60))
+    if minutes >= 60:
+        return t["hours"].format(hours=minutes // 60, minutes=minutes % 60)
+    return t["minutes"].format(minutes=minutes)
+
+
+def _end(text, lang) -> str:
+    return text + ("。" if lang == "zh" else ".")
+
+
+# --- Weather ---
+
+def format_weather(result: dict, location: str, date_str: str, query=None):
+    """
+    Answer for WeatherTool's forecast, historical average or error dict
+    :param query: The user's question, for the answer language; the location is used without it
+    :return: The answer, or None to let the LLM answer
+    """
+    if not TEMPLATE_FORMATTER_ENABLED:
+        return None
+    lang = detect_language(query or location)
+    return _record("get_weather", _format_weather(result, location, date_str, lang))
+
+
+def _format_weather(result, location, date_str, lang):
+    t = TEMPLATES[lang]
+    try:
+        if not result.get("success"):
+            if not _in_language(result["error"], lang):
+                return None
+            return t["weather_error"].format(location=location, date=date_str, error=result["error"])
+        if result.get("source") == "forecast":
+            weather = _weather_text(result["weather"], lang)
+            if weather is None:
+                return None
+            return t["forecast"].format(
+                location=location, date=result["date"], weather=weather,
+                temp_day=_value(float(result["temp_day"]), lang), temp_night=_value(float(result["temp_night"]), lang),
+                humidity=_value(result["humidity"], lang), wind_speed=_value(float(result["wind_speed"]), lang)
+            )
+        if result.get("source") == "historical_average":
+            weather = _weather_text(result["typical_weather"], lang)
+            if weather is None:
+                return None
+            return t["historical"].format(
+                location=location, date=result["date"], weather=weather,
+                avg_temp=result["avg_temp"], avg_humidity=result["avg_humidity"]
+            )
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+    return None
+
+
+def _weather_text(description, lang):
+    description = str(description).strip()
+    if lang == "zh":
+        return WEATHER_ZH.get(description.lower(), description if _in_language(description, lang) else None)
+    return description
+
+
+# --- SQL ---
+
+def format_sql_results(results: list, query=None):
+    """
+    Answer listing SQL result rows: a single value, one row, or up to MAX_SQL_ROWS rows
+    :return: The answer, or None for wide or nested results
+    """
+    if not TEMPLATE_FORMATTER_ENABLED:
+        return None
+    return _record("text_to_sql", _format_sql(results, detect_language(query)))
+
+
+def _format_sql(results, lang):
+    t = TEMPLATES[lang]
+    if not results or not all(isinstance(row, dict) for row in results):
+        return None
+    if len(results[0]) > MAX_SQL_COLUMNS or any(isinstance(v, (dict, list)) for row in results for v in row.values()):
+        return None
+    # Raw column names such as "COUNT(*)" must not reach the user
+    if any(_label(column, lang) is None for row in results for column in row):
+        return None
+    if len(results) == 1:
+        return _end(_row(results[0], lang), lang)
+    shown = results[:MAX_SQL_ROWS]
+    header = (t["sql_rows"] if len(shown) == len(results) else t["sql_rows_truncated"]).format(
+        count=_value(len(results), lang), shown=len(shown))
+    return "\n".join([header] + [f"- {_row(row, lang)}" for row in shown])
+
+
+# --- Google Maps ---
+
+def format_maps(content, query=None, tool_name=None):
+    """
+    Answer for the Google Maps MCP server's directions, distance matrix, geocode and place search outputs
+    :param content: The tool's JSON text
+    :return: The answer, or None for other tools and unexpected output
+    """
+    if not TEMPLATE_FORMATTER_ENABLED:
+        return None
+    return _record(tool_name or "google-maps", _format_maps(content, detect_language(query)))
+
+
+def _format_maps(content, lang):
+    try:
+        data = json.loads(content) if isinstance(content, str) else content
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    try:
+        if "routes" in data:
+            return _format_directions(data["routes"], lang)
+        if "results" in data and "origin_addresses" in data:
+            return _format_distance_matrix(data, lang)
+        if "places" in data:
+            return _format_places(data["places"], lang)
+        if "location" in data and "formatted_address" in data:
+            location = data["location"]
+            return TEMPLATES[lang]["geocode"].format(
+                address=data["formatted_address"], lat=f"{location['lat']:.5f}", lng=f"{location['lng']:.5f}")
+    except (KeyError, TypeError, ValueError, IndexError):
+        return None
+    return None
+
+
+def _format_directions(routes, lang):
+    t = TEMPLATES[lang]
+    if not routes:
+        return None
+    route = routes[0]
+    steps = [_HTML_TAG.sub("", step["instructions"]).strip() for step in route.get("steps", [])]
+    if not all(_in_language(step, lang) for step in steps):
+        return None
+    lines = [t["route"].format(
+        summary=route.get("summary") or "-",
+        distance=_distance(route["distance"]["value"], lang),
+        duration=_duration(route["duration"]["value"], lang)
+    )]
+    if steps:
+        lines.append(t["route_steps"])
+        lines.extend(f"{index}. {step}" for index, step in enumerate(steps[:MAX_ROUTE_STEPS], 1))
+    return "\n".join(lines)
+
+
+def _format_distance_matrix(data, lang):
+    t = TEMPLATES[lang]
+    lines = []
+    for origin, row in zip(data["origin_addresses"], data["results"]):
+        for destination, element in zip(data["destination_addresses"], row["elements"]):
+            if element.get("status") != "OK":
+                lines.append(t["distance_missing"].format(origin=origin, destination=destination))
+                continue
+            lines.append(t["distance_pair"].format(
+                origin=origin, destination=destination,
+                distance=_distance(element["distance"]["value"], lang),
+                duration=_duration(element["duration"]["value"], lang)
+            ))
+    return "\n".join(lines) or None
+
+
+def _format_places(places, lang):
+    t = TEMPLATES[lang]
+    if not places:
+        return t["no_places"]
+    lines = [t["places"]]
+    for place in places[:MAX_PLACES]:
+        parts = [place["name"], place.get("formatted_address")]
+        if place.get("rating") is not None:
+            parts.append(t["rating"].format(rating=place["rating"]))
+        lines.append("- " + t["separator"].join(part for part in parts if part))
+    return "\n".join(lines)
@@ -0,0 +1,87 @@
+"""
+Routing decision cache: which tool the agent called for a query, and with what arguments.
+
+Repeated questions reuse the agent's earlier decision and skip the function-calling
+round trip. Queries are matched after normalization (case, whitespace, trailing
+punctuation), so trivially different spellings of the same question share an entry.
+"""
+import re
+import time
+import threading
+from collections import OrderedDict
+
+_TRAILING_PUNCTUATION = "?!.,;:？！。，；：～~ "
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", str(query)).strip().lower().rstrip(_TRAILING_PUNCTUATION)
+
+
+class RoutingCache:
+    """
+    Normalized query -> (tool name, arguments) with a TTL and LRU eviction
+    """
+    def __init__(self, ttl_seconds=3600.0, max_entries=2000, bypass_tools=()):
+        """
+        :param ttl_seconds: How long a routing decision is reused
+        :param max_entries: Least recently used decisions beyond this are dropped
+        :param bypass_tools: Tools whose arguments must be recomputed every time (e.g. relative dates)
+        """
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.bypass_tools = set(bypass_tools)
+        self._entries = OrderedDict()  # normalized query -> (expires_at, tool name, arguments)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def get(self, query):
+        """
+        :return: (tool name, arguments) of a fresh decision, else None
+        """
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, query, tool_name, arguments):
+        """
+        Remember the agent's decision for query
+        :return: False if the tool is bypassed and nothing was stored
+        """
+        if tool_name in self.bypass_tools:
+            with self._lock:
+                self.bypassed += 1
+            return False
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, tool_name, arguments)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,106 @@
+"""
+Semantic answer cache for the RAG tool.
+
+An answer is reused when a new query's embedding is close enough to a cached
+query and retrieval returned the same documents, so only the LLM generation
+is skipped. Entries are dropped when the knowledge base snapshot changes.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def knowledge_base_snapshot(metadata_store, text_index, image_index, metadata_file=None):
+    """Identifier of the loaded knowledge base; changes whenever it is rebuilt or extended"""
+    mtime = None
+    if metadata_file and os.path.exists(metadata_file):
+        mtime = os.path.getmtime(metadata_file)
+    return (
+        len(metadata_store or []),
+        getattr(text_index, "ntotal", 0),
+        getattr(image_index, "ntotal", 0),
+        mtime,
+    )
+
+
+class SemanticAnswerCache:
+    """
+    Stores (query embedding, retrieved ids, answer) and serves answers for near-paraphrases
+    """
+    def __init__(self, threshold=0.95, max_entries=1000):
+        """
+        :param threshold: Minimum cosine similarity between query embeddings
+        :param max_entries: Least recently used entries beyond this are dropped
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (embedding, ids, answer, generation_seconds)
+        self._matrix = None
+        self._keys = []
+        self._snapshot = None
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _rebuild_matrix(self):
+        self._keys = list(self._entries.keys())
+        self._matrix = np.stack([self._entries[k][0] for k in self._keys]) if self._keys else None
+
+    def check_snapshot(self, snapshot):
+        """Clear the cache when the knowledge base snapshot changed"""
+        with self._lock:
+            if snapshot != self._snapshot:
+                if self._entries:
+                    print("♻️ Knowledge base changed, clearing semantic answer cache")
+                self._entries.clear()
+                self._rebuild_matrix()
+                self._snapshot = snapshot
+
+    def lookup(self, embedding, retrieved_ids):
+        """
+        :param embedding: Normalized query embedding
+        :param retrieved_ids: Ids returned by retrieval for this query
+        :return: Cached answer or None
+        """
+        retrieved_ids = tuple(retrieved_ids)
+        with self._lock:
+            if self._matrix is not None:
+                similarities = self._matrix @ np.asarray(embedding, dtype="float32")
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.threshold:
+                        break
+                    key = self._keys[index]
+                    _, ids, answer, generation_seconds = self._entries[key]
+                    if ids == retrieved_ids:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        self.saved_seconds += generation_seconds
+                        return answer
+            self.misses += 1
+            return None
+
+    def store(self, embedding, retrieved_ids, answer, generation_seconds):
+        """Cache an answer together with how long it took to generate"""
+        with self._lock:
+            self._entries[self._next_key] = (
+                np.asarray(embedding, dtype="float32"), tuple(retrieved_ids), answer, generation_seconds
+            )
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._rebuild_matrix()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "latency_saved_seconds": round(self.saved_seconds, 2),
+            }
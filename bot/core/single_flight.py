@@ -0,0 +1,128 @@
+"""
+Single-flight coalescing: concurrent calls with the same key share one execution.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    The first caller for a key runs the work, callers arriving while it is in
+    flight wait for the same result. Results can be kept for a short TTL so
+    immediate repeats are answered without running the work again.
+    Works across threads and asyncio event loops.
+    """
+    def __init__(self, ttl_seconds=0.0, max_entries=256, cacheable=None):
+        """
+        :param ttl_seconds: How long finished results are reused, 0 disables the result cache
+        :param max_entries: Oldest cached results beyond this are dropped
+        :param cacheable: Optional predicate, results it rejects (e.g. errors) are not cached
+        """
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.cacheable = cacheable
+        self._inflight = {}
+        self._results = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+
+    def get_cached(self, key):
+        """
+        :return: (True, result) for a fresh cached result, else (False, None)
+        """
+        with self._lock:
+            return self._cached(key)
+
+    def _cached(self, key):
+        entry = self._results.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] < time.monotonic():
+            del self._results[key]
+            return False, None
+        self.cache_hits += 1
+        return True, entry[1]
+
+    def put(self, key, result):
+        """Cache a result produced outside do()/ado(), e.g. a streamed answer"""
+        if self.ttl <= 0 or (self.cacheable is not None and not self.cacheable(result)):
+            return
+        with self._lock:
+            self._results[key] = (time.monotonic() + self.ttl, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def _join(self, key):
+        """
+        :return: (is_leader, cached, value); value is the Future to wait on or the cached result
+        """
+        with self._lock:
+            hit, result = self._cached(key)
+            if hit:
+                return False, True, result
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return False, False, future
+            future = Future()
+            self._inflight[key] = future
+            self.executions += 1
+            return True, False, future
+
+    def _finish(self, key, future, result=None, error=None):
+        if error is None:
+            self.put(key, result)
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def do(self, key, fn):
+        """Run fn() unless a call with the same key is in flight or cached"""
+        is_leader, cached, value = self._join(key)
+        if cached:
+            return value
+        if not is_leader:
+            return value.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, value, error=e)
+            raise
+        self._finish(key, value, result)
+        return result
+
+    async def ado(self, key, coro_fn):
+        """Asyncio variant of do(), coro_fn() returns an awaitable"""
+        is_leader, cached, value = self._join(key)
+        if cached:
+            return value
+        if not is_leader:
+            return await asyncio.wrap_future(value)
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            self._finish(key, value, error=e)
+            raise
+        self._finish(key, value, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            requests = self.executions + self.coalesced + self.cache_hits
+            return {
+                "requests": requests,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "cache_hits": self.cache_hits,
+                "in_flight": len(self._inflight),
+                "saved_rate": round((self.coalesced + self.cache_hits) / requests, 4) if requests else 0.0,
+            }
@@ -0,0 +1,3 @@
+"""
+Offline load testing: stand-in LLM servers and a load driver for the backend.
+"""
@@ -0,0 +1,63 @@
+"""
+python -m bot.loadtest stand-ins   # serve the Ollama and DashScope stand-ins
+python -m bot.loadtest drive       # load the running backend and print a report
+python bot/loadtest/maps_mcp_stand_in.py   # serve the Google Maps MCP stand-in (stdio by default)
+"""
+import argparse
+import asyncio
+import json
+
+from ..config import LOADTEST_OLLAMA_PORT, LOADTEST_DASHSCOPE_PORT
+
+
+async def serve_stand_ins(host="127.0.0.1", ollama_port=LOADTEST_OLLAMA_PORT, dashscope_port=LOADTEST_DASHSCOPE_PORT):
+    import uvicorn
+    from .stand_ins import ollama_app, dashscope_app
+
+    servers = [
+        uvicorn.Server(uvicorn.Config(ollama_app, host=host, port=ollama_port, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(dashscope_app, host=host, port=dashscope_port, log_level="warning")),
+    ]
+    print(f"🧪 Ollama stand-in on http://{host}:{ollama_port}, DashScope stand-in on http://{host}:{dashscope_port}/api/v1")
+    print(f"   Start the backend with OLLAMA_HOST=http://{host}:{ollama_port} "
+          f"DASHSCOPE_HTTP_BASE_URL=http://{host}:{dashscope_port}/api/v1")
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load testing")
+    subparsers = parser.add_subparsers(dest="action")
+
+    stand_ins_parser = subparsers.add_parser("stand-ins", help="Serve the Ollama and DashScope stand-ins")
+    stand_ins_parser.add_argument("--host", default="127.0.0.1")
+    stand_ins_parser.add_argument("--ollama-port", type=int, default=LOADTEST_OLLAMA_PORT)
+    stand_ins_parser.add_argument("--dashscope-port", type=int, default=LOADTEST_DASHSCOPE_PORT)
+
+    drive_parser = subparsers.add_parser("drive", help="Send load to a running backend")
+    drive_parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend base URL (default: %(default)s)")
+    drive_parser.add_argument("--endpoint", default="/ask", choices=["/ask", "/ask/stream"])
+    drive_parser.add_argument("--concurrency", type=int, default=4)
+    drive_parser.add_argument("--requests", type=int, default=40)
+    drive_parser.add_argument("--queries-file", help="Text file with one query per line")
+    drive_parser.add_argument("--output", help="Save the report as JSON")
+
+    args = parser.parse_args()
+    if args.action == "stand-ins":
+        asyncio.run(serve_stand_ins(args.host, args.ollama_port, args.dashscope_port))
+    elif args.action == "drive":
+        from .load_driver import run_load
+        queries = None
+        if args.queries_file:
+            with open(args.queries_file, "r", encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+        report = run_load(args.url, args.endpoint, queries, args.concurrency, args.requests)
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Closed-loop load driver for the backend's /ask and /ask/stream endpoints.
+"""
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_QUERIES = [
+    "What are the opening hours of the park?",
+    "How much is an adult ticket?",
+    "Is there a parade tonight?",
+    "Can I bring food into the park?",
+    "Where can I park my car?",
+]
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _ask(session, base_url, endpoint, query, timeout):
+    """
+    :return: (ok, latency seconds, time to first token or None)
+    """
+    start = time.perf_counter()
+    if endpoint == "/ask/stream":
+        first_token = None
+        ok = False
+        with session.post(base_url + endpoint, json={"query": query}, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if event["type"] == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event["type"] in ("done", "error"):
+                    ok = event["type"] == "done"
+        return ok, time.perf_counter() - start, first_token
+
+    response = session.post(base_url + endpoint, json={"query": query}, timeout=timeout)
+    response.raise_for_status()
+    return bool(response.json().get("success")), time.perf_counter() - start, None
+
+
+def run_load(base_url="http://127.0.0.1:8000", endpoint="/ask", queries=None,
+             concurrency=4, total_requests=40, timeout=120):
+    """
+    Send total_requests queries with `concurrency` workers, each sending its next request as soon as
+    the previous one finished
+    :return: Report with throughput, latency percentiles, time to first token (streaming) and errors
+    """
+    queries = queries or DEFAULT_QUERIES
+    latencies, first_tokens, errors = [], [], []
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            try:
+                ok, latency, first_token = _ask(session, base_url, endpoint, queries[index % len(queries)], timeout)
+            except Exception as e:
+                ok, latency, first_token = False, None, None
+                with lock:
+                    errors.append(str(e))
+            with lock:
+                if latency is not None:
+                    latencies.append(latency)
+                if first_token is not None:
+                    first_tokens.append(first_token)
+                if not ok and latency is not None:
+                    errors.append("unsuccessful response")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.perf_counter() - start
+
+    def summary(values):
+        return {f"p{int(q * 100)}_ms": round(_percentile(values, q) * 1000, 1) if values else None
+                for q in (0.5, 0.95, 0.99)}
+
+    report = {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": len(errors),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "latency": summary(latencies),
+    }
+    if first_tokens:
+        report["time_to_first_token"] = summary(first_tokens)
+    if errors:
+        report["first_error"] = errors[0]
+    return report
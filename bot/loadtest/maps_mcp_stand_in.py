@@ -0,0 +1,84 @@
+"""
+Stand-in for the Google Maps MCP server (@modelcontextprotocol/server-google-maps).
+
+It exposes the tools the assistant uses, with the same names and arguments, and
+answers with canned JSON after LOADTEST_MAPS_LATENCY_MS. It is a standalone script
+that imports nothing from the bot package: over stdio, any output printed while
+importing the ML stack would corrupt the JSON-RPC stream. Point the backend at it with
+    MAPS_MCP_COMMAND=python MAPS_MCP_ARGS="bot/loadtest/maps_mcp_stand_in.py"
+or serve it over HTTP (--transport streamable-http) and set
+    MAPS_MCP_TRANSPORT=streamable-http MAPS_MCP_URL=http://127.0.0.1:8091/mcp
+"""
+import os
+import json
+import asyncio
+import argparse
+
+from mcp.server.fastmcp import FastMCP
+
+LOADTEST_MAPS_MCP_PORT = int(os.getenv("LOADTEST_MAPS_MCP_PORT", "8091"))
+LOADTEST_MAPS_LATENCY_MS = float(os.getenv("LOADTEST_MAPS_LATENCY_MS", "150"))
+
+LOCATION = {"lat": 31.1433, "lng": 121.6580}
+
+
+def create_server(host="127.0.0.1", port=LOADTEST_MAPS_MCP_PORT, latency_ms=LOADTEST_MAPS_LATENCY_MS):
+    server = FastMCP("google-maps", host=host, port=port)
+
+    async def reply(result):
+        await asyncio.sleep(latency_ms / 1000)
+        return json.dumps(result, indent=2)
+
+    @server.tool()
+    async def maps_geocode(address: str) -> str:
+        """Convert an address into geographic coordinates"""
+        return await reply({"location": LOCATION, "formatted_address": address, "place_id": "stand-in-place"})
+
+    @server.tool()
+    async def maps_search_places(query: str, location: dict = None, radius: float = None) -> str:
+        """Search for places using Google Places API"""
+        return await reply({"places": [
+            {"name": f"{query} (stand-in)", "formatted_address": "Shanghai Disney Resort, Pudong",
+             "location": LOCATION, "place_id": "stand-in-place", "rating": 4.5, "types": ["point_of_interest"]}
+        ]})
+
+    @server.tool()
+    async def maps_distance_matrix(origins: list[str], destinations: list[str], mode: str = "driving") -> str:
+        """Calculate travel distance and time for multiple origins and destinations"""
+        return await reply({
+            "origin_addresses": origins,
+            "destination_addresses": destinations,
+            "results": [{"elements": [{"status": "OK", "duration": {"text": "45 mins", "value": 2700},
+                                       "distance": {"text": "30.2 km", "value": 30200}}
+                                      for _ in destinations]} for _ in origins],
+        })
+
+    @server.tool()
+    async def maps_directions(origin: str, destination: str, mode: str = "driving") -> str:
+        """Get directions between two points"""
+        return await reply({"routes": [{
+            "summary": "S1 Yingbin Expressway",
+            "distance": {"text": "30.2 km", "value": 30200},
+            "duration": {"text": "45 mins", "value": 2700},
+            "steps": [
+                {"instructions": f"Head east from {origin}", "distance": {"text": "2.1 km", "value": 2100},
+                 "duration": {"text": "6 mins", "value": 360}, "travel_mode": mode.upper()},
+                {"instructions": f"Continue on S1 to {destination}", "distance": {"text": "28.1 km", "value": 28100},
+                 "duration": {"text": "39 mins", "value": 2340}, "travel_mode": mode.upper()},
+            ],
+        }]})
+
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Google Maps MCP stand-in")
+    parser.add_argument("--transport", default="stdio", choices=["stdio", "sse", "streamable-http"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=LOADTEST_MAPS_MCP_PORT)
+    args = parser.parse_args(argv)
+    create_server(args.host, args.port).run(transport=args.transport)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Stand-in Ollama and DashScope servers for offline load testing.
+
+They speak enough of both HTTP APIs for the backend to run unchanged:
+- Ollama: /api/chat (streaming and not), /api/generate, /api/tags, /api/version
+- DashScope: /api/v1/services/aigc/text-generation/generation (SSE and not), for
+  the Qwen agent's function calls and SQLTool's text-to-SQL prompt
+
+Point the backend at them with
+    OLLAMA_HOST=http://127.0.0.1:11435
+    DASHSCOPE_HTTP_BASE_URL=http://127.0.0.1:8090/api/v1
+Latency follows the LOADTEST_* profile settings in bot/config.py.
+"""
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from ..config import (
+    LOADTEST_OLLAMA_PROMPT_TOKENS_PER_S, LOADTEST_OLLAMA_TOKENS_PER_S, LOADTEST_OLLAMA_COMPLETION_TOKENS,
+    LOADTEST_OLLAMA_PARALLEL, LOADTEST_DASHSCOPE_TTFT_MS, LOADTEST_DASHSCOPE_TOKENS_PER_S,
+    LOADTEST_DASHSCOPE_TOOL, LOADTEST_WEATHER_LOCATION
+)
+from ..core.context_packer import estimate_tokens
+
+ANSWER_TEXT = ("This is a simulated answer from the load-test stand-in. The park opens at nine, "
+               "tickets are available online and at the gate, and the parade starts at seven in the evening. ")
+SQL_TEXT = "```sql\nSELECT COUNT(*) AS visitors FROM visit_flow WHERE visit_date = CURRENT_DATE;\n```"
+
+# Keyword rules for LOADTEST_DASHSCOPE_TOOL=auto
+AUTO_TOOL_KEYWORDS = [
+    ("get_weather", ["weather", "rain", "temperature", "天气"]),
+    ("text_to_sql", ["how many", "visitors", "count", "多少"]),
+    ("google-maps-maps_directions", ["directions", "route", "get to", "路线"]),
+]
+
+
+def _words(text, count):
+    """First count words of text, repeated as needed, each with its trailing space"""
+    words = text.split()
+    return [words[i % len(words)] + " " for i in range(max(1, count))]
+
+
+def _chunks(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# --- Ollama ---
+
+ollama_app = FastAPI(title="Ollama stand-in")
+_ollama_slots = {}
+
+
+def _ollama_slot():
+    # Created lazily inside the server's event loop; like Ollama, generations beyond the limit queue
+    loop = asyncio.get_running_loop()
+    if loop not in _ollama_slots:
+        _ollama_slots[loop] = asyncio.Semaphore(max(1, LOADTEST_OLLAMA_PARALLEL))
+    return _ollama_slots[loop]
+
+
+def _ollama_stats(prompt_tokens, completion_tokens, prompt_seconds, eval_seconds):
+    return {
+        "done": True,
+        "done_reason": "stop",
+        "total_duration": int((prompt_seconds + eval_seconds) * 1e9),
+        "load_duration": 0,
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": int(prompt_seconds * 1e9),
+        "eval_count": completion_tokens,
+        "eval_duration": int(eval_seconds * 1e9),
+    }
+
+
+async def _ollama_generate(prompt_text, on_token=None):
+    """
+    Simulate prompt evaluation and token generation
+    :return: (answer, stats)
+    """
+    prompt_tokens = estimate_tokens(prompt_text)
+    tokens = _words(ANSWER_TEXT, LOADTEST_OLLAMA_COMPLETION_TOKENS)
+    async with _ollama_slot():
+        prompt_seconds = prompt_tokens / LOADTEST_OLLAMA_PROMPT_TOKENS_PER_S
+        await asyncio.sleep(prompt_seconds)
+        start = time.perf_counter()
+        for token in tokens:
+            await asyncio.sleep(1.0 / LOADTEST_OLLAMA_TOKENS_PER_S)
+            if on_token is not None:
+                await on_token(token)
+        eval_seconds = time.perf_counter() - start
+    return "".join(tokens), _ollama_stats(prompt_tokens, len(tokens), prompt_seconds, eval_seconds)
+
+
+@ollama_app.post("/api/chat")
+async def ollama_chat(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    prompt_text = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+
+    if not body.get("stream", True):
+        answer, stats = await _ollama_generate(prompt_text)
+        return {"model": model, "created_at": _now(),
+                "message": {"role": "assistant", "content": answer}, **stats}
+
+    async def stream():
+        queue = asyncio.Queue()
+
+        async def on_token(token):
+            await queue.put({"model": model, "created_at": _now(),
+                             "message": {"role": "assistant", "content": token}, "done": False})
+
+        async def produce():
+            _, stats = await _ollama_generate(prompt_text, on_token)
+            await queue.put({"model": model, "created_at": _now(),
+                             "message": {"role": "assistant", "content": ""}, **stats})
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                chunk = await queue.get()
+                yield json.dumps(chunk) + "\n"
+                if chunk["done"]:
+                    break
+        finally:
+            producer.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@ollama_app.post("/api/generate")
+async def ollama_generate(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    if not body.get("prompt"):
+        # An empty prompt only loads the model
+        return {"model": model, "created_at": _now(), "response": "", "done": True, "done_reason": "load"}
+    answer, stats = await _ollama_generate(body["prompt"])
+    return {"model": model, "created_at": _now(), "response": answer, **stats}
+
+
+@ollama_app.get("/api/tags")
+def ollama_tags():
+    from ..config import OLLAMA_MODEL
+    return {"models": [{"name": OLLAMA_MODEL, "model": OLLAMA_MODEL, "modified_at": _now(),
+                        "size": 0, "digest": "stand-in", "details": {}}]}
+
+
+@ollama_app.get("/api/version")
+def ollama_version():
+    return {"version": "0.0.0-stand-in"}
+
+
+# --- DashScope ---
+
+dashscope_app = FastAPI(title="DashScope stand-in")
+
+
+def _content_text(content):
+    if isinstance(content, list):
+        return " ".join(str(item.get("text", "")) for item in content if isinstance(item, dict))
+    return str(content or "")
+
+
+def _pick_tools(user_text, available=None, parallel=False):
+    """Tools to call; with parallel function calls, auto mode calls every tool whose keywords match"""
+    tool = LOADTEST_DASHSCOPE_TOOL
+    if tool == "none":
+        return []
+    if tool == "auto":
+        lowered = user_text.lower()
+        tools = [name for name, keywords in AUTO_TOOL_KEYWORDS if any(keyword in lowered for keyword in keywords)]
+        tools = (tools if parallel else tools[:1]) or ["search_knowledge_base"]
+    else:
+        tools = [tool]
+    if available:
+        tools = [tool if tool in available else available[0] for tool in tools]
+    return list(dict.fromkeys(tools))
+
+
+def _tool_arguments(tool, user_text):
+    if tool == "get_weather":
+        return {"location": LOADTEST_WEATHER_LOCATION}
+    if tool == "google-maps-maps_directions":
+        return {"origin": LOADTEST_WEATHER_LOCATION, "destination": "Shanghai Disneyland", "mode": "driving"}
+    return {"query": user_text}
+
+
+def _dashscope_reply(body):
+    """
+    What the model "generates": function calls for agent turns, a closing answer
+    once a tool result is in the conversation, SQL for text-to-SQL prompts.
+    Function calls are native tool_calls when the request lists tools (qwen-agent's
+    raw API mode) and <tool_call> text otherwise (its prompt-based mode).
+    :return: (text, list of tool call dicts, uses message format)
+    """
+    data = body.get("input", {})
+    messages = data.get("messages")
+    if not messages:
+        return SQL_TEXT if "sql" in str(data.get("prompt", "")).lower() else ANSWER_TEXT, [], False
+
+    last_text = _content_text(messages[-1].get("content"))
+    if messages[-1].get("role") in ("function", "tool") or "<tool_response>" in last_text:
+        return ANSWER_TEXT.split(". ")[0] + ".", [], True
+
+    parameters = body.get("parameters", {})
+    available = [tool.get("function", tool).get("name") for tool in parameters.get("tools") or []]
+    parallel = bool(parameters.get("parallel_tool_calls") or parameters.get("parallel_function_calls"))
+    user_text = next((_content_text(m.get("content")) for m in reversed(messages) if m.get("role") == "user"), "")
+    tools = _pick_tools(user_text, available, parallel)
+    if not tools:
+        return ANSWER_TEXT, [], True
+    if available:
+        return "", [{"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                     "function": {"name": tool,
+                                  "arguments": json.dumps(_tool_arguments(tool, user_text), ensure_ascii=False)}}
+                    for tool in tools], True
+    calls = [json.dumps({"name": tool, "arguments": _tool_arguments(tool, user_text)}, ensure_ascii=False)
+             for tool in tools]
+    return "\n".join(f"<tool_call>\n{call}\n</tool_call>" for call in calls), [], True
+
+
+def _dashscope_output(text, message_format, finish_reason, tool_calls=None):
+    if message_format:
+        message = {"role": "assistant", "content": text}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return {"choices": [{"finish_reason": finish_reason, "message": message}]}
+    return {"text": text, "finish_reason": finish_reason}
+
+
+@dashscope_app.post("/api/v1/services/aigc/text-generation/generation")
+async def dashscope_generation(request: Request):
+    body = await request.json()
+    parameters = body.get("parameters", {})
+    text, tool_calls, message_format = _dashscope_reply(body)
+    message_format = message_format or parameters.get("result_format") == "message"
+    prompt_tokens = estimate_tokens(json.dumps(body.get("input", {}), ensure_ascii=False))
+    pieces = _chunks(text)
+    finish_reason = "tool_calls" if tool_calls else "stop"
+    usage = {"input_tokens": prompt_tokens, "output_tokens": len(pieces), "total_tokens": prompt_tokens + len(pieces)}
+    request_id = str(uuid.uuid4())
+    stream = request.headers.get("X-DashScope-SSE") == "enable" or "text/event-stream" in request.headers.get("Accept", "")
+
+    if not stream:
+        await asyncio.sleep(LOADTEST_DASHSCOPE_TTFT_MS / 1000 + len(pieces) / LOADTEST_DASHSCOPE_TOKENS_PER_S)
+        output = _dashscope_output(text, message_format, finish_reason, tool_calls)
+        return {"output": output, "usage": usage, "request_id": request_id}
+
+    incremental = parameters.get("incremental_output", False)
+
+    async def events():
+        await asyncio.sleep(LOADTEST_DASHSCOPE_TTFT_MS / 1000)
+        sent = ""
+        for index, piece in enumerate(pieces, start=1):
+            if index > 1:
+                await asyncio.sleep(1.0 / LOADTEST_DASHSCOPE_TOKENS_PER_S)
+            sent += piece
+            last = index == len(pieces)
+            output = _dashscope_output(
+                piece if incremental else sent, message_format, finish_reason if last else "null",
+                # Tool calls are sent whole in the final chunk
+                tool_calls if last else None
+            )
+            payload = {"output": output, "usage": usage, "request_id": request_id}
+            yield f"id:{index}\nevent:result\n:HTTP_STATUS/200\ndata:{json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
@@ -1,6 +1,13 @@
+import json
+from typing import List, Optional
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from ..api_service import initialize_backend_components, handle_chat_query, reload_knowledge_base
+from ..api_service import (
+    initialize_backend_components, handle_chat_query, handle_chat_query_stream, handle_batch_query, reload_knowledge_base,
+    start_warm_up, get_readiness, is_ready, get_cache_stats, get_retrieval_stats,
+    get_llm_call_metrics, get_routing_stats, get_tool_stats
+)
 
 app = FastAPI()
 
@@ -10,6 +17,8 @@ def startup_event():
     print("🚀 Initializing backend components (only once at startup)...")
     initialize_backend_components()
     print("✅ Backend initialization complete!")
+    # Load and exercise the models before the first /ask, progress is reported by /ready
+    start_warm_up()
 
 class QueryRequest(BaseModel):
     query: str
@@ -20,6 +29,29 @@ def ask(request: QueryRequest):
     response = handle_chat_query(request.query)
     return response
 
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    max_concurrency: Optional[int] = None
+    knowledge_base_only: bool = False
+
+@app.post("/ask_batch")
+def ask_batch(request: BatchQueryRequest):
+    # Per-item results in request order
+    return handle_batch_query(request.queries, request.max_concurrency, request.knowledge_base_only)
+
+@app.post("/ask/stream")
+def ask_stream(request: QueryRequest):
+    # Server-sent events: tool choice, sources, answer tokens, then done (or error)
+    def event_stream():
+        for event in handle_chat_query_stream(request.query):
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/reload_kb")
 def reload_kb():
     # Reload knowledge base
@@ -29,3 +61,30 @@ def reload_kb():
 @app.get("/status")
 def status():
     return {"status": "ok", "message": "Backend is running"}
+
+@app.get("/ready")
+def ready():
+    readiness = get_readiness()
+    if is_ready(readiness):
+        return readiness
+    return JSONResponse(status_code=503, content=readiness)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return get_cache_stats()
+
+@app.get("/retrieval/stats")
+def retrieval_stats():
+    return get_retrieval_stats()
+
+@app.get("/routing/stats")
+def routing_stats():
+    return get_routing_stats()
+
+@app.get("/tools/stats")
+def tool_stats():
+    return get_tool_stats()
+
+@app.get("/metrics/llm")
+def llm_metrics():
+    return get_llm_call_metrics()
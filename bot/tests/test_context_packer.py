@@ -0,0 +1,40 @@
+from ..core.context_packer import estimate_tokens, truncate_to_tokens, pack_context
+
+
+def _item(doc_id, content, score):
+    return {"id": doc_id, "content": content, "source": "guide.pdf", "type": "text", "score": score}
+
+
+def test_estimate_tokens_counts_cjk_characters():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("门票价格") == 4
+    assert estimate_tokens("abcdefgh") == 2
+
+
+def test_truncate_respects_token_limit():
+    text = "The park opens at nine. " * 50
+    truncated = truncate_to_tokens(text, 40)
+    assert estimate_tokens(truncated) <= 45
+    assert truncated.endswith("...")
+
+
+def test_pack_orders_by_score_and_drops_duplicates():
+    items = [
+        _item(1, "Parking is free for hotel guests staying two nights.", 0.4),
+        _item(2, "Adult tickets cost 475 yuan on weekends and holidays.", 0.9),
+        _item(3, "Adult tickets cost 475 yuan on weekends and holidays.", 0.8),
+    ]
+    packed, stats = pack_context(items, budget=500, max_chunk_tokens=100)
+    assert [item["id"] for item in packed] == [2, 1]
+    assert stats["duplicates"] == 1
+
+
+def test_pack_fits_budget():
+    items = [_item(i, " ".join(f"zone{i}rule{j}" for j in range(100)), 1.0 - i / 10) for i in range(5)]
+    packed, stats = pack_context(items, budget=300, max_chunk_tokens=200)
+    assert stats["context_tokens"] <= 300
+    assert sum(estimate_tokens(item["content"]) for item in packed) == stats["context_tokens"]
+    assert stats["duplicates"] == 0
+    assert stats["truncated"] >= 1
+    assert stats["packed"] < len(items)
+    assert packed[0]["id"] == 0
@@ -0,0 +1,36 @@
+import os
+import pytest
+from ..core.directory_scanner import ScanManifest, scan_directory
+
+
+@pytest.fixture
+def docs(tmp_path):
+    (tmp_path / "policies" / "2024").mkdir(parents=True)
+    (tmp_path / "tickets.docx").write_bytes(b"")
+    (tmp_path / "policies" / "safety.pdf").write_bytes(b"")
+    (tmp_path / "policies" / "2024" / "hours.txt").write_text("", encoding="utf-8")
+    (tmp_path / "policies" / ".hidden.txt").write_text("", encoding="utf-8")
+    (tmp_path / "policies" / "logo.png").write_bytes(b"")
+    return tmp_path
+
+
+def test_scan_filters_extensions_and_hidden_files(docs):
+    found = {os.path.relpath(p, docs) for p in scan_directory(str(docs), ['docx', '.PDF', '.txt'])}
+    assert found == {"tickets.docx", os.path.join("policies", "safety.pdf"), os.path.join("policies", "2024", "hours.txt")}
+
+
+def test_unchanged_directories_are_pruned(docs, tmp_path_factory):
+    manifest = ScanManifest(str(tmp_path_factory.mktemp("data") / "scan_manifest.json"))
+    exts = ['.docx', '.pdf', '.txt']
+    assert len(list(scan_directory(str(docs), exts, manifest))) == 3
+    manifest.save()
+
+    reloaded = ScanManifest(manifest.path)
+    assert list(scan_directory(str(docs), exts, reloaded)) == []
+
+    # A new file deep in the tree is found although its parents did not change;
+    # only the changed directory is listed again
+    new_file = docs / "policies" / "2024" / "parade.txt"
+    new_file.write_text("", encoding="utf-8")
+    rescanned = list(scan_directory(str(docs), exts, reloaded))
+    assert sorted(rescanned) == sorted([str(new_file), str(docs / "policies" / "2024" / "hours.txt")])
@@ -0,0 +1,101 @@
+import sys
+
+import pytest
+
+from ..core import document_parser
+from ..core.document_parser import parse_pdf, iter_pdf_pages
+
+BACKENDS = ["pypdfium2", "pdfminer", "pypdf2"]
+BACKEND_MODULES = {"pypdfium2": "pypdfium2", "pdfminer": "pdfminer", "pypdf2": "PyPDF2"}
+
+
+def _write_pdf(path, page_texts):
+    """Minimal PDF with one line of Helvetica text per page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+    return str(path)
+
+
+PAGES = [f"Page {n} of the park guide" for n in range(1, 6)]
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    return _write_pdf(tmp_path / "guide.pdf", PAGES)
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    pytest.importorskip(BACKEND_MODULES[request.param])
+    return request.param
+
+
+def test_chunks_carry_real_page_numbers(pdf, backend):
+    errors = []
+    chunks = list(parse_pdf(pdf, backend, errors))
+    assert [chunk["page"] for chunk in chunks] == [1, 2, 3, 4, 5]
+    assert [chunk["content"] for chunk in chunks] == PAGES
+    assert errors == []
+
+
+def test_parallel_page_ranges_keep_page_order(pdf, backend, monkeypatch):
+    pages = list(iter_pdf_pages(pdf, backend, workers=2, pages_per_task=2))
+    assert [page_no for page_no, _ in pages] == [1, 2, 3, 4, 5]
+    assert [text.strip() for _, text in pages] == PAGES
+    # parse_pdf picks the worker settings up from the configuration
+    monkeypatch.setattr(document_parser, "PDF_PARALLEL_WORKERS", 3)
+    monkeypatch.setattr(document_parser, "PDF_PAGES_PER_TASK", 1)
+    assert [chunk["page"] for chunk in parse_pdf(pdf, backend)] == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.parametrize("failing", ["pypdfium2", "pdfminer"])
+def test_failing_backend_falls_back_for_remaining_pages(pdf, failing, monkeypatch):
+    original = document_parser._iter_page_range
+
+    def fails_after_two_pages(file_path, backend, start=0, end=None):
+        for page in original(file_path, backend, start, end):
+            if backend == failing and page[0] == 3:
+                raise RuntimeError(f"{failing} choked on page 3")
+            yield page
+
+    monkeypatch.setattr(document_parser, "_iter_page_range", fails_after_two_pages)
+    errors = []
+    chunks = list(parse_pdf(pdf, failing, errors))
+    # Pages 1-2 from the backend, 3-5 from PyPDF2, nothing repeated
+    assert [chunk["page"] for chunk in chunks] == [1, 2, 3, 4, 5]
+    assert errors == []
+
+
+def test_missing_backend_falls_back(pdf, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pypdfium2", None)
+    errors = []
+    assert [chunk["page"] for chunk in parse_pdf(pdf, "pypdfium2", errors)] == [1, 2, 3, 4, 5]
+    assert errors == []
+
+
+def test_unreadable_pdf_is_reported(tmp_path, backend):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.4\nthis is not a pdf")
+    errors = []
+    assert list(parse_pdf(str(broken), backend, errors)) == []
+    assert len(errors) == 1
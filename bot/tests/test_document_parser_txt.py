@@ -0,0 +1,34 @@
+import pytest
+from ..core.document_parser import parse_txt, detect_text_encoding
+
+
+def _contents(path):
+    return [chunk["content"] for chunk in parse_txt(str(path))]
+
+
+def test_utf8_paragraphs(tmp_path):
+    doc = tmp_path / "notes.txt"
+    doc.write_text("门票规则\n第一段\n\n\n开放时间\r\n\r\n  ", encoding="utf-8")
+    assert _contents(doc) == ["门票规则\n第一段", "开放时间"]
+
+
+@pytest.mark.parametrize("encoding", ["gbk", "utf-8-sig", "utf-16"])
+def test_detected_encodings(tmp_path, encoding):
+    doc = tmp_path / "export.txt"
+    doc.write_text("上海迪士尼乐园\n\n烟花表演时间", encoding=encoding)
+    assert _contents(doc) == ["上海迪士尼乐园", "烟花表演时间"]
+
+
+def test_gbk_after_ascii_prefix(tmp_path):
+    doc = tmp_path / "ticket_log.txt"
+    doc.write_bytes(("ticket 1 ok\n" * 100 + "\n" + "排队时间过长\n").encode("gbk"))
+    chunks = _contents(doc)
+    assert chunks[-1] == "排队时间过长"
+
+
+def test_detect_text_encoding():
+    assert detect_text_encoding(b"plain ascii") is None
+    assert detect_text_encoding("乐园".encode("utf-8")) == "utf-8"
+    assert detect_text_encoding("乐园".encode("gbk")) == "gb18030"
+    # A multi-byte character cut at the end of the prefix is still UTF-8
+    assert detect_text_encoding("乐园".encode("utf-8")[:-1]) == "utf-8"
@@ -0,0 +1,66 @@
+import re
+
+import numpy as np
+from ..core.intent_router import IntentRouter
+
+VOCABULARY = ["ticket", "open", "visitors", "month", "rain", "weather", "route", "airport"]
+
+
+class BagOfWordsEmbedder:
+    """Normalized keyword counts, standing in for the text embedding model"""
+    def _embed(self, text):
+        words = re.findall(r"[a-z]+", text.lower())
+        vector = np.array([float(sum(w.startswith(v) for w in words)) for v in VOCABULARY] + [0.1], dtype="float32")
+        return vector / np.linalg.norm(vector)
+
+    def get_text_embeddings_offline(self, texts):
+        return np.stack([self._embed(text) for text in texts])
+
+    def get_query_embedding(self, text):
+        return self._embed(text)
+
+
+EXEMPLARS = {
+    "search_knowledge_base": ["ticket price", "when does the park open"],
+    "text_to_sql": ["visitors per month", "how many visitors"],
+    "get_weather": ["will it rain", "weather tomorrow"],
+    "google-maps": ["route from the airport"],
+}
+
+
+def _router(**kwargs):
+    return IntentRouter(BagOfWordsEmbedder(), exemplars=EXEMPLARS, **kwargs)
+
+
+def test_confident_query_is_routed_directly():
+    router = _router(threshold=0.5, margin=0.1)
+    assert router.route("How many visitors came last month?") == "text_to_sql"
+    assert router.route("How much is a ticket?") == "search_knowledge_base"
+    assert router.stats()["direct"] == {"text_to_sql": 1, "search_knowledge_base": 1}
+
+
+def test_tools_needing_arguments_fall_back_to_agent():
+    router = _router(threshold=0.5, margin=0.1)
+    tool, score, _ = router.classify("Will it rain at the park?")
+    assert tool == "get_weather" and score > 0.5
+    assert router.route("Will it rain at the park?") is None
+    assert router.stats()["agent_fallbacks"]["needs_arguments"] == 1
+
+
+def test_ambiguous_query_falls_back_to_agent():
+    router = _router(threshold=0.5, margin=0.1)
+    # Equally close to the knowledge base and the SQL exemplars
+    assert router.route("ticket visitors") is None
+    assert router.route("something unrelated") is None
+    stats = router.stats()
+    assert stats["agent_fallbacks"]["low_confidence"] == 2
+    assert stats["direct_rate"] == 0.0
+
+
+def test_chinese_queries_go_to_agent_by_default():
+    router = _router(threshold=0.5, margin=0.1)
+    assert not router.supports("乐园几点开门？")
+    assert router.decide("乐园几点开门？") == (None, None)
+    assert router.stats()["agent_fallbacks"]["unsupported_language"] == 1
+    # Opt-in for a multilingual text model
+    assert _router(route_cjk=True).supports("乐园几点开门？")
@@ -0,0 +1,109 @@
+import json
+
+import faiss
+import numpy as np
+
+from ..core import knowledge_base
+from ..core.knowledge_base import (
+    KnowledgeBaseManager, index_legacy_image_text, build_vector_index, projection_recall_report
+)
+
+DIM = 4
+
+
+def _embed(texts):
+    # One axis per keyword, enough to tell the test entries apart
+    vectors = np.array([[float(word in text.lower()) for word in ("parade", "castle", "ticket")] + [0.1]
+                        for text in texts], dtype="float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _legacy_kb():
+    metadata = [
+        {"id": 0, "type": "text", "source": "guide.txt", "content": "Tickets are sold at the gate."},
+        {"id": 1, "type": "image", "source": "Image: parade.png", "path": "/nowhere/parade.png", "ocr": "Parade 8pm"},
+        {"id": 2, "type": "image", "source": "Image: blank.png", "path": "/nowhere/blank.png", "ocr": ""},
+    ]
+    index = faiss.IndexIDMap(faiss.IndexFlatIP(DIM))
+    index.add_with_ids(_embed([metadata[0]["content"]]), np.array([0], dtype="int64"))
+    return metadata, index
+
+
+def test_legacy_image_text_is_indexed_once():
+    metadata, index = _legacy_kb()
+    assert index_legacy_image_text(metadata, index, _embed) == (2, 1)
+    assert index.ntotal == 2
+    assert metadata[1]["text_indexed"] and not metadata[2]["text_indexed"]
+    _, ids = index.search(_embed(["when is the parade"]), 1)
+    assert ids[0][0] == 1
+    # Already upgraded
+    assert index_legacy_image_text(metadata, index, _embed) == (0, 0)
+    assert index.ntotal == 2
+
+
+def test_loading_an_old_knowledge_base_upgrades_it(tmp_path, monkeypatch):
+    metadata, index = _legacy_kb()
+    paths = {name: str(tmp_path / name) for name in ("text.index", "image.index", "metadata.json")}
+    faiss.write_index(index, paths["text.index"])
+    faiss.write_index(faiss.IndexIDMap(faiss.IndexFlatIP(DIM)), paths["image.index"])
+    with open(paths["metadata.json"], "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    monkeypatch.setattr(knowledge_base, "TEXT_FAISS_FILE", paths["text.index"])
+    monkeypatch.setattr(knowledge_base, "IMAGE_FAISS_FILE", paths["image.index"])
+    monkeypatch.setattr(knowledge_base, "METADATA_FILE", paths["metadata.json"])
+
+    class FakeEmbeddingHandler:
+        get_text_embeddings_offline = staticmethod(_embed)
+
+    manager = KnowledgeBaseManager.__new__(KnowledgeBaseManager)
+    manager.embedding_handler = FakeEmbeddingHandler()
+    _, text_index, _ = manager.load_existing_knowledge_base()
+    assert text_index.ntotal == 2
+    # The upgrade is saved, the next load has nothing left to do
+    assert faiss.read_index(paths["text.index"]).ntotal == 2
+    with open(paths["metadata.json"], encoding="utf-8") as f:
+        assert json.load(f)[1]["text_indexed"] is True
+
+
+def _random_vectors(count, dim, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_projected_index_survives_save_and_load(tmp_path):
+    vectors = _random_vectors(200, 32)
+    ids = np.arange(1000, 1200)
+    index = build_vector_index(vectors, ids, 32, pca_dim=8)
+    assert isinstance(index, faiss.IndexPreTransform)
+    assert index.ntotal == 200
+    path = str(tmp_path / "text.index")
+    faiss.write_index(index, path)
+    loaded = faiss.read_index(path)
+    # Full-dimension queries are projected by the saved transform, hits carry the document ids
+    _, expected = index.search(vectors[:5], 3)
+    _, found = loaded.search(vectors[:5], 3)
+    assert (found == expected).all()
+    assert found[:, 0].tolist() == ids[:5].tolist()
+    # Incremental additions go through the same projection
+    loaded.add_with_ids(_random_vectors(1, 32, seed=1), np.array([5000], dtype="int64"))
+    assert loaded.search(_random_vectors(1, 32, seed=1), 1)[1][0][0] == 5000
+
+
+def test_too_few_vectors_keep_full_dimensions():
+    index = build_vector_index(_random_vectors(5, 32), [7, 8, 9, 10, 11], 32, pca_dim=8)
+    assert isinstance(index, faiss.IndexIDMap)
+    assert index.d == 32
+    assert index.search(_random_vectors(5, 32)[:1], 1)[1][0][0] == 7
+    assert build_vector_index([], [], 32, pca_dim=8).ntotal == 0
+
+
+def test_recall_report_ignores_the_query_itself():
+    vectors = _random_vectors(300, 32)
+    ids = np.arange(300)
+    # Exact search as the "projection" has perfect recall
+    assert projection_recall_report(vectors, ids, build_vector_index(vectors, ids, 32), k=5)["recall"] == 1.0
+    # A 2-d projection of random vectors loses most neighbours; with the self-match counted
+    # recall@1 would be 1.0 whatever the projection
+    report = projection_recall_report(vectors, ids, build_vector_index(vectors, ids, 32, pca_dim=2), k=1)
+    assert report["projected_dim"] == 2
+    assert report["recall"] < 0.5
@@ -0,0 +1,95 @@
+import json
+import threading
+
+import pytest
+from ..core import llm_metrics
+from ..core.llm_metrics import Histogram, llm_call, request_trace, RequestTrace, traced_iter, get_llm_metrics
+from ..tools.knowledge_base_tool import RAGTool
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = Histogram([10, 100])
+    for value in [5, 50, 50, 500]:
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 4
+    assert snapshot["buckets"] == {"le_10": 1, "le_100": 2, "le_inf": 1}
+    assert snapshot["p50"] == 50
+    assert snapshot["p99"] == 500
+
+
+def test_llm_call_is_aggregated_per_caller():
+    with llm_call("ollama", "test-model", "caller_a") as record:
+        record.first_token()
+        record.set_tokens(120, 30)
+    with pytest.raises(RuntimeError):
+        with llm_call("ollama", "test-model", "caller_a"):
+            raise RuntimeError("boom")
+
+    metrics = get_llm_metrics()["ollama/test-model/caller_a"]
+    assert metrics["wall_ms"]["count"] == 2
+    assert metrics["ttft_ms"]["count"] == 1
+    assert metrics["prompt_tokens"]["count"] == 1
+    assert metrics["errors"] == 1
+
+
+def test_request_trace_is_written_as_json_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_metrics, "LLM_TRACE_DIR", str(tmp_path))
+    monkeypatch.setattr(llm_metrics, "LLM_TRACE_ENABLED", True)
+
+    with request_trace("When does the park open?") as trace:
+        with llm_call("dashscope", "qwen-turbo", "router"):
+            pass
+        with llm_call("ollama", "test-model", "search_knowledge_base") as record:
+            record.set_tokens(200, 40)
+    # Calls outside the trace are not recorded in it
+    with llm_call("ollama", "test-model", "other"):
+        pass
+
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1
+    entry = json.loads(files[0].read_text(encoding="utf-8").strip())
+    assert entry["request_id"] == trace.request_id
+    assert [call["caller"] for call in entry["calls"]] == ["router", "search_knowledge_base"]
+    assert entry["calls"][1]["prompt_tokens"] == 200
+
+
+def test_traced_iter_keeps_trace_across_threads(monkeypatch):
+    monkeypatch.setattr(llm_metrics, "LLM_TRACE_ENABLED", False)
+
+    def events():
+        for i in range(3):
+            with llm_call("ollama", "test-model", "stream"):
+                pass
+            yield i
+
+    trace = RequestTrace("query", "ask_stream")
+    iterator = traced_iter(events(), trace)
+    # Each step runs on a different thread, like a streaming response
+    for _ in range(3):
+        thread = threading.Thread(target=next, args=(iterator,))
+        thread.start()
+        thread.join()
+
+    assert len(trace.finish()["calls"]) == 3
+
+
+def test_knowledge_base_batch_traces_each_query(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_metrics, "LLM_TRACE_DIR", str(tmp_path))
+    monkeypatch.setattr(llm_metrics, "LLM_TRACE_ENABLED", True)
+    queries = ["When does the park open?", "Where is the castle?", "Is there a parade?"]
+    tool = RAGTool.__new__(RAGTool)
+    tool.retrieve_batch = lambda batch, k: ([[] for _ in batch], [None for _ in batch])
+
+    def answer(query, context, query_vec):
+        with llm_call("ollama", "test-model", "search_knowledge_base"):
+            return {"success": True, "answer": query}
+
+    tool.answer = answer
+    outputs = tool.answer_batch(queries, max_concurrency=3, trace_kind="ask_batch")
+    assert [output["answer"] for output in outputs] == queries
+
+    lines = next(tmp_path.iterdir()).read_text(encoding="utf-8").splitlines()
+    entries = [json.loads(line) for line in lines]
+    assert sorted(entry["query"] for entry in entries) == sorted(queries)
+    assert all(entry["kind"] == "ask_batch" and len(entry["calls"]) == 1 for entry in entries)
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ..loadtest import stand_ins
+from ..loadtest.stand_ins import ollama_app, dashscope_app
+
+GENERATION_PATH = "/api/v1/services/aigc/text-generation/generation"
+
+
+@pytest.fixture(autouse=True)
+def fast_profile(monkeypatch):
+    monkeypatch.setattr(stand_ins, "LOADTEST_OLLAMA_TOKENS_PER_S", 10000.0)
+    monkeypatch.setattr(stand_ins, "LOADTEST_OLLAMA_PROMPT_TOKENS_PER_S", 100000.0)
+    monkeypatch.setattr(stand_ins, "LOADTEST_OLLAMA_COMPLETION_TOKENS", 5)
+    monkeypatch.setattr(stand_ins, "LOADTEST_DASHSCOPE_TTFT_MS", 0.0)
+    monkeypatch.setattr(stand_ins, "LOADTEST_DASHSCOPE_TOKENS_PER_S", 10000.0)
+
+
+def test_ollama_chat_streams_ndjson_and_reports_counts():
+    client = TestClient(ollama_app)
+    body = {"model": "llama3.2:3b", "messages": [{"role": "user", "content": "When does the park open?"}]}
+    with client.stream("POST", "/api/chat", json=body) as response:
+        chunks = [json.loads(line) for line in response.iter_lines() if line]
+    assert [chunk["done"] for chunk in chunks] == [False] * 5 + [True]
+    assert chunks[-1]["eval_count"] == 5
+    assert chunks[-1]["prompt_eval_count"] > 0
+
+    reply = client.post("/api/chat", json=dict(body, stream=False)).json()
+    assert reply["done"] and reply["message"]["content"]
+
+
+def test_dashscope_returns_native_tool_call_when_tools_are_listed():
+    client = TestClient(dashscope_app)
+    body = {
+        "model": "qwen-turbo",
+        "input": {"messages": [{"role": "user", "content": "Is there a parade tonight?"}]},
+        "parameters": {"result_format": "message",
+                       "tools": [{"type": "function", "function": {"name": "search_knowledge_base"}}]},
+    }
+    message = client.post(GENERATION_PATH, json=body).json()["output"]["choices"][0]["message"]
+    call = message["tool_calls"][0]["function"]
+    assert call["name"] == "search_knowledge_base"
+    assert json.loads(call["arguments"]) == {"query": "Is there a parade tonight?"}
+
+
+def test_dashscope_auto_mode_plans_parallel_tool_calls(monkeypatch):
+    monkeypatch.setattr(stand_ins, "LOADTEST_DASHSCOPE_TOOL", "auto")
+    client = TestClient(dashscope_app)
+    tools = [{"type": "function", "function": {"name": name}}
+             for name in ("get_weather", "text_to_sql", "search_knowledge_base")]
+    body = {
+        "model": "qwen-turbo",
+        "input": {"messages": [{"role": "user", "content": "Will it rain tomorrow and how many visitors came?"}]},
+        "parameters": {"result_format": "message", "tools": tools, "parallel_tool_calls": True},
+    }
+    message = client.post(GENERATION_PATH, json=body).json()["output"]["choices"][0]["message"]
+    assert [call["function"]["name"] for call in message["tool_calls"]] == ["get_weather", "text_to_sql"]
+
+    body["parameters"]["parallel_tool_calls"] = False
+    message = client.post(GENERATION_PATH, json=body).json()["output"]["choices"][0]["message"]
+    assert len(message["tool_calls"]) == 1
+
+
+def test_dashscope_sse_tool_call_text_and_sql_prompt():
+    client = TestClient(dashscope_app)
+    body = {"model": "qwen-turbo", "input": {"messages": [{"role": "user", "content": "Opening hours?"}]},
+            "parameters": {"result_format": "message", "incremental_output": True}}
+    with client.stream("POST", GENERATION_PATH, json=body, headers={"X-DashScope-SSE": "enable"}) as response:
+        payloads = [json.loads(line[len("data:"):]) for line in response.iter_lines() if line.startswith("data:")]
+    text = "".join(p["output"]["choices"][0]["message"]["content"] for p in payloads)
+    assert text.startswith("<tool_call>") and "search_knowledge_base" in text
+
+    sql = client.post(GENERATION_PATH, json={"model": "qwen-turbo", "input": {"prompt": "Write an SQL query"}}).json()
+    assert "SELECT" in sql["output"]["text"]
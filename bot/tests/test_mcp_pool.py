@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+from ..core.mcp_pool import MCPSessionPool, pooled_tools
+
+STAND_IN = os.path.join(os.path.dirname(__file__), os.pardir, "loadtest", "maps_mcp_stand_in.py")
+
+
+@pytest.fixture
+def pool():
+    # The standalone Google Maps stand-in, spawned over stdio like npx would be
+    pool = MCPSessionPool(
+        "google-maps",
+        command=sys.executable,
+        args=[STAND_IN],
+        env={"PYTHONPATH": os.pathsep.join(sys.path), "LOADTEST_MAPS_LATENCY_MS": "10"},
+        size=2
+    )
+    yield pool
+    pool.close()
+
+
+def test_pooled_tools_share_sessions(pool):
+    tools = {tool.name: tool for tool in pooled_tools(pool)}
+    assert "google-maps-maps_directions" in tools
+    for _ in range(3):
+        result = json.loads(tools["google-maps-maps_directions"].call('{"origin": "Airport", "destination": "Park"}'))
+        assert result["routes"][0]["steps"]
+    stats = pool.stats()
+    assert stats["connected"] == 2
+    assert stats["restarts"] == 0
+    assert stats["tools"]["maps_directions"]["latency_ms"]["count"] == 3
+
+
+def test_dead_session_is_restarted(pool):
+    pool.start()
+    # Close every session's transport behind the pool's back
+    for slot in pool._sessions:
+        asyncio.run_coroutine_threadsafe(pool._shutdown(slot), pool._loop).result(30)
+    assert pool.health_check() == 2
+    assert json.loads(pool.call_tool("maps_geocode", {"address": "Shanghai Disneyland"}))["location"]
+    assert pool.stats()["restarts"] == 2
@@ -0,0 +1,74 @@
+import threading
+import time
+import pytest
+from ..core.micro_batcher import MicroBatcher
+
+
+@pytest.fixture
+def batcher():
+    calls = []
+
+    def batch_fn(items):
+        calls.append(list(items))
+        time.sleep(0.005)  # Stands in for a forward pass, concurrent callers queue up meanwhile
+        return [item * 2 for item in items]
+
+    b = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=50)
+    b.calls = calls
+    return b
+
+
+def test_each_caller_gets_its_own_result(batcher):
+    results = {}
+
+    def worker(i):
+        results[i] = batcher(i)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: i * 2 for i in range(20)}
+    # Concurrent submissions are grouped, never above the size bound
+    assert len(batcher.calls) < 20
+    assert all(len(c) <= 8 for c in batcher.calls)
+
+
+def test_errors_reach_every_caller():
+    def failing(items):
+        raise ValueError("boom")
+
+    b = MicroBatcher(failing, max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        b("x")
+
+
+def test_short_results_fail_every_caller():
+    def short(items):
+        return [item * 2 for item in items][:-1]
+
+    b = MicroBatcher(short, max_batch_size=4, max_wait_ms=200)
+    futures = [b.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match="2 results for 3 items"):
+            future.result(timeout=5)
+
+
+def test_lone_item_does_not_wait_for_a_batch():
+    b = MicroBatcher(lambda items: [item * 2 for item in items], max_wait_ms=500)
+    start = time.perf_counter()
+    assert b(21) == 42
+    assert time.perf_counter() - start < 0.25
+
+
+def test_close_stops_the_worker():
+    b = MicroBatcher(lambda items: [item * 2 for item in items], max_wait_ms=1)
+    assert b(1) == 2
+    worker = b._worker
+    b.close()
+    assert not worker.is_alive()
+    # Late callers are served without the worker
+    assert b(3) == 6
+    assert b._worker is worker and not worker.is_alive()
@@ -0,0 +1,59 @@
+import asyncio
+
+import httpx
+import pytest
+
+from ..core import ollama_handler
+from ..core.single_flight import SingleFlight
+from ..core.ollama_handler import agenerate_local_answer, generate_local_answer, ERROR_PREFIX
+from ..loadtest import stand_ins
+from ..loadtest.stand_ins import ollama_app
+
+
+class CountingTransport(httpx.ASGITransport):
+    """Serves the stand-in Ollama app in-process and counts the requests it gets"""
+    requests = 0
+
+    async def handle_async_request(self, request):
+        CountingTransport.requests += 1
+        return await super().handle_async_request(request)
+
+
+@pytest.fixture(autouse=True)
+def stand_in_ollama(monkeypatch):
+    monkeypatch.setattr(stand_ins, "LOADTEST_OLLAMA_TOKENS_PER_S", 200.0)
+    monkeypatch.setattr(stand_ins, "LOADTEST_OLLAMA_COMPLETION_TOKENS", 5)
+    monkeypatch.setattr(ollama_handler, "OLLAMA_COALESCE_REQUESTS", True)
+    monkeypatch.setattr(ollama_handler, "_single_flight",
+                        SingleFlight(ttl_seconds=10, cacheable=ollama_handler._single_flight.cacheable))
+    kwargs = ollama_handler._client_kwargs()
+    monkeypatch.setattr(ollama_handler, "_client_kwargs",
+                        lambda: dict(kwargs, host="http://stand-in", transport=CountingTransport(app=ollama_app)))
+    CountingTransport.requests = 0
+
+
+def test_concurrent_identical_prompts_share_one_generation():
+    async def main():
+        return await asyncio.gather(*[agenerate_local_answer("Async: when does the park open?") for _ in range(4)])
+
+    answers = asyncio.run(main())
+    assert answers[0] and not answers[0].startswith(ERROR_PREFIX)
+    assert answers == [answers[0]] * 4
+    assert CountingTransport.requests == 1
+    # Sync callers share the same single-flight cache
+    assert generate_local_answer("Async: when does the park open?") == answers[0]
+    assert CountingTransport.requests == 1
+
+
+def test_async_generations_return_their_slots():
+    async def main():
+        return await asyncio.gather(*[agenerate_local_answer(f"Async slot test {i}") for i in range(3)])
+
+    assert all(not answer.startswith(ERROR_PREFIX) for answer in asyncio.run(main()))
+    assert CountingTransport.requests == 3
+    # Every slot was released: all of them can be taken again without blocking
+    slots = ollama_handler._generation_slots
+    taken = [slots.acquire(blocking=False) for _ in range(ollama_handler.OLLAMA_MAX_INFLIGHT)]
+    for _ in filter(None, taken):
+        slots.release()
+    assert all(taken)
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from ..core import onnx_encoder
+from ..core.onnx_encoder import _compare, _write_manifest, _resolve_quantized, _model_path, TEXT_MODEL_FILE
+
+REFERENCE = np.array([[1.0, 0.0, 0.0], [0.9, 0.1, 0.0], [0.0, 0.0, 1.0]], dtype="float32")
+
+
+def test_compare_passes_on_small_noise():
+    noisy = REFERENCE + np.random.default_rng(0).normal(0, 1e-3, REFERENCE.shape)
+    report = _compare(REFERENCE, noisy, min_cosine=0.99)
+    assert report["samples"] == 3
+    assert report["min_cosine"] > 0.99
+    assert report["top1_agreement"] == 1.0
+    assert report["passed"]
+
+
+def test_compare_fails_on_low_cosine_or_changed_neighbours():
+    rotated = REFERENCE.copy()
+    rotated[2] = [0.0, 1.0, 0.0]
+    assert not _compare(REFERENCE, rotated, min_cosine=0.99)["passed"]
+    # Every row stays close, but row 2's nearest neighbour flips from row 1 to row 0
+    swapped = REFERENCE.copy()
+    swapped[2] = [0.3, 0.0, 0.95]
+    reference = REFERENCE.copy()
+    reference[2] = [0.0, 0.3, 0.95]
+    report = _compare(reference, swapped, min_cosine=0.9)
+    assert report["min_cosine"] > 0.9
+    assert report["top1_agreement"] < 1.0
+    assert not report["passed"]
+
+
+def test_compare_single_sample_has_no_neighbour_check():
+    report = _compare(REFERENCE[:1], REFERENCE[:1] * 3, min_cosine=0.99)
+    assert "top1_agreement" not in report
+    assert report["passed"]
+
+
+def test_serving_reads_the_quantization_from_the_manifest(tmp_path, monkeypatch):
+    model_dir = str(tmp_path)
+    monkeypatch.setattr(onnx_encoder, "ONNX_QUANTIZE", True)
+    # No manifest: exports made before it existed follow ONNX_QUANTIZE
+    assert _resolve_quantized(model_dir, "text")
+    _write_manifest(model_dir, "text", False)
+    _write_manifest(model_dir, "clip", True)
+    assert not _resolve_quantized(model_dir, "text")
+    assert _resolve_quantized(model_dir, "clip")
+    assert _resolve_quantized(model_dir, "text", quantized=True)
+    assert _model_path(model_dir, TEXT_MODEL_FILE, _resolve_quantized(model_dir, "text")).endswith("text_encoder.onnx")
+
+
+def test_check_parity_against_fake_encoders(monkeypatch):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("PIL")
+    texts = ["park hours", "ticket prices", "parade tonight"]
+    vectors = {text: REFERENCE[i] for i, text in enumerate(texts)}
+
+    class FakeOnnxText:
+        def __init__(self, model_dir, quantized):
+            pass
+
+        def encode(self, batch):
+            return np.stack([vectors[t] for t in batch])
+
+    class FakeOnnxClip(FakeOnnxText):
+        def encode_text(self, batch):
+            # A broken CLIP export: every text collapses onto the same vector
+            return np.tile(REFERENCE[0], (len(batch), 1))
+
+    class Inputs(dict):
+        def to(self, device):
+            return self
+
+    class FakeHandler:
+        class text_model:
+            @staticmethod
+            def encode(batch):
+                return np.stack([vectors[t] for t in batch])
+
+        class clip_model:
+            device = "cpu"
+
+            @staticmethod
+            def get_text_features(texts):
+                return torch.tensor(np.stack([vectors[t] for t in texts]))
+
+        @staticmethod
+        def clip_processor(text, return_tensors, padding):
+            return Inputs(texts=text)
+
+    monkeypatch.setattr(onnx_encoder, "OnnxTextEncoder", FakeOnnxText)
+    monkeypatch.setattr(onnx_encoder, "OnnxClipEncoder", FakeOnnxClip)
+    report = onnx_encoder.check_parity(FakeHandler, texts, min_cosine=0.99)
+    assert report["text"]["passed"]
+    assert not report["clip_text"]["passed"]
+    assert not report["passed"]
@@ -0,0 +1,77 @@
+import pytest
+from ..core.parse_cache import ParsedDocumentCache, parse_document_cached
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParsedDocumentCache(cache_dir=str(tmp_path / "cache"), max_mb=1)
+
+
+def test_second_parse_is_served_from_cache(tmp_path, cache):
+    doc = tmp_path / "hours.txt"
+    doc.write_text("The park opens at 8:00.\n\nFireworks start at 20:30.", encoding="utf-8")
+
+    first = list(parse_document_cached(str(doc), cache))
+    second = list(parse_document_cached(str(doc), cache))
+
+    assert first == second
+    assert len(first) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_changed_content_changes_key(tmp_path, cache):
+    doc = tmp_path / "tickets.txt"
+    doc.write_text("Adult ticket: 475", encoding="utf-8")
+    old_key = cache.key_for(str(doc))
+    doc.write_text("Adult ticket: 499", encoding="utf-8")
+    assert cache.key_for(str(doc)) != old_key
+
+
+def test_eviction_keeps_cache_under_limit(tmp_path):
+    cache = ParsedDocumentCache(cache_dir=str(tmp_path / "cache"), max_mb=0.01)
+    for i in range(10):
+        cache.put(f"key{i}", [{"type": "text", "content": "x" * 2000}])
+    assert cache.stats()["size_mb"] <= 0.01
+    # Most recent entry survives
+    assert cache.get("key9") is not None
+
+
+def test_parse_with_errors_is_not_cached(tmp_path, cache, monkeypatch):
+    from ..core import parse_cache
+
+    def failing_parse(file_path, errors=None):
+        yield {"type": "text", "content": "First page"}
+        errors.append(ValueError("broken xref table"))
+
+    monkeypatch.setattr(parse_cache, "parse_document", failing_parse)
+    doc = tmp_path / "map.txt"
+    doc.write_text("First page", encoding="utf-8")
+
+    assert len(list(parse_document_cached(str(doc), cache))) == 1
+    assert cache.get(cache.key_for(str(doc))) is None
+    assert cache.stats()["skipped"] == 1
+
+
+def test_oversized_entry_is_streamed_but_not_cached(tmp_path):
+    cache = ParsedDocumentCache(cache_dir=str(tmp_path / "cache"), max_mb=1, max_entry_mb=0.001)
+    doc = tmp_path / "log.txt"
+    doc.write_text("\n\n".join(f"line {i} " + "x" * 100 for i in range(50)), encoding="utf-8")
+
+    assert len(list(parse_document_cached(str(doc), cache))) == 50
+    assert cache.get(cache.key_for(str(doc))) is None
+    assert not list((tmp_path / "cache").iterdir())
+
+
+def test_entry_removed_during_lookup_is_a_miss(cache, monkeypatch):
+    from ..core import parse_cache
+
+    cache.put("key", [{"type": "text", "content": "Parade at 15:00"}])
+
+    def removed(path, *args, **kwargs):
+        # Another process evicted the entry right after it was opened
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(parse_cache.os, "utime", removed)
+    assert cache.get("key") is None
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,66 @@
+import json
+from datetime import date
+
+from ..core.response_formatter import (
+    detect_language, format_weather, format_sql_results, format_maps, get_formatter_stats
+)
+
+FORECAST = {
+    "success": True, "source": "forecast", "location": "Shanghai", "date": "2025-06-01",
+    "weather": "light rain", "temp_day": 26.4, "temp_night": 21.0, "humidity": 80, "wind_speed": 3.5
+}
+
+DIRECTIONS = json.dumps({"routes": [{
+    "summary": "S1",
+    "distance": {"text": "30.2 km", "value": 30200},
+    "duration": {"text": "45 mins", "value": 2700},
+    "steps": [{"instructions": "Head <b>east</b> on Airport Rd", "distance": {"value": 2100}, "duration": {"value": 360}}]
+}]})
+
+
+def test_language_follows_the_question():
+    assert detect_language("明天会下雨吗？") == "zh"
+    assert detect_language("Will it rain tomorrow?") == "en"
+    assert detect_language(None) == "en"
+
+
+def test_weather_templates_in_both_languages():
+    en = format_weather(FORECAST, "Shanghai", "2025-06-01", "Will it rain on June 1?")
+    assert en == ("Forecast for Shanghai on 2025-06-01: light rain, 26.4°C during the day and 21°C at night, "
+                  "humidity 80%, wind 3.5 m/s.")
+    zh = format_weather(FORECAST, "上海", "2025-06-01", "6月1日上海会下雨吗？")
+    assert zh.startswith("上海2025-06-01天气预报：小雨")
+
+
+def test_untranslatable_weather_falls_back_to_the_llm():
+    unusual = dict(FORECAST, weather="volcanic ash")
+    assert format_weather(unusual, "上海", "2025-06-01", "上海天气怎么样") is None
+    assert format_weather({"success": True, "source": "satellite"}, "Shanghai", "2025-06-01") is None
+
+
+def test_sql_rows():
+    assert format_sql_results([{"visit_date": date(2024, 7, 2), "total_visitors": 1234}], "Busiest day?") \
+        == "Date: 2024-07-02, Total visitors: 1,234."
+    rows = [{"visit_date": f"2024-07-{day:02d}", "visitor_count": day} for day in range(1, 13)]
+    answer = format_sql_results(rows, "每天有多少游客？")
+    assert answer.startswith("共12条记录，前10条如下：")
+    assert len(answer.splitlines()) == 11
+    assert format_sql_results([{f"c{i}": i for i in range(10)}], "wide") is None
+
+
+def test_unaliased_aggregates_are_left_to_the_llm():
+    assert format_sql_results([{"COUNT(*)": 1234}], "How many visitors came on 2024-05-01?") is None
+    assert format_sql_results([{"COUNT(*)": 1234}], "2024年5月1日有多少游客？") is None
+    assert format_sql_results([{"AVG(TIMESTAMPDIFF(MINUTE, entry_time, exit_time))": 212.5}], "平均游玩多久？") is None
+    assert format_sql_results([{"visit_date": "2024-05-01", "cnt": 3}], "Busiest day?") is None
+
+
+def test_maps_directions_and_unknown_payloads():
+    answer = format_maps(DIRECTIONS, "How do I get to the park?", "google-maps-maps_directions")
+    assert answer.splitlines()[0] == "Route via S1: 30.2 km, about 45 min."
+    assert answer.splitlines()[-1] == "1. Head east on Airport Rd"
+    # Chinese answers would have to copy English instructions
+    assert format_maps(DIRECTIONS, "怎么去乐园？", "google-maps-maps_directions") is None
+    assert format_maps('{"elevation": 12}', "How high?", "google-maps-maps_elevation") is None
+    stats = get_formatter_stats()["google-maps-maps_directions"]
+    assert stats["template"] >= 1 and stats["llm"] >= 1
@@ -0,0 +1,32 @@
+import time
+
+from ..core.routing_cache import RoutingCache, normalize_query
+
+
+def test_normalized_repeats_share_a_decision():
+    cache = RoutingCache()
+    assert normalize_query("  When is the LOW season?? ") == "when is the low season"
+    cache.put("When is the low season?", "text_to_sql", '{"query": "When is the low season?"}')
+    assert cache.get("when is the  low season") == ("text_to_sql", '{"query": "When is the low season?"}')
+    assert cache.get("When is the high season?") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_time_sensitive_tools_are_not_cached():
+    cache = RoutingCache(bypass_tools=["get_weather"])
+    assert cache.put("Will it rain tomorrow?", "get_weather", '{"location": "Shanghai", "date": "tomorrow"}') is False
+    assert cache.get("Will it rain tomorrow?") is None
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_entries_expire_and_are_bounded():
+    cache = RoutingCache(ttl_seconds=0.05, max_entries=2)
+    cache.put("a", "search_knowledge_base", "{}")
+    cache.put("b", "search_knowledge_base", "{}")
+    cache.put("c", "search_knowledge_base", "{}")
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+    time.sleep(0.1)
+    assert cache.get("c") is None
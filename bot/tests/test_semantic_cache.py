@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from ..core.semantic_cache import SemanticAnswerCache
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype="float32")
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def cache():
+    c = SemanticAnswerCache(threshold=0.9, max_entries=2)
+    c.check_snapshot(("kb", 1))
+    return c
+
+
+def test_paraphrase_with_same_retrieval_hits(cache):
+    cache.store(_unit([1, 0, 0]), [3, 7], "Adult tickets start at 475 yuan.", generation_seconds=2.0)
+    assert cache.lookup(_unit([1, 0.1, 0]), [3, 7]) == "Adult tickets start at 475 yuan."
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["latency_saved_seconds"] == 2.0
+
+
+def test_different_retrieval_or_distant_query_misses(cache):
+    cache.store(_unit([1, 0, 0]), [3, 7], "answer", generation_seconds=1.0)
+    assert cache.lookup(_unit([1, 0.1, 0]), [3, 8]) is None
+    assert cache.lookup(_unit([0, 1, 0]), [3, 7]) is None
+
+
+def test_snapshot_change_and_size_bound(cache):
+    for i in range(3):
+        cache.store(_unit([1, i, 0]), [i], f"answer {i}", generation_seconds=1.0)
+    assert cache.stats()["entries"] == 2
+    cache.check_snapshot(("kb", 2))
+    assert cache.stats()["entries"] == 0
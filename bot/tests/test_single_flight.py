@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from ..core.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return "answer"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.do, "prompt", slow)
+        started.wait()
+        followers = [pool.submit(flight.do, "prompt", slow) for _ in range(3)]
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert results == ["answer"] * 4
+    assert len(calls) == 1
+    assert flight.stats()["coalesced"] == 3
+
+
+def test_ttl_cache_and_cacheable_predicate():
+    flight = SingleFlight(ttl_seconds=60, cacheable=lambda result: not result.startswith("Error"))
+    assert flight.do("a", lambda: "first") == "first"
+    assert flight.do("a", lambda: "second") == "first"
+    assert flight.do("b", lambda: "Error: down") == "Error: down"
+    assert flight.do("b", lambda: "recovered") == "recovered"
+    assert flight.stats()["cache_hits"] == 1
+
+
+def test_errors_propagate_and_are_not_cached():
+    flight = SingleFlight(ttl_seconds=60)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: "ok") == "ok"
+
+
+def test_async_callers_coalesce():
+    flight = SingleFlight()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*[flight.ado("prompt", generate) for _ in range(5)])
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert len(calls) == 1
@@ -0,0 +1,106 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from ..tools.knowledge_base_tool import RAGTool
+
+
+class FakeEmbeddingHandler:
+    query_batcher = None
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_query_embedding(self, text):
+        self.calls += 1
+        return np.ones(4, dtype="float32") / 2
+
+
+class FakeEngine:
+    reranker = None
+
+    def __init__(self):
+        self.embedding_handler = FakeEmbeddingHandler()
+
+
+class FakeIndex:
+    ntotal = 1
+
+    def search(self, query_vecs, k):
+        return np.array([[0.9]], dtype="float32"), np.array([[0]])
+
+
+@pytest.fixture
+def rag_tool():
+    metadata = [{"id": 0, "content": "The park opens at nine.", "source": "guide.txt", "type": "text"}]
+    return RAGTool(FakeEngine(), metadata, FakeIndex(), FakeIndex())
+
+
+def test_prefetch_for_same_query_is_used(rag_tool):
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        prefetch = rag_tool.prefetch(pool, "When does the park open?")
+        prefetch.future.result()
+        query_vec, context = rag_tool._claim_prefetch(prefetch, "when does the park open", 5)
+    assert context[0]["content"] == "The park opens at nine."
+    assert rag_tool.rag_engine.embedding_handler.calls == 1
+    assert rag_tool.prefetch_stats()["used"] == 1
+
+
+def test_prefetch_for_changed_query_or_k_is_discarded(rag_tool):
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        prefetch = rag_tool.prefetch(pool, "When does the park open?")
+        assert rag_tool._claim_prefetch(prefetch, "park opening hours", 5) is None
+        other = rag_tool.prefetch(pool, "When does the park open?")
+        assert rag_tool._claim_prefetch(other, "When does the park open?", 3) is None
+    assert rag_tool.prefetch_stats()["query_changed"] == 2
+
+
+def test_unclaimed_prefetch_is_released_once(rag_tool):
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        prefetch = rag_tool.prefetch(pool, "Will it rain tomorrow?")
+        rag_tool.release_prefetch(prefetch)
+        rag_tool.release_prefetch(prefetch)
+        assert rag_tool._claim_prefetch(prefetch, "Will it rain tomorrow?", 5) is None
+    stats = rag_tool.prefetch_stats()
+    assert stats["not_called"] == 1
+    assert stats["used"] == 0
+
+
+def test_failed_prefetch_falls_back_to_inline_retrieval(rag_tool, monkeypatch):
+    def broken_embedding(text):
+        raise RuntimeError("embedding worker crashed")
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        monkeypatch.setattr(rag_tool.rag_engine.embedding_handler, "get_query_embedding", broken_embedding)
+        prefetch = rag_tool.prefetch(pool, "When does the park open?")
+        prefetch.future.exception()
+        assert rag_tool._claim_prefetch(prefetch, "When does the park open?", 5) is None
+    assert rag_tool.prefetch_stats()["failed"] == 1
+
+
+def test_prefetch_is_skipped_when_workers_are_busy(rag_tool):
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        blocker = threading.Event()
+        embed = rag_tool.rag_engine.embedding_handler.get_query_embedding
+        rag_tool.rag_engine.embedding_handler.get_query_embedding = lambda text: blocker.wait() and embed(text)
+        first = rag_tool.prefetch(pool, "When does the park open?", max_in_flight=1)
+        assert rag_tool.prefetch(pool, "How much is a ticket?", max_in_flight=1) is None
+        blocker.set()
+        first.future.result()
+    stats = rag_tool.prefetch_stats()
+    assert stats["started"] == 1
+    assert stats["skipped_busy"] == 1
+
+
+def test_router_embedding_is_reused(rag_tool, monkeypatch):
+    monkeypatch.setattr(rag_tool, "answer", lambda query, context, query_vec: {"success": True, "answer": "nine"})
+    query_vec = np.ones(4, dtype="float32") / 2
+    handler = rag_tool.rag_engine.embedding_handler
+    rag_tool.call('{"query": "When does the park open?"}', query="When does the park open?", query_vec=query_vec)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        rag_tool.prefetch(pool, "When does the park open?", query_vec=query_vec).future.result()
+    assert handler.calls == 0
+    # The agent rewrote the question, so the router's embedding does not apply
+    rag_tool.call('{"query": "park opening hours"}', query="When does the park open?", query_vec=query_vec)
+    assert handler.calls == 1
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from .. import api_service
+from ..api_service import run_warm_up, start_warm_up, get_readiness
+from ..server.app import app
+
+
+@pytest.fixture(autouse=True)
+def fake_components(monkeypatch):
+    monkeypatch.setattr(api_service, "_readiness", {"status": "starting", "components": {}})
+    monkeypatch.setattr(api_service, "WARMUP_ON_STARTUP", True)
+    monkeypatch.setattr(api_service, "READY_WHEN_DEGRADED", False)
+    release = threading.Event()
+
+    def warm_up(component):
+        if component == "slow":
+            release.wait(5)
+        if component == "broken":
+            raise RuntimeError("model not found")
+
+    monkeypatch.setattr(api_service, "_warm_up_component", warm_up)
+    yield release
+    release.set()
+
+
+def test_ready_only_after_every_component_warmed_up():
+    client = TestClient(app)
+    assert client.get("/ready").status_code == 503
+    run_warm_up(["text_model", "ollama"])
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert set(response.json()["components"]) == {"text_model", "ollama"}
+
+
+def test_degraded_is_not_ready_unless_configured(monkeypatch):
+    client = TestClient(app)
+    run_warm_up(["text_model", "broken"])
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "degraded"
+    assert response.json()["components"]["broken"]["error"] == "model not found"
+    monkeypatch.setattr(api_service, "READY_WHEN_DEGRADED", True)
+    assert client.get("/ready").status_code == 200
+
+
+def test_superseded_warm_up_leaves_readiness_alone(fake_components, monkeypatch):
+    monkeypatch.setattr(api_service, "WARMUP_COMPONENTS", ["slow"])
+    old = start_warm_up()
+    # A reload starts a new warm-up while the old one is still loading
+    monkeypatch.setattr(api_service, "WARMUP_COMPONENTS", ["broken"])
+    start_warm_up().join(5)
+    assert get_readiness()["status"] == "degraded"
+    fake_components.set()
+    old.join(5)
+    readiness = get_readiness()
+    assert readiness["status"] == "degraded"
+    assert list(readiness["components"]) == ["broken"]
@@ -1,13 +1,36 @@
 import json
-from typing import Dict, Any
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
 from qwen_agent.tools.base import BaseTool
 import dotenv
 
-from ..core.ollama_handler import generate_local_answer
-from ..config import SYSTEM_ROLE
+from ..core.ollama_handler import generate_local_answer, after_deferred_answer
+from ..core.llm_metrics import request_trace
+from ..core.context_packer import pack_context, estimate_tokens
+from ..core.semantic_cache import SemanticAnswerCache, knowledge_base_snapshot
+from ..core.routing_cache import normalize_query
+from ..config import (
+    SYSTEM_ROLE, METADATA_FILE, CLIP_IMAGE_RESCORE, CLIP_RESCORE_CANDIDATES, RERANK_CANDIDATES, RETRIEVAL_WORKERS,
+    SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES
+)
 
 dotenv.load_dotenv()
-        
+
+IMAGE_QUERY_KEYWORDS = ["poster", "image", "picture", "activity", "what does it look like"]
+
+
+class RetrievalPrefetch:
+    """Retrieval started speculatively for a query, before it is known whether the tool is called"""
+    def __init__(self, query: str, k: int, future):
+        self.query = query
+        self.k = k
+        self.future = future  # Resolves to (query_vec, retrieved_context)
+        self.claimed = False
+
+
 class RAGTool(BaseTool):
     """
     RAG tool for retrieving information from the knowledge base and generating an answer.
@@ -24,84 +47,352 @@ class RAGTool(BaseTool):
         self.metadata_store = metadata_store
         self.text_index = text_index
         self.image_index = image_index
+        # id -> metadata lookup, instead of scanning the metadata store for every hit
+        self.metadata_by_id = {item["id"]: item for item in (metadata_store or [])}
+        # Runs the CLIP retrieval branch concurrently with the text branch
+        self.executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="rag-retrieval")
+        self.answer_cache = SemanticAnswerCache(
+            threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_MAX_ENTRIES
+        ) if SEMANTIC_CACHE_ENABLED else None
+        self._prefetch_lock = threading.Lock()
+        self._prefetch_stats = {
+            "started": 0, "used": 0, "query_changed": 0, "not_called": 0, "not_started": 0, "failed": 0, "skipped_busy": 0
+        }
+        self._prefetch_in_flight = 0
+
+    @staticmethod
+    def _parse_params(params, k: int = 5):
+        """Accept the agent's JSON string, a dict or a plain query string"""
+        if isinstance(params, str):
+            try:
+                params = json.loads(params)
+            except json.JSONDecodeError:
+                return params, k
+        if isinstance(params, dict):
+            return params.get("query", ""), int(params.get("k") or k)
+        return str(params), k
+
+    def _context_item(self, match, score):
+        """Turn a metadata entry into a context item for the prompt"""
+        if match.get("type") == "image":
+            return {
+                "id": match["id"],
+                "content": f"Related image path: {match['path']}, Image text: '{match.get('ocr', '')}'",
+                "source": match.get("source", "Unknown"),
+                "type": "image",
+                "path": match.get("path"),  # Ensure path is included
+                "score": score
+            }
+        return {
+            "id": match["id"],
+            "content": match.get("content", ""),
+            "source": match.get("source", "Unknown"),
+            "type": match.get("type", "text"),
+            "score": score
+        }
 
-    def call(self, query: str, k: int = 5, **kwargs) -> Dict[str, Any]:
+    def _search_images(self, query: str) -> Dict[int, float]:
+        """CLIP branch: embed the query with CLIP and search the image index, image id -> CLIP score"""
+        query_vec_img = self.rag_engine.embedding_handler.get_clip_text_embedding_cpu(query).reshape(1, -1)
+        distances, image_ids = self.image_index.search(query_vec_img, min(CLIP_RESCORE_CANDIDATES, self.image_index.ntotal))
+        return {int(doc_id): float(score) for doc_id, score in zip(image_ids[0], distances[0]) if doc_id != -1}
+
+    def _start_image_search(self, query: str):
         """
-        Search the knowledge base, then use an LLM to generate a final answer.
+        For explicit image queries, start the CLIP branch in the background so it
+        overlaps with the text branch (FAISS and PyTorch release the GIL)
+        :return: Future of the CLIP scores, or None
+        """
+        if not CLIP_IMAGE_RESCORE or self.image_index is None or self.image_index.ntotal == 0:
+            return None
+        if not any(keyword in query.lower() for keyword in IMAGE_QUERY_KEYWORDS):
+            return None
+        return self.executor.submit(self._search_images, query)
+
+    def _rescore_images(self, query: str, retrieved_context: List[Dict[str, Any]], image_search=None):
+        """
+        Optional CLIP step: re-order image hits by CLIP similarity and, for
+        explicit image queries, add the best CLIP match if text search missed it
+        :param image_search: Future from _start_image_search, if the CLIP branch already runs
         """
+        image_hits = [item for item in retrieved_context if item["type"] == "image"]
+        wants_image = image_search is not None
+        if not (image_hits or wants_image) or self.image_index is None or self.image_index.ntotal == 0:
+            return retrieved_context
+
+        clip_scores = image_search.result() if wants_image else self._search_images(query)
+
+        for item in image_hits:
+            item["clip_score"] = clip_scores.get(item["id"])
+        image_hits.sort(key=lambda item: item["clip_score"] if item["clip_score"] is not None else float("-inf"), reverse=True)
+
+        if wants_image and clip_scores:
+            best_id = max(clip_scores, key=clip_scores.get)
+            match = self.metadata_by_id.get(best_id)
+            if match and all(item["id"] != best_id for item in image_hits):
+                item = self._context_item(match, None)
+                item["clip_score"] = clip_scores[best_id]
+                image_hits.insert(0, item)
+
+        return [item for item in retrieved_context if item["type"] != "image"] + image_hits
+
+    def embed_query(self, query: str):
+        return self.rag_engine.embedding_handler.get_query_embedding(query)
+
+    def _context_from_hits(self, query: str, k: int, ids, distances, image_search=None) -> List[Dict[str, Any]]:
+        """Turn one row of text index hits into context items, then re-rank and re-score images"""
+        retrieved_context = []
+        for doc_id, score in zip(ids, distances):
+            if doc_id != -1:
+                match = self.metadata_by_id.get(int(doc_id))
+                if match:
+                    retrieved_context.append(self._context_item(match, float(score)))
+
+        reranker = self.rag_engine.reranker
+        if reranker is not None:
+            retrieved_context, _ = reranker.rerank(query, retrieved_context, top_k=k)
+
+        if CLIP_IMAGE_RESCORE:
+            retrieved_context = self._rescore_images(query, retrieved_context, image_search)
+        return retrieved_context
+
+    def _fetch_k(self, k: int) -> int:
+        # With re-ranking, over-fetch candidates and let the cross-encoder pick the best k
+        return max(k, RERANK_CANDIDATES) if self.rag_engine.reranker is not None else k
+
+    def retrieve(self, query: str, k: int = 5, query_vec=None, image_search=None) -> List[Dict[str, Any]]:
+        """
+        Search the text index; images are matched through their indexed OCR/caption text
+        :param query_vec: Precomputed query embedding, computed here if None
+        :param image_search: CLIP branch already started with _start_image_search, started here if None
+        :return: List of context items ordered by relevance
+        """
+        if image_search is None:
+            image_search = self._start_image_search(query)
+        if query_vec is None:
+            query_vec = self.embed_query(query)
+
+        distances, ids = self.text_index.search(query_vec.reshape(1, -1), self._fetch_k(k))
+        return self._context_from_hits(query, k, ids[0], distances[0], image_search)
+
+    def retrieve_batch(self, queries: List[str], k: int = 5):
+        """
+        Retrieve for many queries at once: one embedding forward pass and one
+        index search over the (N, d) query matrix
+        :return: (list of context item lists, (N, d) query embeddings)
+        """
+        if not queries:
+            return [], None
+        image_searches = [self._start_image_search(query) for query in queries]
+        query_vecs = self.rag_engine.embedding_handler.get_text_embeddings_offline(queries)
+        distances, ids = self.text_index.search(query_vecs, self._fetch_k(k))
+        contexts = [
+            self._context_from_hits(query, k, ids[row], distances[row], image_searches[row])
+            for row, query in enumerate(queries)
+        ]
+        return contexts, query_vecs
+
+    def _count_prefetch(self, outcome: str):
+        with self._prefetch_lock:
+            self._prefetch_stats[outcome] += 1
+
+    def prefetch(self, executor, query: str, k: int = 5, max_in_flight=None, query_vec=None):
+        """
+        Start retrieval for query on executor, e.g. while the agent is still choosing a tool
+        :param max_in_flight: Skip the prefetch instead of queueing it once this many are running
+        :param query_vec: Embedding of query if already computed (e.g. by the intent router)
+        :return: RetrievalPrefetch to hand to call(), or to release_prefetch() if unused; None if skipped
+        """
+        def run():
+            image_search = self._start_image_search(query)
+            vec = self.embed_query(query) if query_vec is None else query_vec
+            return vec, self.retrieve(query, k, vec, image_search)
+
+        def finished(_):
+            with self._prefetch_lock:
+                self._prefetch_in_flight -= 1
+
+        with self._prefetch_lock:
+            if max_in_flight is not None and self._prefetch_in_flight >= max_in_flight:
+                self._prefetch_stats["skipped_busy"] += 1
+                return None
+            self._prefetch_in_flight += 1
+            self._prefetch_stats["started"] += 1
+        future = executor.submit(contextvars.copy_context().run, run)
+        future.add_done_callback(finished)
+        return RetrievalPrefetch(query, k, future)
+
+    def _claim_prefetch(self, prefetch, query: str, k: int):
+        """
+        :return: (query_vec, retrieved_context) if the prefetch was for this query and k, else None
+        """
+        if prefetch is None:
+            return None
+        with self._prefetch_lock:
+            if prefetch.claimed:
+                return None
+            prefetch.claimed = True
+        if normalize_query(prefetch.query) != normalize_query(query) or prefetch.k != k:
+            prefetch.future.cancel()
+            self._count_prefetch("query_changed")
+            return None
+        if prefetch.future.cancel():
+            # Still queued behind other work, retrieving inline is faster
+            self._count_prefetch("not_started")
+            return None
         try:
-            # --- Step 1: Retrieve documents ---
-            retrieved_context = []
-            query_vec = self.rag_engine.embedding_handler.get_text_embedding_offline(query).reshape(1, -1)
-            
-            distances, ids = self.text_index.search(query_vec, k)
-            
-            for doc_id in ids[0]:
-                if doc_id != -1:
-                    match = next((item for item in self.metadata_store if item["id"] == doc_id), None)
-                    if match:
-                        retrieved_context.append({
-                            "id": match["id"],
-                            "content": match.get("content", ""),
-                            "source": match.get("source", "Unknown"),
-                            "type": match.get("type", "text")
-                        })
-            
-            if any(keyword in query.lower() for keyword in ["poster", "image", "picture", "activity", "what does it look like"]):
-                query_vec_img = self.rag_engine.embedding_handler.get_clip_text_embedding_cpu(query).reshape(1, -1)
-                distances, image_ids = self.image_index.search(query_vec_img, 1)
-                
-                for doc_id in image_ids[0]:
-                    if doc_id != -1:
-                        match = next((item for item in self.metadata_store if item["id"] == doc_id), None)
-                        if match:
-                            retrieved_context.append({
-                                "id": match["id"],
-                                "content": f"Related image path: {match['path']}, Image text: '{match['ocr']}'",
-                                "source": match.get("source", "Unknown"),
-                                "type": "image",
-                                "path": match.get("path") # Ensure path is included
-                            })
-
-            if not retrieved_context:
+            result = prefetch.future.result()
+        except Exception as e:
+            # A failed speculative retrieval must not fail the real call, which retrieves inline
+            print(f"⚠️ Speculative retrieval failed, retrieving again: {e!r}")
+            self._count_prefetch("failed")
+            return None
+        self._count_prefetch("used")
+        return result
+
+    def release_prefetch(self, prefetch):
+        """Discard a prefetch the tool was not called with"""
+        if prefetch is None:
+            return
+        with self._prefetch_lock:
+            if prefetch.claimed:
+                return
+            prefetch.claimed = True
+        prefetch.future.cancel()
+        self._count_prefetch("not_called")
+
+    def prefetch_stats(self) -> Dict[str, Any]:
+        with self._prefetch_lock:
+            stats = dict(self._prefetch_stats)
+        stats["hit_rate"] = round(stats["used"] / stats["started"], 4) if stats["started"] else 0.0
+        return stats
+
+    def answer(self, query: str, retrieved_context: List[Dict[str, Any]], query_vec) -> Dict[str, Any]:
+        """
+        Generate the final answer for already retrieved context
+        :return: Output dict with answer and sources
+        """
+        if not retrieved_context:
+            return {
+                "success": True,
+                "answer": "I couldn't find any relevant information in the knowledge base to answer your question.",
+                "results": []
+            }
+
+        # --- Augment prompt with context, packed into the token budget ---
+        packed_context, pack_stats = pack_context(retrieved_context)
+        context_str = ""
+        for i, item in enumerate(packed_context):
+            content = item.get('content','')
+            source = item.get('source','Unknown Source')
+            context_str += f"Background Knowledge {i+1} (Source: {source}):\n{content}\n\n"
+
+        prompt = f"""{SYSTEM_ROLE}. Please answer the user's question using a friendly and professional tone based on the following background knowledge. Please only use information from the background knowledge, do not make up information.
+
+                    [Background Knowledge]
+                    {context_str}
+                    [User Question]
+                    {query}
+                    """
+        print(f"📏 RAG prompt ~{estimate_tokens(prompt)} tokens "
+              f"(context {pack_stats['context_tokens']}, {pack_stats['packed']}/{pack_stats['candidates']} chunks, "
+              f"{pack_stats['duplicates']} duplicate, {pack_stats['truncated']} truncated, "
+              f"{pack_stats['over_budget']} over budget)")
+        # --- Generate answer with Ollama (unless a paraphrase was already answered) ---
+        retrieved_ids = [item["id"] for item in retrieved_context]
+        if self.answer_cache is not None:
+            self.answer_cache.check_snapshot(knowledge_base_snapshot(
+                self.metadata_store, self.text_index, self.image_index, METADATA_FILE
+            ))
+            cached_answer = self.answer_cache.lookup(query_vec, retrieved_ids)
+            if cached_answer is not None:
+                print("⚡ Semantic answer cache hit")
                 return {
                     "success": True,
-                    "answer": "I couldn't find any relevant information in the knowledge base to answer your question.",
-                    "results": []
+                    "answer": cached_answer,
+                    "results": retrieved_context,
+                    "cached": True
                 }
 
-            # --- Step 2: Augment prompt with context ---
-            context_str = ""
-            for i, item in enumerate(retrieved_context):
-                content = item.get('content','')
-                source = item.get('source','Unknown Source')
-                context_str += f"Background Knowledge {i+1} (Source: {source}):\n{content}\n\n"
-            
-            prompt = f"""{SYSTEM_ROLE}. Please answer the user's question using a friendly and professional tone based on the following background knowledge. Please only use information from the background knowledge, do not make up information.
-
-                        [Background Knowledge]
-                        {context_str}
-                        [User Question]
-                        {query}
-                        """
-            # --- Step 3: Generate answer with Ollama ---
-            final_answer = generate_local_answer(prompt)
-
-            image_path_found = None
-            for item in retrieved_context:
-                if item.get("type") == "image":
-                    image_path_found = item.get("path")
-                    break
-            if image_path_found:
-                final_answer += f"\n\n(Found related image: {image_path_found})"
-
-            # --- Step 4: Return the final answer and sources ---
-            output = {
-                "success": True,
-                "answer": final_answer,
-                "results": retrieved_context
-            }
-            return json.dumps(output, ensure_ascii=False)
+        generation_start = time.perf_counter()
+        generated_answer = generate_local_answer(prompt, caller=self.name)
+        generation_seconds = time.perf_counter() - generation_start
+
+        image_path_found = None
+        for item in retrieved_context:
+            if item.get("type") == "image":
+                image_path_found = item.get("path")
+                break
+        image_note = f"\n\n(Found related image: {image_path_found})" if image_path_found else ""
+        final_answer = generated_answer + image_note
+
+        if self.answer_cache is not None:
+            def store_answer(answer, seconds):
+                if not answer.startswith("Error calling local Ollama model"):
+                    self.answer_cache.store(query_vec, retrieved_ids, answer + image_note, seconds)
+            # When the answer is streamed, it is cached once streaming has finished
+            if not after_deferred_answer(store_answer):
+                store_answer(generated_answer, generation_seconds)
+
+        return {
+            "success": True,
+            "answer": final_answer,
+            "results": retrieved_context
+        }
+
+    def answer_batch(self, queries: List[str], k: int = 5, max_concurrency: int = 4,
+                     trace_kind: str = None) -> List[Dict[str, Any]]:
+        """
+        Batch retrieval followed by answer generation for up to max_concurrency queries at a time
+        :param trace_kind: When set, each query's answer generation is recorded as its own request trace
+        :return: One output dict per query, in order
+        """
+        contexts, query_vecs = self.retrieve_batch(queries, k)
+
+        def answer_row(row):
+            try:
+                return self.answer(queries[row], contexts[row], query_vecs[row])
+            except Exception as e:
+                print(f"Error in RAGTool batch item {row}: {e}")
+                return {"success": False, "error": f"Error in RAG tool: {str(e)}"}
+
+        def answer_one(row):
+            if not trace_kind:
+                return answer_row(row)
+            # Runs in a batch worker thread, each query gets its own trace
+            with request_trace(queries[row], trace_kind):
+                return answer_row(row)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="rag-batch") as pool:
+            return list(pool.map(answer_one, range(len(queries))))
+
+    def call(self, params, k: int = 5, prefetched: RetrievalPrefetch = None, query: str = None, query_vec=None,
+             **kwargs) -> Dict[str, Any]:
+        """
+        Search the knowledge base, then use an LLM to generate a final answer.
+        :param prefetched: Retrieval started speculatively with prefetch(), used if it matches the query
+        :param query: The user's question
+        :param query_vec: Embedding of the user's question, reused if the tool is called with it unchanged
+        """
+        try:
+            user_query = query
+            query, k = self._parse_params(params, k)
+            if query_vec is not None and normalize_query(query) != normalize_query(user_query or ""):
+                # The agent rewrote the query, the embedding belongs to the original
+                query_vec = None
+
+            # --- Step 1: Retrieve documents, the CLIP branch runs alongside the text branch ---
+            retrieval = self._claim_prefetch(prefetched, query, k)
+            if retrieval is not None:
+                query_vec, retrieved_context = retrieval
+            else:
+                image_search = self._start_image_search(query)
+                if query_vec is None:
+                    query_vec = self.embed_query(query)
+                retrieved_context = self.retrieve(query, k, query_vec, image_search)
+
+            # --- Step 2: Generate the answer and return it with its sources ---
+            return json.dumps(self.answer(query, retrieved_context, query_vec), ensure_ascii=False)
 
         except Exception as e:
             import traceback
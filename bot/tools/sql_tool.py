@@ -15,6 +15,8 @@ from sqlalchemy import create_engine
 from qwen_agent.tools.base import BaseTool, register_tool
 
 from ..core.ollama_handler import generate_local_answer
+from ..core.llm_metrics import llm_call
+from ..core.response_formatter import format_sql_results
 
 load_dotenv()
 
@@ -105,12 +107,17 @@ class SQLTool(BaseTool):
 
         # Call Qwen LLM to generate SQL
         dashscope.api_key = self.llm_cfg["api_key"]
-        response =Generation.call(
-            model=self.llm_cfg["model"],
-            prompt=prompt,
-            temperature=self.llm_cfg["temperature"],
-            max_tokens=300
-        )
+        with llm_call("dashscope", self.llm_cfg["model"], self.name) as record:
+            response =Generation.call(
+                model=self.llm_cfg["model"],
+                prompt=prompt,
+                temperature=self.llm_cfg["temperature"],
+                max_tokens=300
+            )
+            usage = getattr(response, "usage", None) or {}
+            record.set_tokens(usage.get("input_tokens"), usage.get("output_tokens"))
+            if getattr(response, "status_code", 200) != 200:
+                record.error = getattr(response, "message", None) or f"HTTP {response.status_code}"
 
         sql_text = getattr(response, "output", None)
 
@@ -147,12 +154,16 @@ class SQLTool(BaseTool):
     def analyze_results(self, results: list, original_query: str) -> str:
         """
         Use LLM to generate a natural language answer based on SQL query results
-        and the original user question.
+        and the original user question. Results of a simple shape are listed from a template instead.
         """
 
         if not results:
             return "No data found for your query."
 
+        answer = format_sql_results(results, original_query)
+        if answer is not None:
+            return answer
+
         preview_results = results[:10]  # Temporarily limit to first 10 records
         results_str = json.dumps(preview_results, ensure_ascii=False)
 
@@ -174,5 +185,5 @@ class SQLTool(BaseTool):
 
                 Answer:
                 """
-        answer = generate_local_answer(prompt)
+        answer = generate_local_answer(prompt, caller=self.name)
         return answer
\ No newline at end of file
@@ -8,6 +8,7 @@ from qwen_agent.tools.base import BaseTool, register_tool
 import dotenv
 
 from ..core.ollama_handler import generate_local_answer
+from ..core.response_formatter import format_weather
 
 dotenv.load_dotenv()
 
@@ -117,6 +118,8 @@ class WeatherTool(BaseTool):
         Get weather for a given location and date.
         - For dates within next 7 days, use forecast.
         - For dates beyond 7 days, use historical average.
+        The answer comes from a template when possible, else from the LLM.
+        kwargs may carry the user's question ("query"), which sets the template's language.
         """
         print("WeatherTool call with params:", params)
         args = json.loads(params)
@@ -143,6 +146,9 @@ class WeatherTool(BaseTool):
             # use historical average
             result = self.get_historical_average(lat, lon, target_date, location)
 
+        answer = format_weather(result, location, target_date.strftime('%Y-%m-%d'), kwargs.get("query"))
+        if answer is not None:
+            return json.dumps({"success": True, "answer": answer}, ensure_ascii=False)
 
         prompt = f"""
                 You are an expert weather analyst. Change the weather JSON to natural language answer for the user.
@@ -158,7 +164,7 @@ class WeatherTool(BaseTool):
 
                 Answer:
                 """
-        answer = generate_local_answer(prompt)
+        answer = generate_local_answer(prompt, caller=self.name)
         output = {
             "success": True,
             "answer": answer,
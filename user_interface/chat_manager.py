@@ -69,71 +69,74 @@ def process_pending_queries():
                 if previous_message["role"] == "user":
                     _generate_and_process_answer(previous_message["content"])
 
+def _iter_sse_events(response):
+    """Parse a server-sent event stream into event dicts"""
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data: "):
+            yield json.loads(line[len("data: "):])
+
+
 def _generate_and_process_answer(last_user_query):
-    """Generate and process answer by calling the backend service"""
-    
-    with st.spinner("Assistant is thinking..."):
-        try:
-            response = requests.post(
-                "http://127.0.0.1:8000/ask",
-                json={"query": last_user_query},
-                timeout=120  # Timeout can be adjusted
-            )
-            
+    """Generate and process answer by streaming it from the backend service"""
+    from bot.config import SYSTEM_NAME
+
+    status = st.empty()
+    placeholder = st.empty()
+    status.info("Assistant is thinking...")
+    answer = ""
+    try:
+        with requests.post(
+            "http://127.0.0.1:8000/ask/stream",
+            json={"query": last_user_query},
+            stream=True,
+            timeout=(5, 120)  # Connect timeout, then max wait between streamed chunks
+        ) as response:
             if response.status_code != 200:
                 raise RuntimeError(f"Backend returned HTTP {response.status_code}: {response.text}")
-            
-            backend_response = response.json()
-            
-            if backend_response.get("success"):
-                tool_output_str = backend_response.get("result")
-                tool_output = {}
-
-                try:
-                    if isinstance(tool_output_str, str):
-                        tool_output = json.loads(tool_output_str)
-                    elif isinstance(tool_output_str, dict):
-                        tool_output = tool_output_str
-                except (json.JSONDecodeError, TypeError):
-                    # For map tool responses (and potentially other tools), the result might already be a processed answer string
-                    # In this case, treat it as a successful response with the string as the answer
-                    tool_output = {"success": True, "answer": str(tool_output_str)}
 
-                if tool_output.get("success"):
-                    final_answer = tool_output.get("answer", "The tool ran successfully but provided no answer.")
-
-                    image_path_found = None
-                    if backend_response.get("tool") == "search_knowledge_base":
-                        source_results = tool_output.get("results", [])
-                        for item in source_results:
-                            if item.get("type") == "image" and item.get("path"):
-                                image_path_found = item["path"]
-                                break
-                    
-                    message_to_append = {"role": "assistant", "content": final_answer}
+            image_path_found = None
+            finished = False
+            for event in _iter_sse_events(response):
+                if event["type"] == "tool":
+                    status.info(f"Using tool: {event['tool']}")
+                elif event["type"] == "sources":
+                    for item in event.get("results", []):
+                        if item.get("type") == "image" and item.get("path"):
+                            image_path_found = item["path"]
+                            break
+                    status.info(f"Found {len(event.get('results', []))} sources, generating answer...")
+                elif event["type"] == "token":
+                    answer += event["text"]
+                    placeholder.markdown(f'<div class="assistant-message"><div class="assistant-bubble">🤖 {SYSTEM_NAME}: {answer}▌</div></div>', unsafe_allow_html=True)
+                elif event["type"] == "done":
+                    finished = True
+                    message_to_append = {"role": "assistant", "content": event.get("answer") or answer or "The tool ran successfully but provided no answer."}
                     if image_path_found:
                         message_to_append["image_path"] = image_path_found
                     st.session_state.chat_history.append(message_to_append)
-
-                else:
-                    error_msg = f"The assistant tried to use a tool, but it failed: {tool_output.get('error', 'Unknown tool error')}"
+                elif event["type"] == "error":
+                    finished = True
+                    if event.get("tool", "unknown") != "unknown":
+                        error_msg = f"The assistant tried to use a tool, but it failed: {event.get('error', 'Unknown tool error')}"
+                    else:
+                        error_msg = f"Backend error: {event.get('error', 'Unknown error')}"
                     st.error(error_msg)
                     st.session_state.chat_history.append({"role": "assistant", "content": error_msg})
 
-            else:
-                error_msg = f"Backend error: {backend_response.get('error', 'Unknown error')}"
-                st.error(error_msg)
-                st.session_state.chat_history.append({"role": "assistant", "content": error_msg})
-            
-        except Exception as e:
-            print(f"❌ Error occurred while processing request: {e}")
-            import traceback
-            print(f"Detailed error information: {traceback.format_exc()}")
-            error_msg = f"Answer generation failed: {e}"
-            st.error(error_msg)
-            st.session_state.chat_history.append({"role": "assistant", "content": error_msg})
+            if not finished:
+                raise RuntimeError("Backend closed the stream before the answer was complete")
+
+    except Exception as e:
+        print(f"❌ Error occurred while processing request: {e}")
+        import traceback
+        print(f"Detailed error information: {traceback.format_exc()}")
+        error_msg = f"Answer generation failed: {e}"
+        st.error(error_msg)
+        st.session_state.chat_history.append({"role": "assistant", "content": error_msg})
 
+    status.empty()
+    placeholder.empty()
     # Set flag to indicate we just received a response to prevent reprocessing
     st.session_state.just_received_response = True
     # Rerun page to update UI
-    st.rerun()
\ No newline at end of file
+    st.rerun()